@@ -1,13 +1,45 @@
 #!/usr/bin/env python3
 import argparse
+import base64
+import bz2
+import calendar
+import contextlib
+import errno
+import glob
+import gzip
+import hashlib
+import http.client
+import io
+import json
+import lzma
+import math
+import mmap
 import os
+import queue
+import random
 import platform
-import ssl
+import socket
 import subprocess
 import shutil
 import re
+import signal
+import stat
+import struct
+import sys
+import tarfile
+import tempfile
+import threading
 import time
-from urllib.request import urlopen
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from functools import cmp_to_key
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from itertools import zip_longest
+from socketserver import ThreadingMixIn
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, unquote, urlencode
+from urllib.request import Request, urlopen
 
 texts = {
     'docker-not-installed': {
@@ -82,15 +114,648 @@ def log_warn(msg):
 def log_error(msg):
     print('\033[31m[ERROR]\033[0m', msg)
 
-def exec_command(*args, shell=False):
+COMMAND_TIMEOUT = 300  # 命令默认超时（秒）
+COMMAND_KILL_GRACE = 5  # 超时后先 SIGTERM，等待该时间后 SIGKILL
+OUTPUT_TAIL_LINES = 200  # 每个输出流只保留最后若干行，用于错误报告
+COMMAND_LOG = []  # 已执行命令的记录：参数、退出码、耗时、是否超时
+_command_log_lock = threading.Lock()
+
+def print_command_line(stream, line):
+    """默认的实时输出回调：缩进、灰色显示子进程输出"""
+    print(f'    \033[90m{line}\033[0m', flush=True)
+
+def _kill_process_group(proc):
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            proc.wait(timeout=COMMAND_KILL_GRACE)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+def exec_command(*args, shell=False, timeout=COMMAND_TIMEOUT, on_line=None, stream=False, env=None):
+    """执行命令，返回 (退出码, stdout末尾, stderr末尾)
+
+    输出逐行读取并通过 on_line(stream, line) 实时转发（stream=True 时直接打印），
+    内存中每个流只保留最后 OUTPUT_TAIL_LINES 行。命令在独立进程组中运行，
+    超时后结束整个进程组（包括其派生的子进程），退出码为 124。
+    """
+    if stream and on_line is None:
+        on_line = print_command_line
+    started = time.time()
+    record = {'args': list(args), 'code': None, 'duration': 0.0, 'timed_out': False}
+    tails = {'stdout': deque(maxlen=OUTPUT_TAIL_LINES), 'stderr': deque(maxlen=OUTPUT_TAIL_LINES)}
+    callback_lock = threading.Lock()
+
+    def reader(name, pipe):
+        for line in pipe:
+            line = line.rstrip('\n')
+            tails[name].append(line)
+            if on_line:
+                with callback_lock:
+                    on_line(name, line)
+        pipe.close()
+
     try:
-        proc = subprocess.run(args, check=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, shell=shell)
-        return proc.returncode, proc.stdout.strip(), proc.stderr.strip()
+        proc = subprocess.Popen(args[0] if shell else args, shell=shell, env=env,
+                                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                encoding='utf-8', errors='replace', start_new_session=True)
     except Exception as e:
+        record['code'] = -1
+        _record_command(record, started)
         return -1, '', str(e)
 
+    readers = [threading.Thread(target=reader, args=(name, getattr(proc, name)), daemon=True) for name in tails]
+    for t in readers:
+        t.start()
+    try:
+        code = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_process_group(proc)
+        record['timed_out'] = True
+        tails['stderr'].append(f'命令超时（{timeout}s），已终止' if LANG == 'zh' else f'Command timed out after {timeout}s')
+        code = 124
+    except KeyboardInterrupt:
+        _kill_process_group(proc)
+        raise
+    for t in readers:
+        t.join(timeout=COMMAND_KILL_GRACE)
+
+    record['code'] = code
+    _record_command(record, started, tails)
+    return code, '\n'.join(tails['stdout']).strip(), '\n'.join(tails['stderr']).strip()
+
+def _record_command(record, started, tails=None):
+    record['started'] = started
+    record['duration'] = time.time() - started
+    if tails:
+        for name, lines in tails.items():
+            record[f'{name}_tail'] = list(lines)[-REPORT_TAIL_LINES:]
+    with _command_log_lock:
+        COMMAND_LOG.append(record)
+    report = CURRENT_REPORT
+    if report is not None:
+        report.add_command(record)
+
+REPORT_DIR = '/var/lib/docker-all-install/reports'  # 每次安装、卸载的计时报告
+REPORT_TAIL_LINES = 20  # 报告中每条命令保留的输出行数
+REPORT_SUMMARY = False  # 结束时打印耗时汇总
+CURRENT_REPORT = None
+
+class RunReport:
+    """一次安装或卸载的计时报告：每个步骤的起止时间和结果，以及步骤中执行的每条命令
+
+    步骤可能在线程池中并发执行，命令按执行线程归属到当前步骤。
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.started = time.time()
+        self.finished = None
+        self.status = None
+        self.steps = []
+        self.commands = []  # 不属于任何步骤的命令（如环境探测）
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def begin_step(self, name, title):
+        step = {'name': name, 'title': title, 'status': None, 'note': None,
+                'started': time.time(), 'duration': None, 'commands': []}
+        with self._lock:
+            self.steps.append(step)
+        self._local.step = step
+        return step
+
+    def end_step(self, step, status, note=None):
+        step['status'] = status
+        step['note'] = note
+        step['duration'] = time.time() - step['started']
+        if getattr(self._local, 'step', None) is step:
+            self._local.step = None
+
+    def add_command(self, record):
+        step = getattr(self._local, 'step', None)
+        with self._lock:
+            (step['commands'] if step is not None else self.commands).append(record)
+
+    def finish(self, status):
+        self.finished = time.time()
+        self.status = status
+
+    def to_dict(self):
+        def when(ts):
+            return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(ts)) + f'.{int(ts % 1 * 1000):03d}'
+
+        def command(record):
+            return {
+                'args': record['args'],
+                'code': record['code'],
+                'timed_out': record['timed_out'],
+                'start_offset': round(record['started'] - self.started, 3),
+                'duration': round(record['duration'], 3),
+                'stdout_tail': record.get('stdout_tail', []),
+                'stderr_tail': record.get('stderr_tail', []),
+            }
+
+        finished = self.finished or time.time()
+        return {
+            'operation': self.operation,
+            'host': socket.gethostname(),
+            'argv': sys.argv[1:],
+            'status': self.status,
+            'started': when(self.started),
+            'finished': when(finished),
+            'duration': round(finished - self.started, 3),
+            'steps': [{
+                'name': step['name'],
+                'title': step['title'],
+                'status': step['status'],
+                'note': step['note'],
+                'start_offset': round(step['started'] - self.started, 3),
+                'duration': round(step['duration'], 3) if step['duration'] is not None else None,
+                'commands': [command(r) for r in step['commands']],
+            } for step in self.steps],
+            'other_commands': [command(r) for r in self.commands],
+        }
+
+    def write(self, path=None):
+        path = path or os.path.join(REPORT_DIR, f"{self.operation}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def print_summary(self, top=5):
+        """耗时汇总：各步骤占总耗时的比例，以及最慢的几条命令"""
+        data = self.to_dict()
+        total = max(data['duration'], 1e-6)
+        log_info(f"{self.operation} 总耗时 {total:.1f}s" if LANG == 'zh' else f"{self.operation} took {total:.1f}s")
+        for step in sorted(data['steps'], key=lambda s: s['duration'] or 0, reverse=True):
+            duration = step['duration'] or 0
+            bar = '#' * int(round(duration / total * 30))
+            print(f"  {duration:7.1f}s {duration / total:6.1%}  {bar:<30} {step['title']} [{step['status']}]")
+        commands = [c for step in data['steps'] for c in step['commands']] + data['other_commands']
+        slowest = sorted(commands, key=lambda c: c['duration'], reverse=True)[:top]
+        if slowest:
+            print('  最慢的命令:' if LANG == 'zh' else '  Slowest commands:')
+            for c in slowest:
+                print(f"  {c['duration']:7.1f}s  {' '.join(c['args'])[:100]}")
+
+REPORT_PATH = None  # --report 指定的报告路径
+
+@contextlib.contextmanager
+def run_report(operation):
+    """在 with 块内记录计时报告，结束时写入 JSON（无法写入时只给出警告）"""
+    global CURRENT_REPORT
+    report = RunReport(operation)
+    CURRENT_REPORT = report
+    try:
+        yield report
+    finally:
+        CURRENT_REPORT = None
+        if report.status is None:
+            report.finish('error')
+        try:
+            path = report.write(REPORT_PATH)
+            log_info(f'计时报告: {path}' if LANG == 'zh' else f'Timing report: {path}')
+        except OSError as e:
+            log_warn(f'写入计时报告失败: {e}' if LANG == 'zh' else f'Failed to write timing report: {e}')
+        if REPORT_SUMMARY:
+            report.print_summary()
+
+class ProgressSteps:
+    """顺序执行的步骤：打印 [n/total] 进度，并在报告中记录每一步的起止时间"""
+
+    def __init__(self, total):
+        self.total = total
+        self.current = 0
+        self._step = None
+
+    def next(self, title):
+        self.end('ok')
+        self.current += 1
+        print(f'\033[36m[{self.current}/{self.total}]\033[0m {title}')
+        if CURRENT_REPORT is not None:
+            self._step = CURRENT_REPORT.begin_step(f'step-{self.current}', title)
+
+    def end(self, status):
+        if self._step is not None:
+            CURRENT_REPORT.end_step(self._step, status)
+            self._step = None
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024  # 每次读取写入的块大小
+DOWNLOAD_RETRIES = 3  # 中断后续传的最大次数
+DOWNLOAD_TIMEOUT = 30  # 单次连接/读取超时（秒）
+USER_AGENT = 'Docker-all-install'
+
+def format_size(num):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(num) < 1024 or unit == 'TB':
+            return f'{num:.1f} {unit}' if unit != 'B' else f'{num} B'
+        num /= 1024
+
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3,
+              'T': 1024 ** 4, 'TB': 1024 ** 4}
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def parse_size(value):
+    """解析 500MB、2G 这样的大小（1024 进制，与 format_size 一致），供命令行参数使用"""
+    m = re.match(r'^\s*([0-9]+(?:\.[0-9]+)?)\s*([A-Za-z]*)\s*$', value)
+    if not m or m.group(2).upper() not in SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f'invalid size: {value}')
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).upper()])
+
+def parse_duration(value):
+    """解析 30m、12h、7d 这样的时长，返回秒数"""
+    m = re.match(r'^\s*([0-9]+(?:\.[0-9]+)?)\s*([smhdw]?)\s*$', value)
+    if not m:
+        raise argparse.ArgumentTypeError(f'invalid duration: {value}')
+    return float(m.group(1)) * DURATION_UNITS[m.group(2) or 's']
+
+def fetch_bytes(url, timeout=DOWNLOAD_TIMEOUT):
+    req = Request(url, headers={'User-Agent': USER_AGENT})
+    with urlopen(req, timeout=timeout) as resp:
+        return resp.read()
+
+def fetch_text(url, timeout=DOWNLOAD_TIMEOUT):
+    return fetch_bytes(url, timeout).decode('utf-8', 'replace')
+
+def fetch_published_sha256(url):
+    """读取发布方提供的校验文件（格式：<sha256> [*]<文件名>），返回SHA-256"""
+    m = re.search(r'\b([0-9a-fA-F]{64})\b', fetch_text(url))
+    if not m:
+        raise ValueError(f'校验文件中没有SHA-256: {url}')
+    return m.group(1).lower()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def download_file(url, target, sha256=None, retries=DOWNLOAD_RETRIES, timeout=DOWNLOAD_TIMEOUT, quiet=False):
+    """流式下载文件
+
+    数据分块写入 target.part，中断后用 HTTP Range 从已下载的位置续传；
+    下载完成后校验 SHA-256（如提供），通过后再原子替换为 target。
+    没有 SHA-256 时无法发现拼接进来的过期或损坏内容，不续传，每次都从头下载。
+    """
+    part = target + '.part'
+    started = time.time()
+    received = 0
+    progress_shown = False
+
+    def end_progress():
+        nonlocal progress_shown
+        if progress_shown:
+            sys.stdout.write('\n')
+            progress_shown = False
+
+    for attempt in range(1, retries + 1):
+        offset = os.path.getsize(part) if sha256 and os.path.exists(part) else 0
+        req = Request(url, headers={'User-Agent': USER_AGENT})
+        if offset:
+            req.add_header('Range', f'bytes={offset}-')
+        try:
+            with urlopen(req, timeout=timeout) as resp:
+                if offset and resp.status != 206:
+                    # 服务端不支持断点续传，从头下载
+                    offset = 0
+                length = resp.headers.get('Content-Length')
+                total = offset + int(length) if length else None
+                done = offset
+                last_report = 0
+                with open(part, 'ab' if offset else 'wb') as f:
+                    while True:
+                        try:
+                            chunk = resp.read(DOWNLOAD_CHUNK_SIZE)
+                        except http.client.IncompleteRead as e:
+                            # 保留断开前已收到的数据，下次从这里续传
+                            f.write(e.partial)
+                            raise
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        done += len(chunk)
+                        received += len(chunk)
+                        now = time.time()
+                        if not quiet and now - last_report >= 0.5:
+                            last_report = now
+                            speed = received / max(now - started, 1e-6)
+                            percent = f'{done * 100 / total:5.1f}% ' if total else ''
+                            sys.stdout.write(f'\r  {percent}{format_size(done)} {format_size(speed)}/s   ')
+                            sys.stdout.flush()
+                            progress_shown = True
+                if total is not None and done < total:
+                    raise URLError(f'连接中断，已下载 {format_size(done)}/{format_size(total)}')
+            break
+        except HTTPError as e:
+            end_progress()
+            if e.code == 416 and offset:
+                # 已下载完整，直接进入校验
+                break
+            log_warn(f'下载失败 (尝试 {attempt}/{retries}): {e}')
+        except (URLError, OSError, socket.timeout, http.client.HTTPException) as e:
+            # 分块传输中途断开时抛出 IncompleteRead（HTTPException），同样续传
+            end_progress()
+            log_warn(f'下载中断 (尝试 {attempt}/{retries}): {e}')
+        if attempt == retries:
+            return False
+        time.sleep(min(2 ** attempt, 10))
+
+    end_progress()
+    elapsed = max(time.time() - started, 1e-6)
+    if not quiet:
+        log_info(f'下载完成: {format_size(os.path.getsize(part))}，耗时 {elapsed:.1f}s，平均 {format_size(received / elapsed)}/s')
+
+    if sha256:
+        actual = file_sha256(part)
+        if actual != sha256.lower():
+            log_error(f'SHA-256 校验失败: 期望 {sha256}，实际 {actual}')
+            os.remove(part)
+            return False
+        log_info('SHA-256 校验通过')
+
+    os.replace(part, target)
+    return True
+
+PROBE_TIMEOUT = 5  # 单个镜像探测的超时（秒）
+PROBE_SAMPLES = 3  # 延迟取多次请求中的最小值
+PROBE_BYTES = 512 * 1024  # 测速时最多下载的字节数
+MIRROR_PROBE = True  # 安装时是否探测并选用最快的镜像
+# docker-ce 软件源镜像，最快的一个通过 DOWNLOAD_URL 传给 get-docker.sh，用于生成 apt/yum 源
+DOCKER_CE_MIRRORS = [
+    'https://download.docker.com',
+    'https://mirrors.aliyun.com/docker-ce',
+    'https://mirrors.tuna.tsinghua.edu.cn/docker-ce',
+    'https://mirrors.ustc.edu.cn/docker-ce',
+]
+# 镜像仓库加速地址，只有比官方仓库更快的才写入 daemon.json 的 registry-mirrors。
+# 第三方加速地址需要用户选择：--registry-mirrors 指定列表，或 --registry-mirrors auto 探测下面的建议列表
+REGISTRY_MIRRORS = []
+REGISTRY_MIRROR_SUGGESTIONS = [
+    'https://docker.m.daocloud.io',
+    'https://mirror.gcr.io',
+]
+DOCKER_HUB_REGISTRY = 'https://registry-1.docker.io'
+DEB_ARCHES = {'x86_64': 'amd64', 'aarch64': 'arm64', 'armv7l': 'armhf', 's390x': 's390x', 'ppc64le': 'ppc64el'}
+DAEMON_JSON = '/etc/docker/daemon.json'
+
+def read_os_release(path='/etc/os-release'):
+    info = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if sep:
+                    info[key] = value.strip('"\'')
+    except OSError:
+        pass
+    return info
+
+def mirror_probe_paths(os_release=None):
+    """返回 (延迟探测路径, 测速路径)，与 get-docker.sh 使用的软件源目录结构一致"""
+    info = read_os_release() if os_release is None else os_release
+    distro = info.get('ID', 'ubuntu').lower()
+    latency_path = f'linux/{distro}/gpg'
+    codename = info.get('VERSION_CODENAME') or info.get('UBUNTU_CODENAME')
+    if distro in ('ubuntu', 'debian', 'raspbian') and codename:
+        arch = DEB_ARCHES.get(platform.machine(), 'amd64')
+        return latency_path, f'linux/{distro}/dists/{codename}/stable/binary-{arch}/Packages'
+    return latency_path, f'linux/{distro}/docker-ce.repo'
+
+def _timed_get(url, max_bytes, timeout):
+    """请求 url 并读取至多 max_bytes，返回 (HTTP状态码, 首字节延迟, 读取字节数, 总耗时)"""
+    req = Request(url, headers={'User-Agent': USER_AGENT})
+    started = time.time()
+    try:
+        resp = urlopen(req, timeout=timeout)
+    except HTTPError as e:
+        e.close()
+        elapsed = time.time() - started
+        return e.code, elapsed, 0, elapsed
+    with resp:
+        ttfb = time.time() - started
+        size = 0
+        while size < max_bytes and time.time() - started < timeout:
+            chunk = resp.read(min(DOWNLOAD_CHUNK_SIZE, max_bytes - size))
+            if not chunk:
+                break
+            size += len(chunk)
+        return resp.status, ttfb, size, time.time() - started
+
+def _probe_result(url, kind):
+    return {'url': url.rstrip('/'), 'kind': kind, 'ok': False, 'latency': None, 'speed': None, 'score': None, 'error': None}
+
+def probe_package_mirror(mirror, paths, timeout=PROBE_TIMEOUT):
+    """测量软件源镜像的延迟（多次请求的最小首字节时间）和下载速度
+
+    得分为按该延迟和速度下载 PROBE_BYTES 的估计耗时，越小越快。
+    """
+    result = _probe_result(mirror, 'package')
+    latency_path, sample_path = paths
+    try:
+        latencies = []
+        for _ in range(PROBE_SAMPLES):
+            status, ttfb, _, _ = _timed_get(f"{result['url']}/{latency_path}", 0, timeout)
+            if status != 200:
+                raise URLError(f'HTTP {status}')
+            latencies.append(ttfb)
+        status, ttfb, size, elapsed = _timed_get(f"{result['url']}/{sample_path}", PROBE_BYTES, timeout)
+        if status != 200:
+            raise URLError(f'HTTP {status}: {sample_path}')
+    except (URLError, OSError, socket.timeout, ValueError) as e:
+        result['error'] = str(getattr(e, 'reason', e))
+        return result
+    result['latency'] = min(latencies)
+    result['speed'] = size / max(elapsed - ttfb, 1e-3)
+    result['score'] = result['latency'] + PROBE_BYTES / max(result['speed'], 1.0)
+    result['ok'] = True
+    return result
+
+def probe_registry_mirror(mirror, timeout=PROBE_TIMEOUT):
+    """测量镜像仓库 /v2/ 接口的延迟；未登录时返回 401 也说明仓库可用"""
+    result = _probe_result(mirror, 'registry')
+    latencies = []
+    try:
+        for _ in range(PROBE_SAMPLES):
+            status, ttfb, _, _ = _timed_get(f"{result['url']}/v2/", 0, timeout)
+            if status not in (200, 401):
+                raise URLError(f'HTTP {status}')
+            latencies.append(ttfb)
+    except (URLError, OSError, socket.timeout, ValueError) as e:
+        result['error'] = str(getattr(e, 'reason', e))
+        return result
+    result['latency'] = result['score'] = min(latencies)
+    result['ok'] = True
+    return result
+
+def probe_mirrors(package_mirrors, registry_mirrors, paths=None, timeout=PROBE_TIMEOUT):
+    """并发探测全部镜像，返回 (软件源结果, 仓库结果)
+
+    仓库结果包含官方仓库作为对比基准。两组结果都按得分从快到慢排列，不可用的排在最后。
+    """
+    paths = paths or mirror_probe_paths()
+    registries = list(registry_mirrors)
+    if registries and DOCKER_HUB_REGISTRY not in registries:
+        registries.append(DOCKER_HUB_REGISTRY)
+    jobs = [(probe_package_mirror, (m, paths, timeout)) for m in package_mirrors]
+    jobs += [(probe_registry_mirror, (m, timeout)) for m in registries]
+    if not jobs:
+        return [], []
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        results = [f.result() for f in [pool.submit(fn, *args) for fn, args in jobs]]
+    rank = lambda r: (not r['ok'], r['score'] if r['ok'] else 0)
+    return (sorted([r for r in results if r['kind'] == 'package'], key=rank),
+            sorted([r for r in results if r['kind'] == 'registry'], key=rank))
+
+def select_registry_mirrors(registry_results):
+    """比官方仓库更快（或官方仓库不可达）的可用镜像，按速度排列"""
+    hub = next((r for r in registry_results if r['url'] == DOCKER_HUB_REGISTRY), None)
+    return [r['url'] for r in registry_results
+            if r['ok'] and r['url'] != DOCKER_HUB_REGISTRY
+            and (hub is None or not hub['ok'] or r['score'] < hub['score'])]
+
+def print_probe_results(results):
+    for r in results:
+        if r['ok']:
+            speed = f"  {format_size(r['speed'])}/s" if r['speed'] is not None else ''
+            print(f"  \033[32m✓\033[0m {r['url']}  {r['latency'] * 1000:.0f} ms{speed}")
+        else:
+            print(f"  \033[31m✗\033[0m {r['url']}  {r['error']}")
+
+def load_daemon_json(path=DAEMON_JSON):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    return json.loads(content) if content else {}
+
+def validate_daemon_json(path):
+    """用 dockerd --validate 检查配置文件，返回 (是否通过, 说明)；dockerd 不支持该参数（23.0 之前）时视为通过"""
+    if not HOST_FACTS.which('dockerd'):
+        return True, 'dockerd not found'
+    code, out, err = exec_command('dockerd', '--validate', '--config-file', path, timeout=30)
+    message = (err or out).strip()
+    if code != 0 and re.search(r'unknown flag', message):
+        return True, 'dockerd --validate unsupported'
+    return code == 0, message
+
+def update_daemon_json(changes, path=DAEMON_JSON, validate=False):
+    """把顶层配置项合并写入 daemon.json（值为 None 表示删除该项），返回内容是否有变化
+
+    原文件不是合法 JSON 或 validate 为 True 且新配置未通过 dockerd 校验时抛出 ValueError，不覆盖；
+    写入先落到临时文件再原子替换，原文件保留为 daemon.json.bak。
+    """
+    config = load_daemon_json(path)
+    merged = dict(config)
+    for key, value in changes.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    if merged == config:
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+        f.flush()
+        os.fsync(f.fileno())
+    if validate:
+        ok, message = validate_daemon_json(tmp_path)
+        if not ok:
+            os.remove(tmp_path)
+            raise ValueError(f'dockerd --validate: {message}')
+    if os.path.exists(path):
+        shutil.copy2(path, path + '.bak')
+    os.replace(tmp_path, path)
+    return True
+
+def report_mirror_probe(package_results, registry_results):
+    """打印探测结果，返回 (docker-ce 软件源地址, 仓库镜像列表)"""
+    if package_results:
+        log_info('docker-ce 软件源探测结果:' if LANG == 'zh' else 'docker-ce package mirrors:')
+        print_probe_results(package_results)
+    if registry_results:
+        log_info('镜像仓库探测结果:' if LANG == 'zh' else 'Registry mirrors:')
+        print_probe_results(registry_results)
+    best = next((r['url'] for r in package_results if r['ok']), None)
+    return best, select_registry_mirrors(registry_results)
+
+class HostFacts:
+    """主机环境探测结果
+
+    二进制文件在进程内通过 PATH 查找，不再逐个 fork `which`；无法避免的命令探测并发执行。
+    结果在整个会话内缓存，安装或卸载步骤之后调用 invalidate() 重新探测。
+    """
+
+    BINARIES = ('apt-get', 'yum', 'curl', 'bash', 'systemctl', 'docker', 'docker-compose')
+    PROBES = {
+        'systemd': ('systemctl', 'status'),
+        'docker-active': ('systemctl', 'is-active', 'docker'),
+        'docker-version': ('docker', '--version'),
+        'compose-plugin': ('docker', 'compose', 'version'),
+        'compose-standalone': ('docker-compose', 'version'),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()  # 保证并发调用时探测只执行一次
+        self._binaries = None
+        self._probes = None
+
+    def which(self, name):
+        with self._lock:
+            if self._binaries is None:
+                self._binaries = {b: shutil.which(b) for b in self.BINARIES}
+            if name not in self._binaries:
+                self._binaries[name] = shutil.which(name)
+            return self._binaries[name]
+
+    def probe(self, name):
+        """返回探测命令的 (code, stdout, stderr)，首次调用时并发执行全部探测"""
+        with self._probe_lock:
+            with self._lock:
+                probes = self._probes
+            if probes is None:
+                probes = self._run_probes()
+                with self._lock:
+                    self._probes = probes
+        return probes[name]
+
+    def _run_probes(self):
+        results = {}
+        pending = {}
+        for name, args in self.PROBES.items():
+            # 命令本身不存在时无需 fork
+            if self.which(args[0]) is None:
+                results[name] = (-1, '', f'{args[0]}: command not found')
+            else:
+                pending[name] = args
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                futures = {name: pool.submit(exec_command, *args) for name, args in pending.items()}
+                for name, future in futures.items():
+                    results[name] = future.result()
+        return results
+
+    def invalidate(self):
+        with self._lock:
+            self._binaries = None
+            self._probes = None
+
+HOST_FACTS = HostFacts()
+
 def check_docker():
-    code, out, _ = exec_command('docker', '--version')
+    code, out, _ = HOST_FACTS.probe('docker-version')
     if code != 0:
         log_warn(text('docker-not-installed'))
         return False
@@ -101,360 +766,3894 @@ def check_docker():
         return False
     return True
 
+COMPOSE_MIN_VERSION = (2, 0, 0)
+
 def check_docker_compose():
-    code, out, _ = exec_command('docker', 'compose', 'version')
-    if code == 0:
-        log_info(text('docker-compose-installed') + f" ({out})")
-        m = re.search(r'(\d+)\.', out)
-        if m and int(m.group(1)) < 2:
-            log_warn(text('docker-compose-version-too-low'))
-            return False
-        return True
-    code, out, _ = exec_command('docker-compose', 'version')
-    if code == 0:
+    for probe in ('compose-plugin', 'compose-standalone'):
+        code, out, _ = HOST_FACTS.probe(probe)
+        if code != 0:
+            continue
         log_info(text('docker-compose-installed') + f" ({out})")
-        m = re.search(r'(\d+)\.', out)
-        if m and int(m.group(1)) < 2:
+        version = parse_compose_version(out)
+        if version and version < COMPOSE_MIN_VERSION:
             log_warn(text('docker-compose-version-too-low'))
             return False
         return True
     log_warn(text('docker-compose-not-installed'))
     return False
 
-def install_docker():
-    if not check_dependencies():
-        return False
-        
-    total_steps = 7  # 总步骤数
-    current_step = 0
-    
-    def show_progress(step_name):
-        nonlocal current_step
-        current_step += 1
-        print(f'\033[36m[{current_step}/{total_steps}]\033[0m {step_name}')
-    
-    log_info('正在安装 Docker...')
-    
+# 与 docker CLI 一致，DOCKER_HOST=unix://<路径> 时使用指定的 socket
+_docker_host = os.environ.get('DOCKER_HOST', '')
+DOCKER_SOCKET = _docker_host[len('unix://'):] if _docker_host.startswith('unix://') else '/var/run/docker.sock'
+DOCKER_API_TIMEOUT = 10  # Engine API 单次请求超时（秒）
+DOCKER_READY_TIMEOUT = 60  # 等待 dockerd 就绪的最长时间（秒）
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过 Unix socket 访问 Docker Engine API"""
+
+    def __init__(self, socket_path=DOCKER_SOCKET, timeout=DOCKER_API_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        # 设置了超时的 socket 为非阻塞模式，监听队列满时 connect 立即返回 EAGAIN，稍后重试
+        for attempt in range(20):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+                self.sock = sock
+                return
+            except BlockingIOError:
+                sock.close()
+                if attempt == 19:
+                    raise
+                time.sleep(0.01 * (attempt + 1))
+            except OSError:
+                sock.close()
+                raise
+
+class DockerAPIError(Exception):
+    """Engine API 返回了非预期的 HTTP 状态码"""
+
+    def __init__(self, status, body=b''):
+        message = body
+        try:
+            message = json.loads(body.decode('utf-8')).get('message', body)
+        except (ValueError, AttributeError):
+            pass
+        if isinstance(message, bytes):
+            message = message[:200].decode('utf-8', 'replace')
+        super().__init__(f'HTTP {status}: {message}')
+        self.status = status
+
+def docker_api(method, path, body=None, headers=None, timeout=DOCKER_API_TIMEOUT, socket_path=DOCKER_SOCKET):
+    """请求 Engine API，返回 (HTTP状态码, 响应内容)；连接失败时抛出 OSError 或 http.client.HTTPException"""
+    conn = UnixHTTPConnection(socket_path, timeout)
     try:
-        # 1. 清理旧版本
-        show_progress('清理旧版本')
-        exec_command('systemctl', 'stop', 'docker')
-        exec_command('systemctl', 'disable', 'docker')
-        exec_command('apt-get', 'remove', '-y', 'docker', 'docker-engine', 'docker.io', 'containerd.io')
-        exec_command('apt-get', 'purge', '-y', 'docker-ce', 'docker-ce-cli', 'containerd.io', 'docker-buildx-plugin', 'docker-compose-plugin')
-        
-        # 2. 更新包管理器
-        show_progress('更新包管理器')
-        code, _, err = exec_command('apt-get', 'update')
-        if code != 0:
-            log_error(f'更新包管理器失败: {err}')
-            return False
-        
-        # 3. 安装基础依赖
-        show_progress('安装基础依赖')
-        code, _, err = exec_command('apt-get', 'install', '-y', 'apt-transport-https', 'ca-certificates', 'curl', 'gnupg', 'lsb-release')
-        if code != 0:
-            log_error(f'安装基础依赖失败: {err}')
+        conn.request(method, path, body=body, headers=headers or {})
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+@contextlib.contextmanager
+def docker_api_stream(method, path, body=None, headers=None, timeout=DOCKER_API_TIMEOUT, socket_path=DOCKER_SOCKET):
+    """请求 Engine API，返回未读取的响应供流式处理（镜像导入导出、拉取进度）；状态码不是 2xx 时抛出 DockerAPIError"""
+    conn = UnixHTTPConnection(socket_path, timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        resp = conn.getresponse()
+        if not 200 <= resp.status < 300:
+            raise DockerAPIError(resp.status, resp.read())
+        yield resp
+    finally:
+        conn.close()
+
+def wait_for_docker(timeout=DOCKER_READY_TIMEOUT, socket_path=DOCKER_SOCKET):
+    """轮询 /_ping 直到 dockerd 就绪，间隔从 50ms 开始倍增到 1s；timeout 为 0 时只检查一次
+
+    返回 (是否就绪, 最后一次错误)。
+    """
+    deadline = time.time() + timeout
+    delay = 0.05
+    last_error = None
+    while True:
+        try:
+            status, body = docker_api('GET', '/_ping', timeout=max(0.5, min(2, timeout)), socket_path=socket_path)
+            if status == 200 and body.strip() == b'OK':
+                return True, None
+            last_error = f'HTTP {status}: {body[:200].decode("utf-8", "replace")}'
+        except (OSError, http.client.HTTPException) as e:
+            last_error = str(e) or e.__class__.__name__
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False, last_error
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 1.0)
+
+# daemon.json 调优方案，安装时默认使用 balanced（--profile none 不调优）
+DAEMON_PROFILES = {
+    'balanced': {
+        'log-driver': 'json-file',
+        'log-opts': {'max-size': '50m', 'max-file': '3'},
+        'max-concurrent-downloads': 10,
+        'max-concurrent-uploads': 5,
+        'live-restore': True,
+        'default-ulimits': {'nofile': {'Name': 'nofile', 'Soft': 65536, 'Hard': 65536}},
+    },
+    # 频繁拉取镜像、日志量大的构建机和计算节点
+    'throughput': {
+        'log-driver': 'local',
+        'log-opts': {'max-size': '100m', 'max-file': '5'},
+        'max-concurrent-downloads': 16,
+        'max-concurrent-uploads': 10,
+        'max-download-attempts': 5,
+        'live-restore': True,
+        'default-ulimits': {'nofile': {'Name': 'nofile', 'Soft': 1048576, 'Hard': 1048576}},
+    },
+    # 小内存、小磁盘的 VPS
+    'small': {
+        'log-driver': 'local',
+        'log-opts': {'max-size': '10m', 'max-file': '3'},
+        'max-concurrent-downloads': 3,
+        'max-concurrent-uploads': 2,
+        'live-restore': True,
+    },
+}
+DAEMON_PROFILE = 'balanced'
+TUNE_OVERRIDE = False  # 调优方案覆盖 daemon.json 中已有的设置
+REGISTRY_OVERRIDE = None  # --action tune 时写入的镜像加速地址（--registry-mirrors 指定）
+OVERLAY2_FILESYSTEMS = ('ext4', 'xfs')  # 可以稳定承载 overlay2 的文件系统
+
+def filesystem_type(path):
+    """path 所在文件系统的类型（取最长匹配的挂载点），无法判断时返回 None"""
+    path = os.path.realpath(path)
+    while not os.path.exists(path) and path != '/':
+        path = os.path.dirname(path)
+    best, fstype = '', None
+    try:
+        with open('/proc/self/mountinfo', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if ' - ' not in line or len(fields) < 5:
+                    continue
+                mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[4])
+                inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+                if inside and len(mount_point) >= len(best):
+                    best, fstype = mount_point, line.split(' - ', 1)[1].split()[0]
+    except OSError:
+        pass
+    return fstype
+
+def choose_storage_driver(info):
+    """内核支持 overlay 且数据目录在 ext4/xfs 上时固定使用 overlay2
+
+    dockerd 已在使用其它存储驱动时不做修改，否则切换后原有的镜像和容器都会“消失”。
+    """
+    current = info.get('Driver')
+    if current and current != 'overlay2':
+        return None
+    try:
+        with open('/proc/filesystems', 'r') as f:
+            if not re.search(r'\boverlay$', f.read(), re.M):
+                return None
+    except OSError:
+        return None
+    data_root = info.get('DockerRootDir') or DOCKER_DATA_ROOT
+    return 'overlay2' if filesystem_type(data_root) in OVERLAY2_FILESYSTEMS else None
+
+def profile_changes(profile, config, info=None, override=False):
+    """计算调优方案需要写入的配置项
+
+    默认只补充 daemon.json 中还没有的设置（字典类型的值逐项补充），用户已有的设置保持不变；
+    override 为 True 时以方案为准。日志参数只在最终的日志驱动与方案一致时才写入。
+    """
+    info = info or {}
+    settings = dict(DAEMON_PROFILES[profile])
+    driver = choose_storage_driver(info)
+    if driver:
+        settings['storage-driver'] = driver
+    if (info.get('Swarm') or {}).get('LocalNodeState') == 'active':
+        # live-restore 与 swarm 模式不兼容
+        settings.pop('live-restore', None)
+
+    changes = {}
+    for key, value in settings.items():
+        current = config.get(key)
+        if override or current is None:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(current, dict):
+            filled = dict(value, **current)
+            if filled != current:
+                changes[key] = filled
+    log_driver = changes.get('log-driver', config.get('log-driver', 'json-file'))
+    if log_driver != settings.get('log-driver') and not override:
+        changes.pop('log-opts', None)
+    return changes
+
+def docker_info(socket_path=DOCKER_SOCKET):
+    """GET /info，dockerd 不可用时返回空字典"""
+    try:
+        status, body = docker_api('GET', '/info', timeout=5, socket_path=socket_path)
+        return json.loads(body.decode('utf-8')) if status == 200 else {}
+    except (OSError, http.client.HTTPException, ValueError):
+        return {}
+
+def plan_daemon_config(profile, registry_mirrors=None, override=False, replace_mirrors=False):
+    """调优方案和镜像加速地址需要写入 daemon.json 的配置项，逐项打印
+
+    探测选出的加速地址只在文件中还没有 registry-mirrors 时写入；
+    override（--tune-override）或 replace_mirrors（--registry-mirrors 明确指定）为 True 时替换已有的设置。
+    """
+    config = load_daemon_json()
+    changes = profile_changes(profile, config, docker_info(), override) if profile != 'none' else {}
+    if registry_mirrors:
+        if override or replace_mirrors or not config.get('registry-mirrors'):
+            changes['registry-mirrors'] = registry_mirrors
+        else:
+            log_info('daemon.json 中已有 registry-mirrors，保持不变（--tune-override 或 --registry-mirrors 时替换）'
+                     if LANG == 'zh' else 'daemon.json already has registry-mirrors, keeping them '
+                     '(use --tune-override or --registry-mirrors to replace)')
+    for key, value in changes.items():
+        log_info(f'daemon.json: {key} = {json.dumps(value, ensure_ascii=False)}')
+    return changes
+
+def apply_daemon_profile(profile, registry_mirrors=None, override=False):
+    """合并调优方案（和镜像加速地址）到 daemon.json，经 dockerd 校验后写入
+
+    只有内容变化且 dockerd 正在运行时才重启；重启后未就绪则恢复原配置并再次重启。
+    """
+    try:
+        had_config = os.path.exists(DAEMON_JSON)
+        changed = update_daemon_json(plan_daemon_config(profile, registry_mirrors, override, True), validate=True)
+    except (OSError, ValueError) as e:
+        log_error(f'更新 {DAEMON_JSON} 失败: {e}')
+        return False
+    if not changed:
+        log_info('daemon.json 无需修改' if LANG == 'zh' else 'daemon.json already up to date')
+        return True
+    if HOST_FACTS.probe('docker-active')[0] != 0:
+        return True
+
+    log_info('配置已更新，重启 Docker...' if LANG == 'zh' else 'Configuration changed, restarting Docker...')
+    exec_command('systemctl', 'restart', 'docker', timeout=120)
+    ready, error = wait_for_docker()
+    if ready:
+        return True
+    log_error(f'Docker 重启后未就绪，恢复原配置: {error}')
+    if had_config:
+        os.replace(DAEMON_JSON + '.bak', DAEMON_JSON)
+    else:
+        os.remove(DAEMON_JSON)
+    exec_command('systemctl', 'restart', 'docker', timeout=120)
+    wait_for_docker()
+    return False
+
+STATE_DIR = '/var/lib/docker-all-install'  # 安装步骤完成状态，失败后重新执行时从中断处继续
+STEP_PARALLEL = 4  # 同时执行的独立步骤数
+APT_LISTS_MAX_AGE = 3600  # 软件包索引在该时间（秒）内更新过则跳过 apt-get update
+LEGACY_PACKAGES = ('docker', 'docker-engine', 'docker.io')
+DOCKER_CE_PACKAGES = ('docker-ce', 'docker-ce-cli', 'containerd.io', 'docker-buildx-plugin', 'docker-compose-plugin')
+BASE_PACKAGES = ('apt-transport-https', 'ca-certificates', 'curl', 'gnupg', 'lsb-release')
+GET_DOCKER_URL = 'https://get.docker.com'
+GET_DOCKER_SCRIPT = '/tmp/get-docker.sh'
+COMPOSE_TARGET = '/usr/local/bin/docker-compose'
+
+class Step:
+    """安装步骤
+
+    deps 为依赖的步骤名；satisfied(context) 在依赖完成后调用，返回 True 表示系统已处于目标状态，直接跳过。
+    persist 为 True 的步骤完成后写入状态文件，上次失败后重新执行时不再重复。
+    run(context) 返回是否成功，context 在同一次执行的各步骤间共享。
+    """
+
+    def __init__(self, name, title, run, deps=(), satisfied=None, persist=True):
+        self.name = name
+        self.title = title
+        self.run = run
+        self.deps = tuple(deps)
+        self.satisfied = satisfied
+        self.persist = persist
+
+class StepGraph:
+    """按依赖关系执行步骤：依赖已完成的步骤并发执行，任一步骤失败后不再启动新步骤"""
+
+    def __init__(self, name, steps, state_dir=STATE_DIR, parallel=STEP_PARALLEL):
+        self.name = name
+        self.steps = self._sort(steps)
+        self.state_path = os.path.join(state_dir, f'{name}.json')
+        self.parallel = parallel
+        self.context = {}
+        self._lock = threading.Lock()
+        self._completed = {}
+        self._counter = 0
+
+    @staticmethod
+    def _sort(steps):
+        by_name = {step.name: step for step in steps}
+        ordered, visiting, visited = [], set(), set()
+
+        def visit(step):
+            if step.name in visited:
+                return
+            if step.name in visiting:
+                raise ValueError(f'步骤存在循环依赖: {step.name}')
+            visiting.add(step.name)
+            for dep in step.deps:
+                if dep not in by_name:
+                    raise ValueError(f'步骤 {step.name} 依赖未知步骤 {dep}')
+                visit(by_name[dep])
+            visiting.discard(step.name)
+            visited.add(step.name)
+            ordered.append(step)
+
+        for step in steps:
+            visit(step)
+        return ordered
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('completed', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'completed': self._completed}, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            log_warn(f'保存步骤状态失败: {e}')
+
+    def _clear_state(self):
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+
+    def _announce(self, step, note=None):
+        with self._lock:
+            self._counter += 1
+            prefix = f'\033[36m[{self._counter}/{len(self.steps)}]\033[0m'
+        if note:
+            print(f'{prefix} {step.title} \033[90m({note})\033[0m', flush=True)
+        else:
+            print(f'{prefix} {step.title}', flush=True)
+
+    def _run_step(self, step, force):
+        report = CURRENT_REPORT
+        record = report.begin_step(step.name, step.title) if report else None
+        if not force and step.persist and step.name in self._completed:
+            self._announce(step, '上次已完成，跳过' if LANG == 'zh' else 'done in previous run, skipped')
+            if report:
+                report.end_step(record, 'skipped', 'completed in previous run')
+            return True
+        try:
+            # 满足检查同样可能出错（如读取配置失败），与执行步骤一样记为失败
+            if not force and step.satisfied and step.satisfied(self.context):
+                self._announce(step, '已满足，跳过' if LANG == 'zh' else 'already satisfied, skipped')
+                if report:
+                    report.end_step(record, 'skipped', 'already satisfied')
+                return True
+            self._announce(step)
+            ok = step.run(self.context)
+        except Exception as e:
+            log_error(f'{step.title}: {e}')
+            ok = False
+        if report:
+            report.end_step(record, 'ok' if ok else 'failed')
+        if ok and step.persist:
+            with self._lock:
+                self._completed[step.name] = time.strftime('%Y-%m-%d %H:%M:%S')
+                self._save_state()
+        return ok
+
+    def run(self, force=False):
+        """执行全部步骤，全部成功时清除状态文件并返回 True；force 为 True 时忽略已完成状态和满足检查"""
+        self._completed = {} if force else self._load_state()
+        self._counter = 0
+        done, started, failed = set(), set(), []
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            while True:
+                if not failed:
+                    for step in self.steps:
+                        if step.name not in started and all(dep in done for dep in step.deps):
+                            started.add(step.name)
+                            running[pool.submit(self._run_step, step, force)] = step
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    if future.result():
+                        done.add(step.name)
+                    else:
+                        failed.append(step)
+        if failed:
+            names = ', '.join(step.title for step in failed)
+            log_error(f'步骤失败: {names}；重新执行将跳过已完成的步骤' if LANG == 'zh'
+                      else f'Failed steps: {names}; re-run to resume from here')
             return False
-        
-        # 4. 下载安装脚本
-        show_progress('下载 Docker 安装脚本')
-        url = 'https://get.docker.com'
-        script = '/tmp/get-docker.sh'
-        with urlopen(url, timeout=30, context=ssl._create_unverified_context()) as resp:
-            with open(script, 'wb') as f:
-                f.write(resp.read())
-        os.chmod(script, 0o755)
-        
-        # 5. 执行安装脚本
-        show_progress('执行 Docker 安装')
-        code, out, err = exec_command('bash', script)
+        self._clear_state()
+        return True
+
+def installed_packages(names):
+    """返回 names 中已安装的软件包，系统既没有 dpkg 也没有 rpm 时返回空集合"""
+    if HOST_FACTS.which('dpkg-query'):
+        # 部分软件包不存在时 dpkg-query 退出码非 0，但仍会输出已知软件包的状态
+        _, out, _ = exec_command('dpkg-query', '-W', '-f=${Package} ${db:Status-Status}\n', *names)
+        return {line.split()[0] for line in out.splitlines() if line.endswith(' installed')}
+    if HOST_FACTS.which('rpm'):
+        # 未安装的软件包输出 "package xxx is not installed"，不会与包名相同
+        _, out, _ = exec_command('rpm', '-q', '--qf', '%{NAME}\n', *names)
+        return {line.strip() for line in out.splitlines() if line.strip() in names}
+    return set()
+
+def apt_lists_age():
+    """软件包索引距上次更新的秒数，从未更新过时返回 None"""
+    newest = 0
+    try:
+        with os.scandir('/var/lib/apt/lists') as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    newest = max(newest, entry.stat().st_mtime)
+    except OSError:
+        return None
+    return time.time() - newest if newest else None
+
+def apt_lists_fresh():
+    age = apt_lists_age()
+    return age is not None and age < APT_LISTS_MAX_AGE
+
+def docker_engine_ready(ctx=None):
+    """docker-ce 已安装且 docker 命令可用"""
+    return HOST_FACTS.probe('docker-version')[0] == 0 and 'docker-ce' in installed_packages(('docker-ce',))
+
+def _step_probe_mirrors(ctx):
+    package_results, registry_results = probe_mirrors(DOCKER_CE_MIRRORS, REGISTRY_MIRRORS)
+    ctx['download_url'], ctx['registry_mirrors'] = report_mirror_probe(package_results, registry_results)
+    return True
+
+def _step_cleanup(ctx):
+    exec_command('systemctl', 'stop', 'docker')
+    exec_command('systemctl', 'disable', 'docker')
+    # 只处理实际安装了的软件包，并合并为一次 apt/yum 事务
+    packages = sorted(installed_packages(LEGACY_PACKAGES + DOCKER_CE_PACKAGES))
+    if packages:
+        remove = ('apt-get', 'purge', '-y') if HOST_FACTS.which('dpkg-query') else ('yum', 'remove', '-y')
+        code, _, err = exec_command(*remove, *packages, stream=True, timeout=900)
         if code != 0:
-            log_error(f'Docker 安装脚本执行失败:\nSTDOUT:\n{out}\nSTDERR:\n{err}')
+            log_error(f'清理旧版本失败: {err}')
             return False
-        
-        # 6. 启动服务
-        show_progress('启动 Docker 服务')
-        exec_command('systemctl', 'start', 'docker')
-        exec_command('systemctl', 'enable', 'docker')
-        time.sleep(3)
-        
-        # 7. 验证安装
-        show_progress('验证安装')
+    HOST_FACTS.invalidate()
+    return True
+
+def _step_apt_update(ctx):
+    code, _, err = exec_command('apt-get', 'update', stream=True, timeout=600)
+    if code != 0:
+        log_error(f'更新包管理器失败: {err}')
+        return False
+    return True
+
+def _step_base_packages(ctx):
+    code, _, err = exec_command('apt-get', 'install', '-y', *BASE_PACKAGES, stream=True, timeout=900)
+    if code != 0:
+        log_error(f'安装基础依赖失败: {err}')
+        return False
+    return True
+
+def _step_fetch_script(ctx):
+    # 与 apt 步骤并发执行，不显示下载进度以免与其输出交错
+    if not download_file(GET_DOCKER_URL, GET_DOCKER_SCRIPT, quiet=True):
+        log_error('下载 Docker 安装脚本失败')
+        return False
+    os.chmod(GET_DOCKER_SCRIPT, 0o755)
+    return True
+
+def _step_engine(ctx):
+    env = None
+    if ctx.get('download_url'):
+        log_info(f"使用 docker-ce 软件源: {ctx['download_url']}")
+        env = dict(os.environ, DOWNLOAD_URL=ctx['download_url'])
+    code, out, err = exec_command('bash', GET_DOCKER_SCRIPT, stream=True, timeout=1800, env=env)
+    HOST_FACTS.invalidate()
+    if code != 0:
+        log_error(f'Docker 安装脚本执行失败:\nSTDOUT:\n{out}\nSTDERR:\n{err}')
+        return False
+    return True
+
+def _step_daemon_config(ctx):
+    # 此时 dockerd 已由安装脚本启动，只写入配置，由启动服务步骤按需重启
+    try:
+        changes = plan_daemon_config(DAEMON_PROFILE, ctx.get('registry_mirrors'), TUNE_OVERRIDE,
+                                     REGISTRY_OVERRIDE is not None)
+        ctx['daemon_changed'] = update_daemon_json(changes, validate=True)
+    except (OSError, ValueError) as e:
+        log_warn(f'写入 {DAEMON_JSON} 失败，保持原配置: {e}')
+    return True
+
+def _docker_service_ok(ctx):
+    if ctx.get('daemon_changed'):
+        return False
+    return (HOST_FACTS.probe('docker-active')[0] == 0
+            and exec_command('systemctl', 'is-enabled', 'docker')[0] == 0
+            and wait_for_docker(timeout=0)[0])
+
+def _step_service(ctx):
+    # 安装脚本可能已启动服务，配置有变化时需要重启才能生效
+    exec_command('systemctl', 'restart' if ctx.get('daemon_changed') else 'start', 'docker')
+    exec_command('systemctl', 'enable', 'docker')
+    HOST_FACTS.invalidate()
+    started = time.time()
+    ready, error = wait_for_docker()
+    if not ready:
+        _, status, _ = exec_command('systemctl', 'status', 'docker', '--no-pager')
+        log_error(f'Docker 服务在 {DOCKER_READY_TIMEOUT}s 内未就绪（{DOCKER_SOCKET}）: {error}\n{status}')
+        return False
+    log_info(f'Docker 服务已就绪，用时 {time.time() - started:.1f}s')
+    return True
+
+def _step_verify_docker(ctx):
+    if not is_docker_installed():
+        log_error('Docker 命令不存在，尝试修复...')
+        exec_command('apt-get', 'install', '-y', '--reinstall', 'docker-ce-cli', stream=True, timeout=900)
+        HOST_FACTS.invalidate()
+
         if not is_docker_installed():
-            log_error('Docker 命令不存在，尝试修复...')
-            exec_command('apt-get', 'install', '--reinstall', 'docker-ce-cli')
-            time.sleep(2)
-            
-            if not is_docker_installed():
-                log_error('Docker 安装失败，命令不可用')
-                return False
-        
-        # 测试运行
-        code, _, err = exec_command('docker', 'run', '--rm', 'hello-world')
-        if code == 0:
-            log_info('\n\033[32m✓ Docker 安装成功并正常工作！\033[0m')
-            return True
-        else:
-            log_error(f'Docker 已安装但运行测试失败: {err}')
+            log_error('Docker 安装失败，命令不可用')
             return False
-            
+
+    # 测试运行：本地构建的 scratch 镜像，不依赖网络
+    try:
+        elapsed = smoke_test_container()
+    except (OSError, http.client.HTTPException, DockerAPIError, RuntimeError, ValueError) as e:
+        log_error(f'Docker 已安装但运行测试失败: {e}')
+        return False
+    log_info(f'测试容器运行成功，用时 {elapsed * 1000:.0f}ms')
+    return True
+
+def docker_install_steps():
+    engine_ready = docker_engine_ready
+    return [
+        Step('probe-mirrors', '探测镜像速度', _step_probe_mirrors, persist=False,
+             satisfied=lambda ctx: not MIRROR_PROBE or engine_ready()),
+        Step('cleanup', '清理旧版本', _step_cleanup,
+             satisfied=lambda ctx: engine_ready() or not installed_packages(LEGACY_PACKAGES + DOCKER_CE_PACKAGES)),
+        Step('apt-update', '更新包管理器', _step_apt_update, deps=('cleanup',),
+             satisfied=lambda ctx: engine_ready() or apt_lists_fresh()),
+        Step('base-packages', '安装基础依赖', _step_base_packages, deps=('apt-update',),
+             satisfied=lambda ctx: installed_packages(BASE_PACKAGES) == set(BASE_PACKAGES)),
+        Step('fetch-script', '下载 Docker 安装脚本', _step_fetch_script, persist=False, satisfied=engine_ready),
+        Step('engine', '执行 Docker 安装', _step_engine, deps=('base-packages', 'fetch-script', 'probe-mirrors'),
+             satisfied=engine_ready),
+        Step('daemon-config', '调优 daemon.json', _step_daemon_config, deps=('engine', 'probe-mirrors'), persist=False,
+             satisfied=lambda ctx: DAEMON_PROFILE == 'none' and not ctx.get('registry_mirrors')),
+        Step('service', '启动 Docker 服务', _step_service, deps=('daemon-config',), persist=False,
+             satisfied=_docker_service_ok),
+        Step('verify', '验证安装', _step_verify_docker, deps=('service',), persist=False),
+        Step('warmup', '预拉取镜像', _step_warmup, deps=('verify',), persist=False,
+             satisfied=lambda ctx: not WARMUP_IMAGES),
+    ]
+
+COMPOSE_API = 'https://api.github.com/repos/docker/compose/releases'
+# API 配额用尽时改用发布页：latest 跳转得到版本号，文件和 .sha256 从 download/<版本>/ 下载
+COMPOSE_RELEASES = 'https://github.com/docker/compose/releases'
+COMPOSE_CACHE = '/var/cache/docker-all-install/compose-releases.json'  # 发布信息缓存，按请求地址保存 ETag 和内容
+COMPOSE_CACHE_TTL = 3600  # 缓存在该时间（秒）内直接使用，过期后带 If-None-Match 重新验证
+COMPOSE_VERSION = None  # --compose-version 指定的版本（如 v2.29.1），为空时安装最新版本
+# platform.machine() 到 Compose 发布文件架构名的映射
+COMPOSE_MACHINES = {'x86_64': 'x86_64', 'amd64': 'x86_64', 'aarch64': 'aarch64', 'arm64': 'aarch64',
+                    'armv7l': 'armv7', 'armv6l': 'armv6', 'ppc64le': 'ppc64le', 's390x': 's390x', 'riscv64': 'riscv64'}
+
+def _load_release_cache(path=COMPOSE_CACHE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_release_cache(cache, path=COMPOSE_CACHE):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        log_warn(f'保存发布信息缓存失败: {e}')
+
+def release_redirect_metadata(tag=None, releases=None):
+    """不经过 API 构造发布信息：tag 为空时由 <releases>/latest 的跳转地址得到最新版本号，
+    各架构的文件和 <文件名>.sha256 指向 <releases>/download/<版本>/
+    """
+    releases = (releases or COMPOSE_RELEASES).rstrip('/')
+    if not tag:
+        req = Request(f'{releases}/latest', headers={'User-Agent': USER_AGENT}, method='HEAD')
+        with urlopen(req, timeout=DOWNLOAD_TIMEOUT) as resp:
+            m = re.search(r'/releases/tag/([^/?#]+)$', resp.geturl())
+        if not m:
+            raise ValueError(f'无法从跳转地址得到最新版本: {resp.geturl()}')
+        tag = unquote(m.group(1))
+    assets = []
+    for arch in sorted(set(COMPOSE_MACHINES.values())):
+        name = f'docker-compose-{platform.system().lower()}-{arch}'
+        for asset in (name, name + '.sha256'):
+            assets.append({'name': asset, 'browser_download_url': f'{releases}/download/{quote(tag)}/{asset}'})
+    return {'tag_name': tag, 'assets': assets}
+
+def fetch_release_metadata(tag=None, api=None, cache_path=None, ttl=None, releases=None):
+    """获取 Compose 的发布信息（GitHub releases API），tag 为空时取最新版本
+
+    结果缓存在磁盘上：TTL 内不发请求；过期后带上 ETag 重新验证，未变化时服务端返回 304，
+    不消耗 API 配额。网络不可用时退回使用过期的缓存。设置 GITHUB_TOKEN 时带上认证提高配额。
+    API 返回 403/429（未认证时每小时60次的配额用尽）且没有缓存时，改用发布页的跳转地址构造发布信息。
+    """
+    api = api or COMPOSE_API
+    cache_path = cache_path or COMPOSE_CACHE
+    ttl = COMPOSE_CACHE_TTL if ttl is None else ttl
+    url = f"{api}/tags/{quote(tag)}" if tag else f'{api}/latest'
+    cache = _load_release_cache(cache_path)
+    entry = cache.get(url)
+    if entry and time.time() - entry.get('fetched', 0) < ttl:
+        return entry['data']
+
+    headers = {'User-Agent': USER_AGENT, 'Accept': 'application/vnd.github+json'}
+    if os.environ.get('GITHUB_TOKEN'):
+        headers['Authorization'] = f"Bearer {os.environ['GITHUB_TOKEN']}"
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    try:
+        with urlopen(Request(url, headers=headers), timeout=DOWNLOAD_TIMEOUT) as resp:
+            data = json.loads(resp.read().decode('utf-8'))
+            entry = {'etag': resp.headers.get('ETag'), 'data': data}
+    except HTTPError as e:
+        e.close()
+        if e.code != 304 or not entry:
+            if entry:
+                log_warn(f'获取发布信息失败，使用缓存: {e}')
+                return entry['data']
+            if e.code in (403, 429):
+                log_warn(f'GitHub API 配额已用尽，改用发布页下载地址: {e}' if LANG == 'zh'
+                         else f'GitHub API rate limited, using release download URLs: {e}')
+                return release_redirect_metadata(tag, releases)
+            raise
+    except (URLError, OSError, ValueError) as e:
+        if not entry:
+            raise
+        log_warn(f'获取发布信息失败，使用缓存: {e}')
+        return entry['data']
+    entry['fetched'] = time.time()
+    cache[url] = entry
+    _save_release_cache(cache, cache_path)
+    return entry['data']
+
+def select_compose_asset(release, machine=None):
+    """从发布信息中选出本机系统和架构的二进制文件，返回 {tag, version, name, url, size, sha256, checksum_url}
+
+    API 提供 digest 时直接得到 sha256，否则记下 <文件名>.sha256 或 checksums.txt 的地址，
+    由 release_sha256() 在真正下载前再获取。
+    """
+    machine = machine or platform.machine()
+    arch = COMPOSE_MACHINES.get(machine)
+    if not arch:
+        raise ValueError(f'Docker Compose 没有 {machine} 架构的发布文件')
+    assets = {asset['name']: asset for asset in release.get('assets') or []}
+    name = f'docker-compose-{platform.system().lower()}-{arch}'
+    if name not in assets:
+        raise ValueError(f"{release.get('tag_name')} 中没有 {name}")
+    digest = assets[name].get('digest') or ''
+    checksum = assets.get(name + '.sha256') or assets.get('checksums.txt')
+    return {'tag': release['tag_name'], 'version': release['tag_name'].lstrip('v'), 'name': name,
+            'url': assets[name]['browser_download_url'], 'size': assets[name].get('size'),
+            'sha256': digest[len('sha256:'):].lower() if digest.startswith('sha256:') else None,
+            'checksum_url': checksum['browser_download_url'] if checksum else None}
+
+def release_sha256(release):
+    """发布文件的 SHA-256：API 的 digest，其次是 <文件名>.sha256，最后是 checksums.txt 中对应的一行"""
+    if release['sha256']:
+        return release['sha256']
+    if not release['checksum_url']:
+        raise ValueError(f"发布信息中没有 {release['name']} 的校验值")
+    if not release['checksum_url'].endswith('/checksums.txt'):
+        return fetch_published_sha256(release['checksum_url'])
+    for line in fetch_text(release['checksum_url']).splitlines():
+        m = re.match(r'^([0-9a-fA-F]{64})\s+\*?(\S+)$', line.strip())
+        if m and m.group(2) == release['name']:
+            return m.group(1).lower()
+    raise ValueError(f"checksums.txt 中没有 {release['name']}")
+
+def resolve_compose_release(tag=None, machine=None):
+    return select_compose_asset(fetch_release_metadata(tag), machine)
+
+def parse_compose_version(text):
+    """从 docker compose version 的输出中取出版本号，如 "Docker Compose version v2.29.1" -> (2, 29, 1)"""
+    m = re.search(r'v?(\d+)\.(\d+)\.(\d+)', text or '')
+    return tuple(int(part) for part in m.groups()) if m else None
+
+def installed_compose_version():
+    code, out, _ = HOST_FACTS.probe('compose-standalone')
+    return parse_compose_version(out) if code == 0 else None
+
+def _compose_current(ctx):
+    """已安装的 docker-compose 与目标版本一致时跳过下载；无法获取发布信息时只要求已安装"""
+    installed = installed_compose_version()
+    if installed is None:
+        return False
+    try:
+        ctx['compose_release'] = resolve_compose_release(COMPOSE_VERSION)
+    except (URLError, OSError, ValueError, KeyError) as e:
+        log_warn(f'无法获取 Docker Compose 发布信息，保留已安装的版本: {e}')
+        return True
+    if installed == parse_compose_version(ctx['compose_release']['version']):
+        return True
+    log_info(f"Docker Compose {'.'.join(map(str, installed))} -> {ctx['compose_release']['tag']}")
+    return False
+
+def _step_compose_download(ctx):
+    try:
+        release = ctx.get('compose_release') or resolve_compose_release(COMPOSE_VERSION)
+        sha256 = release_sha256(release)
+    except (URLError, OSError, ValueError, KeyError) as e:
+        log_error(f'获取 Docker Compose 发布信息失败: {e}')
+        return False
+    log_info(f"下载 Docker Compose {release['tag']} ({release['name']})")
+    # 可能与 apt 步骤并发执行，不显示下载进度以免与其输出交错
+    if not download_file(release['url'], COMPOSE_TARGET, sha256=sha256, quiet=True):
+        log_error('下载失败')
+        return False
+    try:
+        os.chmod(COMPOSE_TARGET, 0o755)
     except Exception as e:
-        log_error(f'安装过程发生错误: {e}')
+        log_error(f'设置权限失败: {e}')
         return False
+    HOST_FACTS.invalidate()
+    return True
+
+def _step_docker_check(ctx):
+    if not is_docker_installed():
+        log_error('请先安装 Docker')
+        return False
+    return True
+
+def _step_verify_compose(ctx):
+    HOST_FACTS.invalidate()
+    if not is_docker_compose_installed():
+        log_error('Docker Compose 安装失败，命令不可用')
+        return False
+    code, out, _ = HOST_FACTS.probe('compose-standalone')
+    if code != 0:
+        log_error('Docker Compose 已安装但无法获取版本信息')
+        return False
+    log_info(f'版本信息: {out}')
+    return True
+
+def compose_install_steps(after_docker='docker-check'):
+    """Docker Compose 安装步骤；下载不依赖 Docker，可与 Docker 的安装步骤并发"""
+    steps = [
+        Step('compose-download', '下载 Docker Compose', _step_compose_download, persist=False,
+             satisfied=_compose_current),
+        Step('compose-verify', '验证 Docker Compose', _step_verify_compose,
+             deps=('compose-download', after_docker), persist=False),
+    ]
+    if after_docker == 'docker-check':
+        steps.insert(0, Step('docker-check', '检查 Docker 环境', _step_docker_check, persist=False))
+    return steps
+
+INSTALL_FORCE = False  # 忽略已完成状态和满足检查，全部步骤重新执行
+
+def _run_install(name, steps, start_msg, ok_msg):
+    if not check_dependencies():
+        return False
+    log_info(start_msg)
+    with run_report(f'install-{name}') as report:
+        try:
+            graph = StepGraph(name, steps)
+            ok = graph.run(force=INSTALL_FORCE)
+        except Exception as e:
+            log_error(f'安装过程发生错误: {e}')
+            ok = False
+        report.finish('ok' if ok else 'failed')
+    if ok:
+        log_info(f'\n\033[32m✓ {ok_msg}\033[0m')
+    return ok
+
+def install_docker():
+    return _run_install('docker', docker_install_steps(), '正在安装 Docker...', 'Docker 安装成功并正常工作！')
+
+def install_docker_compose():
+    return _run_install('docker-compose', compose_install_steps(), '正在安装 Docker Compose...', 'Docker Compose 安装成功！')
+
+def install_all():
+    """Docker 与 Docker Compose 合并为一个步骤图，Compose 下载与 apt 步骤并发进行"""
+    if BUNDLE_SOURCE:
+        return _run_install('bundle', bundle_install_steps(), f'从离线安装包安装: {BUNDLE_SOURCE}', '所有组件安装完成！')
+    steps = docker_install_steps() + compose_install_steps(after_docker='verify')
+    return _run_install('all', steps, '开始一键安装 Docker 和 Docker Compose...', '所有组件安装完成！')
+
+BUNDLE_FORMAT = 1  # 离线安装包格式版本，不兼容的变化时递增
+BUNDLE_MANIFEST = 'manifest.json'
+BUNDLE_SUMS = 'SHA256SUMS'
+BUNDLE_IMAGES = 'images.tar'
+BUNDLE_CACHE = '/var/cache/docker-all-install/bundle'  # 从 HTTP 地址安装时的下载目录，中断后续传
+BUNDLE_WORKERS = 4  # 同时下载或校验的文件数
+BUNDLE_SOURCE = None  # --bundle 指定的离线安装包目录或 HTTP 地址，设置后安装不访问外网
+BUNDLE_IMAGE_TIMEOUT = 1800  # 拉取、导出、导入镜像的超时（秒）
+DEB_DISTROS = ('ubuntu', 'debian', 'raspbian')
+# docker-ce 软件源中 RPM 系发行版的目录，衍生发行版使用 centos 的软件包
+RPM_DISTROS = {'centos': 'centos', 'rhel': 'rhel', 'fedora': 'fedora', 'rocky': 'centos', 'almalinux': 'centos', 'ol': 'centos'}
+RPM_NS = {'repo': 'http://linux.duke.edu/metadata/repo', 'common': 'http://linux.duke.edu/metadata/common'}
+
+def bundle_platform(os_release=None):
+    """本机对应的 docker-ce 软件源平台：distro、release、arch、format，以及软件包文件相对的仓库路径"""
+    info = read_os_release() if os_release is None else os_release
+    distro = info.get('ID', '').lower()
+    machine = platform.machine()
+    if distro in DEB_DISTROS:
+        codename = info.get('VERSION_CODENAME') or info.get('UBUNTU_CODENAME')
+        arch = DEB_ARCHES.get(machine)
+        if not codename or not arch:
+            raise ValueError(f'无法确定 {distro} 的版本代号或架构 ({machine})')
+        return {'distro': distro, 'release': codename, 'arch': arch, 'format': 'deb', 'repo': f'linux/{distro}'}
+    if distro in RPM_DISTROS:
+        release = info.get('VERSION_ID', '').split('.')[0]
+        if not release:
+            raise ValueError(f'无法确定 {distro} 的版本号')
+        return {'distro': distro, 'release': release, 'arch': machine, 'format': 'rpm',
+                'repo': f'linux/{RPM_DISTROS[distro]}/{release}/{machine}/stable'}
+    raise ValueError(f"不支持的发行版: {distro or '未知'}")
+
+def _split_evr(version):
+    """把 [epoch:]version[-release] 拆成 (epoch, version, release)，deb 和 rpm 的版本格式相同"""
+    epoch, sep, rest = version.partition(':')
+    if not sep or not epoch.isdigit():
+        epoch, rest = '0', version
+    upstream, sep, release = rest.rpartition('-')
+    if not sep:
+        upstream, release = rest, ''
+    return int(epoch), upstream, release
+
+def _dpkg_order(char):
+    if char == '~':
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+def _dpkg_compare(a, b):
+    """dpkg 的版本片段比较：非数字部分逐字符比较（~ 最小），数字部分按数值比较"""
+    while a or b:
+        text_a = re.match(r'[^0-9]*', a).group()
+        text_b = re.match(r'[^0-9]*', b).group()
+        for i in range(max(len(text_a), len(text_b))):
+            order_a = _dpkg_order(text_a[i]) if i < len(text_a) else 0
+            order_b = _dpkg_order(text_b[i]) if i < len(text_b) else 0
+            if order_a != order_b:
+                return -1 if order_a < order_b else 1
+        a, b = a[len(text_a):], b[len(text_b):]
+        num_a = re.match(r'[0-9]*', a).group()
+        num_b = re.match(r'[0-9]*', b).group()
+        if int(num_a or 0) != int(num_b or 0):
+            return -1 if int(num_a or 0) < int(num_b or 0) else 1
+        a, b = a[len(num_a):], b[len(num_b):]
+    return 0
+
+def _rpm_compare(a, b):
+    """rpmvercmp：按数字段和字母段比较，数字段比字母段新，~ 比任何内容都旧"""
+    for seg_a, seg_b in zip_longest(re.findall(r'~|[0-9]+|[A-Za-z]+', a), re.findall(r'~|[0-9]+|[A-Za-z]+', b)):
+        if seg_a == '~' or seg_b == '~':
+            if seg_a != seg_b:
+                return -1 if seg_a == '~' else 1
+            continue
+        if seg_a is None or seg_b is None:
+            return -1 if seg_a is None else 1
+        if seg_a.isdigit() != seg_b.isdigit():
+            return 1 if seg_a.isdigit() else -1
+        if seg_a.isdigit():
+            seg_a, seg_b = int(seg_a), int(seg_b)
+        if seg_a != seg_b:
+            return -1 if seg_a < seg_b else 1
+    return 0
+
+def compare_versions(a, b, fmt='deb'):
+    compare = _dpkg_compare if fmt == 'deb' else _rpm_compare
+    epoch_a, upstream_a, release_a = _split_evr(a)
+    epoch_b, upstream_b, release_b = _split_evr(b)
+    if epoch_a != epoch_b:
+        return -1 if epoch_a < epoch_b else 1
+    return compare(upstream_a, upstream_b) or compare(release_a, release_b)
+
+def _decompress(data, name):
+    if name.endswith('.gz'):
+        return gzip.decompress(data)
+    if name.endswith('.xz'):
+        return lzma.decompress(data)
+    if name.endswith('.bz2'):
+        return bz2.decompress(data)
+    return data
+
+def parse_deb_packages(data):
+    """解析 apt 的 Packages 索引"""
+    for paragraph in re.split(r'\n\s*\n', data):
+        fields = {}
+        for line in paragraph.splitlines():
+            if line[:1] in (' ', '\t'):
+                continue  # 多行字段的续行
+            key, sep, value = line.partition(':')
+            if sep:
+                fields[key] = value.strip()
+        if 'Package' in fields and 'Filename' in fields:
+            yield {'name': fields['Package'], 'version': fields.get('Version', ''), 'path': fields['Filename'],
+                   'sha256': fields.get('SHA256'), 'size': int(fields.get('Size') or 0),
+                   'depends': _deb_depends_names(f"{fields.get('Pre-Depends', '')},{fields.get('Depends', '')}")}
+
+def _deb_depends_names(field):
+    """Depends 字段中的软件包名：去掉版本约束和架构限定，可选依赖（a | b）取第一个"""
+    names = []
+    for group in field.split(','):
+        name = re.split(r'[\s(:]', group.split('|')[0].strip(), 1)[0]
+        if name:
+            names.append(name)
+    return names
+
+def parse_rpm_primary(data, arch):
+    """解析 yum 仓库的 primary.xml，只保留本机架构和 noarch 的软件包"""
+    root = ET.fromstring(data)
+    for pkg in root.findall('common:package', RPM_NS):
+        if pkg.findtext('common:arch', namespaces=RPM_NS) not in (arch, 'noarch'):
+            continue
+        version = pkg.find('common:version', RPM_NS)
+        checksum = pkg.find('common:checksum', RPM_NS)
+        size = pkg.find('common:size', RPM_NS)
+        yield {
+            'name': pkg.findtext('common:name', namespaces=RPM_NS),
+            'version': f"{version.get('epoch', '0')}:{version.get('ver')}-{version.get('rel')}",
+            'path': pkg.find('common:location', RPM_NS).get('href'),
+            'sha256': checksum.text.strip() if checksum is not None and checksum.get('type') == 'sha256' else None,
+            'size': int(size.get('package', 0)) if size is not None else 0,
+        }
+
+def fetch_package_index(plat, mirror):
+    """下载 docker-ce 软件源的软件包索引，返回 (仓库地址, 软件包列表)"""
+    base = f"{mirror.rstrip('/')}/{plat['repo']}"
+    if plat['format'] == 'deb':
+        index = f"{base}/dists/{plat['release']}/stable/binary-{plat['arch']}/Packages"
+        try:
+            data = fetch_bytes(index)
+        except HTTPError:
+            data = gzip.decompress(fetch_bytes(index + '.gz'))
+        return base, list(parse_deb_packages(data.decode('utf-8', 'replace')))
+    repomd = ET.fromstring(fetch_bytes(f'{base}/repodata/repomd.xml'))
+    for data in repomd.findall('repo:data', RPM_NS):
+        if data.get('type') == 'primary':
+            href = data.find('repo:location', RPM_NS).get('href')
+            return base, list(parse_rpm_primary(_decompress(fetch_bytes(f'{base}/{href}'), href), plat['arch']))
+    raise ValueError(f'{base} 的 repomd.xml 中没有 primary 索引')
+
+def select_bundle_packages(index, fmt, docker_version=None):
+    """每个 docker-ce 软件包取最新版本；指定 docker_version 时 docker-ce 和 docker-ce-cli 取该版本的最新修订"""
+    selected = {}
+    key = cmp_to_key(lambda a, b: compare_versions(a['version'], b['version'], fmt))
+    for name in DOCKER_CE_PACKAGES:
+        candidates = [pkg for pkg in index if pkg['name'] == name]
+        if docker_version and name in ('docker-ce', 'docker-ce-cli'):
+            candidates = [pkg for pkg in candidates if _split_evr(pkg['version'])[1] == docker_version]
+        if not candidates:
+            raise ValueError(f"软件源中没有 {name}{' ' + docker_version if docker_version else ''}")
+        selected[name] = max(candidates, key=key)
+    return [selected[name] for name in DOCKER_CE_PACKAGES]
+
+def _fetch_verified(url, target, sha256):
+    # 已存在且校验一致的文件不重复下载，中断后重新执行只补齐缺少的文件
+    if sha256 and os.path.exists(target) and file_sha256(target) == sha256.lower():
+        return True
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    return download_file(url, target, sha256=sha256, quiet=True)
+
+def fetch_files(items, workers=BUNDLE_WORKERS):
+    """并发下载 (url, 目标路径, sha256) 列表，全部成功时返回 True"""
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_fetch_verified, *item): item for item in items}
+        for future in as_completed(futures):
+            url, target, _ = futures[future]
+            try:
+                ok = future.result()
+            except OSError as e:
+                log_error(f'{url}: {e}')
+                ok = False
+            if ok:
+                log_info(f'  {os.path.basename(target)} ({format_size(os.path.getsize(target))})')
+            else:
+                failed.append(url)
+    if failed:
+        log_error(('下载失败: ' if LANG == 'zh' else 'Download failed: ') + ', '.join(failed))
+    return not failed
+
+BUNDLE_DEPS_DIR = 'packages/deps'  # 安装包中 docker-ce 依赖的软件包目录
+
+def _collect_lines(lines, streams=('stdout',)):
+    # exec_command 只保留输出末尾，依赖列表可能更长，逐行收集完整输出
+    return lambda stream, line: stream in streams and lines.append(line)
+
+def _deb_dependency_uris(packages):
+    """deb：从 docker-ce 软件包的直接依赖出发，用 apt-cache depends --recurse 求出完整的依赖闭包，
+    再由 apt-get download --print-uris 得到下载地址，返回 [(url, 文件名, sha256)]
+    """
+    bundled = {pkg['name'] for pkg in packages}
+    direct = sorted({name for pkg in packages for name in pkg.get('depends') or ()} - bundled)
+    if not direct:
+        return []
+    lines = []
+    code, _, err = exec_command('apt-cache', 'depends', '--recurse', '--no-recommends', '--no-suggests',
+                                '--no-conflicts', '--no-breaks', '--no-replaces', '--no-enhances', *direct,
+                                on_line=_collect_lines(lines))
+    if code != 0:
+        raise ValueError(f'apt-cache depends 失败: {err.strip()}')
+    # 顶格的行是软件包名，<...> 是虚拟包（其提供者会单独列出）
+    names = sorted({line.strip() for line in lines if line[:1] not in ('', ' ', '<', '|')} - bundled)
+    lines = []
+    code, _, err = exec_command('apt-get', 'download', '--print-uris', *names, on_line=_collect_lines(lines))
+    if code != 0:
+        raise ValueError(f'apt-get download --print-uris 失败: {err.strip()}')
+    uris = []
+    for line in lines:
+        m = re.match(r"^'(\S+)'\s+(\S+)\s+\d+\s+(\S+)", line)
+        if m:
+            digest = m.group(3)
+            uris.append((m.group(1), m.group(2), digest[len('SHA256:'):].lower() if digest.startswith('SHA256:') else None))
+    return uris
+
+def _rpm_dependency_uris(files):
+    """rpm：取已下载软件包的 Requires 中安装包自身不提供的部分，
+    由 dnf download --resolve --alldeps（或 yumdownloader --resolve）求出依赖闭包的下载地址
+    """
+    if HOST_FACTS.which('dnf'):
+        downloader = ('dnf', 'download', '--resolve', '--alldeps', '--url')
+    elif HOST_FACTS.which('yumdownloader'):
+        downloader = ('yumdownloader', '--resolve', '--urls')
+    else:
+        raise FileNotFoundError('dnf / yumdownloader')
+    requires, provided = [], []
+    for query, lines in ((('-qpR',), requires), (('-qp', '--provides'), provided), (('-qpl',), provided)):
+        code, _, err = exec_command('rpm', *query, *files, on_line=_collect_lines(lines))
+        if code != 0:
+            raise ValueError(f"rpm {' '.join(query)} 失败: {err.strip()}")
+    provided = {line.split()[0] for line in provided if line.strip()}
+    caps = sorted({line.split()[0] for line in requires if line.strip() and not line.startswith('rpmlib(')} - provided)
+    if not caps:
+        return []
+    lines = []
+    code, _, err = exec_command(*downloader, *caps, on_line=_collect_lines(lines))
+    if code != 0:
+        raise ValueError(f"{' '.join(downloader[:2])} 失败: {err.strip()}")
+    urls = sorted({line.strip() for line in lines if re.match(r'^(https?|ftp)://\S+\.rpm$', line.strip())})
+    return [(url, os.path.basename(unquote(url)), None) for url in urls]
+
+def resolve_bundle_dependencies(plat, packages, files):
+    """docker-ce 软件包在本发行版上的依赖闭包，返回 [{name, version, file, url, sha256}]
+
+    生成主机与安装包的发行版和架构相同（由 bundle_platform 保证），使用本机的 apt / dnf 元数据解析。
+    包含目标主机上可能已经安装的基础软件包，安装时只安装其中缺少的。
+    """
+    if plat['format'] == 'deb':
+        if not (HOST_FACTS.which('apt-cache') and HOST_FACTS.which('apt-get')):
+            raise FileNotFoundError('apt-cache / apt-get')
+        uris = _deb_dependency_uris(packages)
+    else:
+        if not HOST_FACTS.which('rpm'):
+            raise FileNotFoundError('rpm')
+        uris = _rpm_dependency_uris(files)
+    deps = []
+    for url, filename, sha256 in uris:
+        filename = unquote(filename)
+        if plat['format'] == 'deb':
+            m = re.match(r'^([^_]+)_([^_]+)_[^_]+\.deb$', filename)
+        else:
+            m = re.match(r'^(.+)-([^-]+-[^-]+)\.[^.]+\.rpm$', filename)
+        if not m:
+            raise ValueError(f'无法识别的软件包文件名: {filename}')
+        deps.append({'name': m.group(1), 'version': m.group(2), 'file': f'{BUNDLE_DEPS_DIR}/{filename}',
+                     'url': url, 'sha256': sha256})
+    return deps
+
+def split_image_ref(ref):
+    """把镜像引用拆成 /images/create 的 fromImage 和 tag（也可以是 digest）"""
+    if '@' in ref:
+        return tuple(ref.split('@', 1))
+    name, sep, tag = ref.rpartition(':')
+    if sep and '/' not in tag:
+        return name, tag
+    return ref, 'latest'
+
+def _check_json_stream(resp, on_message=None):
+    """逐行读取 Engine API 的 JSON 消息流，出现 error 时抛出 DockerAPIError，返回 stream 文本
+
+    on_message(message) 对每条消息调用，用于跟踪拉取进度。
+    """
+    messages = []
+    for line in resp:
+        try:
+            message = json.loads(line.decode('utf-8'))
+        except ValueError:
+            continue
+        if message.get('error'):
+            raise DockerAPIError(resp.status, message['error'].encode('utf-8'))
+        if on_message:
+            on_message(message)
+        if message.get('stream'):
+            messages.append(message['stream'].strip())
+    return messages
+
+def image_exists(ref):
+    return docker_api('GET', f"/images/{quote(ref, safe='/:@')}/json")[0] == 200
+
+DOCKER_HUB_AUTH_KEYS = ('https://index.docker.io/v1/', 'index.docker.io', 'docker.io', 'registry-1.docker.io')
+
+def image_registry(name):
+    """镜像名中的仓库地址，没有时为 Docker Hub"""
+    first, sep, _ = name.partition('/')
+    if sep and ('.' in first or ':' in first or first == 'localhost') and first not in DOCKER_HUB_AUTH_KEYS:
+        return first
+    return 'docker.io'
+
+def normalize_image_ref(ref):
+    """补全仓库地址和标签，nginx、nginx:latest、docker.io/library/nginx:latest 视为同一镜像"""
+    name, tag = split_image_ref(ref.strip())
+    if image_registry(name) == 'docker.io':
+        path = name.split('/', 1)[1] if name.split('/', 1)[0] in DOCKER_HUB_AUTH_KEYS else name
+        name = 'docker.io/' + (path if '/' in path else 'library/' + path)
+    return f"{name}{'@' if tag.startswith('sha256:') else ':'}{tag}"
+
+def registry_auth_header(name):
+    """从 docker 客户端配置（~/.docker/config.json）的 auths 生成 X-Registry-Auth，未登录时返回空"""
+    config_dir = os.environ.get('DOCKER_CONFIG') or os.path.expanduser('~/.docker')
+    try:
+        with open(os.path.join(config_dir, 'config.json'), 'r', encoding='utf-8') as f:
+            auths = json.load(f).get('auths') or {}
+    except (OSError, ValueError):
+        return {}
+    registry = image_registry(name)
+    keys = DOCKER_HUB_AUTH_KEYS if registry == 'docker.io' else (registry, f'https://{registry}', f'http://{registry}')
+    for key in keys:
+        entry = auths.get(key) or {}
+        if not entry.get('auth'):
+            continue
+        try:
+            username, _, password = base64.b64decode(entry['auth']).decode('utf-8').partition(':')
+        except (ValueError, UnicodeDecodeError):
+            continue
+        payload = {'username': username, 'password': password, 'serveraddress': key}
+        return {'X-Registry-Auth': base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')}
+    return {}
+
+def pull_image(ref, on_message=None):
+    name, tag = split_image_ref(ref)
+    query = urlencode({'fromImage': name, 'tag': tag})
+    with docker_api_stream('POST', f'/images/create?{query}', headers=registry_auth_header(name),
+                           timeout=BUNDLE_IMAGE_TIMEOUT) as resp:
+        _check_json_stream(resp, on_message)
+
+def save_images(refs, target):
+    """本地没有的镜像先拉取，再通过 /images/get 一次导出为 tar，共享的镜像层只保存一份"""
+    for ref in refs:
+        if not image_exists(ref):
+            log_info(f'拉取镜像 {ref}' if LANG == 'zh' else f'Pulling {ref}')
+            pull_image(ref)
+    part = target + '.part'
+    query = urlencode([('names', ref) for ref in refs])
+    with docker_api_stream('GET', f'/images/get?{query}', timeout=BUNDLE_IMAGE_TIMEOUT) as resp, open(part, 'wb') as f:
+        shutil.copyfileobj(resp, f, DOWNLOAD_CHUNK_SIZE)
+    os.replace(part, target)
+
+def load_images(path):
+    """通过 /images/load 流式导入镜像 tar，返回 dockerd 输出的 Loaded image 信息"""
+    headers = {'Content-Type': 'application/x-tar', 'Content-Length': str(os.path.getsize(path))}
+    with open(path, 'rb') as f:
+        with docker_api_stream('POST', '/images/load', body=f, headers=headers, timeout=BUNDLE_IMAGE_TIMEOUT) as resp:
+            return _check_json_stream(resp)
+
+def write_sha256sums(root, names, workers=BUNDLE_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = list(pool.map(lambda name: file_sha256(os.path.join(root, name)), names))
+    tmp_path = os.path.join(root, BUNDLE_SUMS + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for name, digest in sorted(zip(names, digests), key=lambda item: item[0]):
+            f.write(f'{digest}  {name}\n')
+    os.replace(tmp_path, os.path.join(root, BUNDLE_SUMS))
+
+def parse_sha256sums(data):
+    """解析 SHA256SUMS，拒绝绝对路径和 .. 以免写到安装包目录之外"""
+    sums = {}
+    for line in data.splitlines():
+        m = re.match(r'^([0-9a-fA-F]{64}) [ *]?(.+)$', line.strip())
+        if not m:
+            continue
+        name = m.group(2)
+        if name.startswith('/') or '..' in name.split('/'):
+            raise ValueError(f'{BUNDLE_SUMS} 中的文件名不安全: {name}')
+        sums[name] = m.group(1).lower()
+    return sums
+
+def export_bundle(target_dir, images=(), docker_version=None):
+    """下载本机发行版的 docker-ce 软件包、Docker Compose 和可选的镜像，生成带版本号的离线安装包目录
+
+    目录可直接复制到目标主机，或用任意 HTTP 服务（如 python3 -m http.server）在局域网内共享。
+    SHA256SUMS 最后写入，存在即表示安装包完整；中断后重新执行只下载缺少的文件。
+    """
+    started = time.time()
+    plat = bundle_platform()
+    mirror = DOCKER_CE_MIRRORS[0]
+    if MIRROR_PROBE and len(DOCKER_CE_MIRRORS) > 1:
+        mirror = report_mirror_probe(*probe_mirrors(DOCKER_CE_MIRRORS, []))[0] or mirror
+    log_info(f'读取软件包索引: {mirror}' if LANG == 'zh' else f'Reading package index from {mirror}')
+    base, index = fetch_package_index(plat, mirror)
+    packages = select_bundle_packages(index, plat['format'], docker_version)
+    engine_version = _split_evr(packages[0]['version'])[1]
+    compose = resolve_compose_release(COMPOSE_VERSION)
+
+    name = f"docker-bundle-{engine_version}-{plat['distro']}-{plat['release']}-{plat['arch']}"
+    root = os.path.join(target_dir, name)
+    try:
+        os.remove(os.path.join(root, BUNDLE_SUMS))
+    except OSError:
+        pass
+    items = [(f"{base}/{pkg['path']}", os.path.join(root, 'packages', os.path.basename(pkg['path'])), pkg['sha256'])
+             for pkg in packages]
+    items.append((compose['url'], os.path.join(root, 'docker-compose'), release_sha256(compose)))
+    log_info(f'下载 {len(items)} 个文件到 {root}' if LANG == 'zh' else f'Downloading {len(items)} files into {root}')
+    if not fetch_files(items):
+        return None
+    os.chmod(os.path.join(root, 'docker-compose'), 0o755)
+
+    try:
+        deps = resolve_bundle_dependencies(plat, packages, [item[1] for item in items[:-1]])
+    except (OSError, ValueError) as e:
+        log_error(f'解析 docker-ce 软件包的依赖失败: {e}' if LANG == 'zh'
+                  else f'Failed to resolve docker-ce package dependencies: {e}')
+        return None
+    log_info(f'下载 {len(deps)} 个依赖软件包' if LANG == 'zh' else f'Downloading {len(deps)} dependency packages')
+    if not fetch_files([(dep['url'], os.path.join(root, dep['file']), dep['sha256']) for dep in deps]):
+        return None
+
+    images = list(images)
+    if images:
+        log_info(f'导出镜像: {", ".join(images)}' if LANG == 'zh' else f'Saving images: {", ".join(images)}')
+        save_images(images, os.path.join(root, BUNDLE_IMAGES))
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'name': name,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'platform': {key: plat[key] for key in ('distro', 'release', 'arch', 'format')},
+        'docker_version': engine_version,
+        'packages': [{'name': pkg['name'], 'version': pkg['version'],
+                      'file': f"packages/{os.path.basename(pkg['path'])}"} for pkg in packages],
+        'dependencies': [{key: dep[key] for key in ('name', 'version', 'file')} for dep in deps],
+        'compose': {'version': compose['tag'], 'file': 'docker-compose', 'machine': platform.machine()},
+        'images': images,
+        'images_file': BUNDLE_IMAGES if images else None,
+        'source': mirror,
+    }
+    with open(os.path.join(root, BUNDLE_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    files = [BUNDLE_MANIFEST, 'docker-compose'] + [pkg['file'] for pkg in manifest['packages'] + manifest['dependencies']]
+    if images:
+        files.append(BUNDLE_IMAGES)
+    write_sha256sums(root, files)
+
+    total = sum(os.path.getsize(os.path.join(root, rel)) for rel in files)
+    log_info(f'离线安装包已生成: {root}（{format_size(total)}，用时 {time.time() - started:.1f}s）' if LANG == 'zh'
+             else f'Bundle written to {root} ({format_size(total)}, {time.time() - started:.1f}s)')
+    return root
+
+def _is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+def _read_bundle_file(source, name):
+    if _is_url(source):
+        return fetch_bytes(f"{source.rstrip('/')}/{quote(name)}")
+    with open(os.path.join(source, name), 'rb') as f:
+        return f.read()
+
+def _step_bundle_fetch(ctx):
+    source = BUNDLE_SOURCE
+    sums = parse_sha256sums(_read_bundle_file(source, BUNDLE_SUMS).decode('utf-8'))
+    if BUNDLE_MANIFEST not in sums:
+        log_error(f'{BUNDLE_SUMS} 中没有 {BUNDLE_MANIFEST}')
+        return False
+    data = _read_bundle_file(source, BUNDLE_MANIFEST)
+    if hashlib.sha256(data).hexdigest() != sums[BUNDLE_MANIFEST]:
+        log_error(f'{BUNDLE_MANIFEST} 校验失败')
+        return False
+    manifest = json.loads(data.decode('utf-8'))
+    if manifest.get('format') != BUNDLE_FORMAT:
+        log_error(f"不支持的安装包格式: {manifest.get('format')}")
+        return False
+
+    host = bundle_platform()
+    mismatched = [f'{key}: {manifest["platform"].get(key)} != {host[key]}'
+                  for key in ('distro', 'release', 'arch', 'format') if manifest['platform'].get(key) != host[key]]
+    if mismatched:
+        log_error(f"安装包 {manifest['name']} 与本机不匹配（{'; '.join(mismatched)}）")
+        return False
+    log_info(f"离线安装包: {manifest['name']}，Docker {manifest['docker_version']}，"
+             f"Compose {manifest['compose']['version']}，镜像 {len(manifest['images'])} 个")
+
+    if _is_url(source):
+        root = os.path.join(BUNDLE_CACHE, manifest['name'])
+        items = [(f"{source.rstrip('/')}/{quote(name)}", os.path.join(root, name), digest)
+                 for name, digest in sums.items() if name != BUNDLE_MANIFEST]
+        if not fetch_files(items):
+            return False
+    else:
+        root = source
+        names = [name for name in sums if name != BUNDLE_MANIFEST]
+        with ThreadPoolExecutor(max_workers=BUNDLE_WORKERS) as pool:
+            digests = list(pool.map(lambda name: file_sha256(os.path.join(root, name)), names))
+        bad = [name for name, digest in zip(names, digests) if digest != sums[name]]
+        if bad:
+            log_error(f"校验失败: {', '.join(bad)}")
+            return False
+    if not docker_engine_ready():
+        missing = bundle_missing_dependencies(manifest, root)
+        if missing:
+            log_error(('安装包缺少以下依赖，离线安装无法完成（请在与本机相同发行版的主机上重新生成安装包）:'
+                       if LANG == 'zh' else 'The bundle lacks these dependencies and cannot install offline '
+                       '(re-export it on a host running the same distribution):'))
+            for line in missing:
+                log_error(f'  {line}')
+            return False
+    ctx['bundle'] = manifest
+    ctx['bundle_dir'] = root
+    # 离线安装不探测镜像，--registry-mirrors 指定的地址（如局域网内的加速地址）直接写入 daemon.json
+    ctx['registry_mirrors'] = REGISTRY_OVERRIDE
+    return True
+
+def bundle_package_files(manifest, root):
+    """要安装的软件包文件：全部 docker-ce 软件包，以及本机还没有安装的依赖"""
+    deps = manifest.get('dependencies') or []
+    installed = installed_packages(tuple(dep['name'] for dep in deps)) if deps else set()
+    return [os.path.join(root, pkg['file']) for pkg in manifest['packages']
+            + [dep for dep in deps if dep['name'] not in installed]]
+
+def bundle_missing_dependencies(manifest, root):
+    """不访问软件源检查安装包能否装上，返回缺少的依赖（每项一行说明），无法检查时返回空列表
+
+    deb 用 apt-get install -s 模拟安装，需要安装却不在安装包中的软件包即缺少的依赖；
+    rpm 用 rpm -U --test 检查，不读取软件源。
+    """
+    files = bundle_package_files(manifest, root)
+    lines = []
+    if manifest['platform']['format'] == 'deb':
+        if not HOST_FACTS.which('apt-get'):
+            return []
+        code, _, _ = exec_command('apt-get', 'install', '-s', '--no-install-recommends', *files,
+                                  on_line=_collect_lines(lines, ('stdout', 'stderr')))
+        bundled = {pkg['name'] for pkg in manifest['packages'] + (manifest.get('dependencies') or [])}
+        missing = sorted({line.split()[1].split(':')[0] for line in lines if line.startswith('Inst ')} - bundled)
+        if code != 0:
+            missing += [line.strip() for line in lines if 'Depends:' in line or line.startswith('E:')]
+        return missing
+    if not HOST_FACTS.which('rpm'):
+        return []
+    exec_command('rpm', '-U', '--test', *files, on_line=_collect_lines(lines, ('stdout', 'stderr')))
+    return [line.strip() for line in lines if 'is needed by' in line]
+
+def _step_bundle_packages(ctx):
+    files = bundle_package_files(ctx['bundle'], ctx['bundle_dir'])
+    if ctx['bundle']['platform']['format'] == 'deb':
+        # 本地文件作为参数，依赖已由安装包提供并在获取安装包时检查过
+        argv = ('apt-get', 'install', '-y', '--no-install-recommends') + tuple(files)
+    else:
+        # 无法访问的软件源跳过，依赖齐全时完全离线完成
+        argv = ('yum', 'install', '-y', '--setopt=skip_if_unavailable=True') + tuple(files)
+    code, _, err = exec_command(*argv, stream=True, timeout=1800)
+    HOST_FACTS.invalidate()
+    if code != 0:
+        log_error(f'安装 Docker 软件包失败: {err}')
+        return False
+    return True
+
+def _bundle_compose_ok(ctx):
+    return installed_compose_version() == parse_compose_version(ctx['bundle']['compose']['version'])
+
+def _step_bundle_compose(ctx):
+    tmp_path = COMPOSE_TARGET + '.part'
+    shutil.copyfile(os.path.join(ctx['bundle_dir'], ctx['bundle']['compose']['file']), tmp_path)
+    os.chmod(tmp_path, 0o755)
+    os.replace(tmp_path, COMPOSE_TARGET)
+    HOST_FACTS.invalidate()
+    return True
+
+def _bundle_images_loaded(ctx):
+    images = ctx['bundle'].get('images') or []
+    return all(image_exists(ref) for ref in images)
+
+def _step_bundle_images(ctx):
+    started = time.time()
+    for line in load_images(os.path.join(ctx['bundle_dir'], ctx['bundle']['images_file'])):
+        log_info(line)
+    log_info(f'镜像导入完成，用时 {time.time() - started:.1f}s')
+    return True
+
+def bundle_install_steps():
+    """从离线安装包安装：不更新软件源、不下载安装脚本，清理、调优、启动和验证步骤与在线安装相同"""
+    shared = {step.name: step for step in docker_install_steps() + compose_install_steps(after_docker='verify')}
+    shared['daemon-config'].deps = ('bundle-packages',)
+    shared['compose-verify'].deps = ('bundle-compose', 'verify')
+    return [
+        Step('bundle-fetch', '获取并校验离线安装包', _step_bundle_fetch, persist=False),
+        shared['cleanup'],
+        Step('bundle-packages', '安装 Docker 软件包', _step_bundle_packages, deps=('bundle-fetch', 'cleanup'),
+             satisfied=docker_engine_ready),
+        Step('bundle-compose', '安装 Docker Compose', _step_bundle_compose, deps=('bundle-fetch',), persist=False,
+             satisfied=_bundle_compose_ok),
+        shared['daemon-config'],
+        shared['service'],
+        Step('bundle-images', '导入预置镜像', _step_bundle_images, deps=('service',), persist=False,
+             satisfied=_bundle_images_loaded),
+        shared['verify'],
+        shared['compose-verify'],
+        shared['warmup'],
+    ]
+
+WARMUP_IMAGES = []  # 安装完成后预拉取的镜像（--warmup-images 与 --compose-file 中的镜像，已去重）
+WARMUP_PARALLEL = 4  # 同时拉取的镜像数
+WARMUP_PROGRESS_INTERVAL = 0.5  # 汇总进度刷新间隔（秒）
+COMPOSE_IMAGE_RE = re.compile(r'^\s+image:\s*["\']?([^"\'#\s]+)["\']?\s*(?:#.*)?$')
+COMPOSE_VAR_RE = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)(?:(:?[-?])([^}]*))?\}|\$([A-Za-z_][A-Za-z0-9_]*)')
+
+def _compose_env(path):
+    """compose 文件同目录 .env 中的变量，进程环境变量优先"""
+    env = {}
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(path)), '.env'), 'r', encoding='utf-8') as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if sep and not key.startswith('#'):
+                    env[key.strip()] = value.strip().strip('"\'')
+    except OSError:
+        pass
+    env.update(os.environ)
+    return env
+
+def _expand_compose_vars(value, env):
+    def expand(match):
+        name = match.group(1) or match.group(4)
+        op, default = match.group(2), match.group(3) or ''
+        current = env.get(name)
+        if op == ':-' and not current or op == '-' and current is None:
+            return default
+        return current or ''
+    return COMPOSE_VAR_RE.sub(expand, value.replace('$$', '\0')).replace('\0', '$')
+
+def compose_images(path):
+    """compose 文件引用的镜像
+
+    优先使用 docker compose config --images（支持 extends、多文件合并和完整的变量插值），
+    Compose 不可用时按行读取 services 下的 image: 并展开 ${VAR:-默认值}。
+    """
+    images = []
+    for probe in (['docker', 'compose'], [COMPOSE_TARGET]):
+        if not shutil.which(probe[0]):
+            continue
+        lines = []
+        code, _, _ = exec_command(*probe, '-f', path, 'config', '--images',
+                                  on_line=lambda stream, line: stream == 'stdout' and lines.append(line.strip()))
+        if code == 0:
+            return [line for line in lines if line]
+    env = _compose_env(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = COMPOSE_IMAGE_RE.match(line)
+            if match:
+                image = _expand_compose_vars(match.group(1), env)
+                if image:
+                    images.append(image)
+    return images
+
+def unique_images(refs):
+    """按规范化后的引用去重，保持原有顺序"""
+    seen = set()
+    result = []
+    for ref in refs:
+        key = normalize_image_ref(ref)
+        if key not in seen:
+            seen.add(key)
+            result.append(ref)
+    return result
+
+class PullTracker:
+    """汇总多个并发拉取的进度
+
+    dockerd 对同一层只下载一次，同时拉取的镜像共享同一个下载，各自的进度流中都会出现该层。
+    这里按层 ID 汇总：字节数只计一次并记到最先开始下载它的镜像上，被多个镜像引用
+    或本地已存在的层计为共享层。
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.layers = {}  # 层 ID -> {'current', 'total', 'owner', 'images', 'done', 'cached'}
+        self.images = {}
+        self._lock = threading.Lock()
+
+    def start_image(self, ref):
+        with self._lock:
+            self.images[ref] = {'image': ref, 'status': 'pulling', 'layers': set(), 'started': time.time(),
+                                'seconds': None, 'error': None, 'updated': None}
+
+    def finish_image(self, ref, error=None):
+        with self._lock:
+            image = self.images[ref]
+            image['seconds'] = round(time.time() - image['started'], 2)
+            image['status'] = 'failed' if error else 'done'
+            image['error'] = error
+
+    def on_message(self, ref, message):
+        status = message.get('status') or ''
+        if status.startswith('Status: '):
+            with self._lock:
+                self.images[ref]['updated'] = 'Downloaded newer image' in status
+            return
+        layer_id = message.get('id')
+        # 'Pulling from xxx' 的 id 是标签，层消息都带 progressDetail 或固定的状态文本
+        if not layer_id or status.startswith('Pulling from') or status.startswith('Digest'):
+            return
+        detail = message.get('progressDetail') or {}
+        with self._lock:
+            self.images[ref]['layers'].add(layer_id)
+            layer = self.layers.setdefault(layer_id, {'current': 0, 'total': 0, 'owner': None, 'images': set(),
+                                                      'done': False, 'cached': False})
+            layer['images'].add(ref)
+            if status == 'Already exists':
+                layer['cached'] = layer['done'] = True
+            elif status == 'Downloading':
+                if layer['owner'] is None:
+                    layer['owner'] = ref
+                layer['total'] = detail.get('total') or layer['total']
+                layer['current'] = max(layer['current'], detail.get('current') or 0)
+            elif status in ('Download complete', 'Pull complete'):
+                if layer['total']:
+                    layer['current'] = layer['total']
+                layer['done'] = True
+
+    def downloaded(self):
+        with self._lock:
+            return sum(layer['current'] for layer in self.layers.values())
+
+    def progress_text(self):
+        with self._lock:
+            done = sum(1 for image in self.images.values() if image['seconds'] is not None)
+            total = len(self.images)
+            size = sum(layer['current'] for layer in self.layers.values())
+            layers = sum(1 for layer in self.layers.values() if layer['done'])
+        elapsed = max(time.time() - self.started, 1e-6)
+        if LANG == 'zh':
+            return f'镜像 {done}/{total}，层 {layers}/{len(self.layers)}，{format_size(size)}，{format_size(size / elapsed)}/s'
+        return f'images {done}/{total}, layers {layers}/{len(self.layers)}, {format_size(size)}, {format_size(size / elapsed)}/s'
+
+    def result(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        with self._lock:
+            images = []
+            for ref, image in self.images.items():
+                shared = [layer_id for layer_id in image['layers']
+                          if self.layers[layer_id]['cached'] or len(self.layers[layer_id]['images']) > 1]
+                images.append({
+                    'image': ref,
+                    'status': image['status'],
+                    'updated': image['updated'],
+                    'seconds': image['seconds'],
+                    'layers': len(image['layers']),
+                    'shared_layers': len(shared),
+                    'bytes': sum(layer['current'] for layer in self.layers.values() if layer['owner'] == ref),
+                    'error': image['error'],
+                })
+            downloaded = sum(layer['current'] for layer in self.layers.values())
+            summary = {
+                'images': len(images),
+                'failed': sum(1 for image in images if image['status'] == 'failed'),
+                'layers': len(self.layers),
+                'downloaded_layers': sum(1 for layer in self.layers.values() if layer['owner']),
+                'cached_layers': sum(1 for layer in self.layers.values() if layer['cached']),
+                'shared_layers': sum(1 for layer in self.layers.values() if len(layer['images']) > 1),
+                'bytes': downloaded,
+                'seconds': round(elapsed, 2),
+                'bytes_per_second': round(downloaded / elapsed),
+            }
+        return {'images': images, 'summary': summary}
+
+def _pull_tracked(tracker, ref):
+    tracker.start_image(ref)
+    try:
+        pull_image(ref, lambda message: tracker.on_message(ref, message))
+    except (OSError, http.client.HTTPException, DockerAPIError) as e:
+        tracker.finish_image(ref, str(e))
+        return False
+    tracker.finish_image(ref)
+    return True
+
+def warm_up_images(images, parallel=WARMUP_PARALLEL, progress=True):
+    """通过 Engine API 并发拉取镜像，返回 PullTracker.result()"""
+    tracker = PullTracker()
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        futures = [pool.submit(_pull_tracked, tracker, ref) for ref in unique_images(images)]
+        while not all(future.done() for future in futures):
+            if progress:
+                sys.stdout.write(f'\r  {tracker.progress_text()}   ')
+                sys.stdout.flush()
+            wait(futures, timeout=WARMUP_PROGRESS_INTERVAL)
+    if progress:
+        sys.stdout.write(f'\r  {tracker.progress_text()}   \n')
+    return tracker.result()
+
+WARMUP_COLUMNS = (10, 10, 12, 10)
+
+def print_warm_up(result):
+    zh = LANG == 'zh'
+    header = ('状态', '层/共享', '下载', '用时', '镜像') if zh else ('STATUS', 'LAYERS', 'BYTES', 'TIME', 'IMAGE')
+    labels = {'done': '已更新' if zh else 'pulled', 'current': '已是最新' if zh else 'current', 'failed': '失败' if zh else 'failed'}
+    print()
+    print(''.join(_pad(value, width, right=i > 0) for i, (value, width) in enumerate(zip(header, WARMUP_COLUMNS)))
+          + '  ' + header[-1])
+    for image in result['images']:
+        status = 'current' if image['status'] == 'done' and image['updated'] is False else image['status']
+        row = (labels[status], f"{image['layers']}/{image['shared_layers']}", format_size(image['bytes']),
+               f"{image['seconds'] or 0:.1f}s")
+        print(''.join(_pad(value, width, right=i > 0) for i, (value, width) in enumerate(zip(row, WARMUP_COLUMNS)))
+              + '  ' + image['image'])
+        if image['error']:
+            print(f"  \033[31m{image['error']}\033[0m")
+    s = result['summary']
+    if zh:
+        print(f"共 {s['images']} 个镜像，{s['layers']} 个不同的层（下载 {s['downloaded_layers']}，本地已有 {s['cached_layers']}，"
+              f"镜像间共享 {s['shared_layers']}），下载 {format_size(s['bytes'])}，用时 {s['seconds']:.1f}s，"
+              f"平均 {format_size(s['bytes_per_second'])}/s")
+    else:
+        print(f"{s['images']} images, {s['layers']} distinct layers ({s['downloaded_layers']} downloaded, "
+              f"{s['cached_layers']} already present, {s['shared_layers']} shared between images), "
+              f"{format_size(s['bytes'])} in {s['seconds']:.1f}s, {format_size(s['bytes_per_second'])}/s")
+
+def run_warm_up(images=None, parallel=None, as_json=False):
+    """--action warmup：预拉取镜像，全部成功时返回 True"""
+    images = WARMUP_IMAGES if images is None else images
+    if not images:
+        log_warn('没有需要预拉取的镜像，请使用 --warmup-images 或 --compose-file 指定' if LANG == 'zh'
+                 else 'No images to warm up, use --warmup-images or --compose-file')
+        return True
+    ready, error = wait_for_docker()
+    if not ready:
+        log_error(f'Docker 未就绪: {error}' if LANG == 'zh' else f'Docker is not ready: {error}')
+        return False
+    result = warm_up_images(images, parallel or WARMUP_PARALLEL, progress=not as_json)
+    if as_json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_warm_up(result)
+    return not result['summary']['failed']
+
+def _step_warmup(ctx):
+    return run_warm_up()
+
+def is_docker_installed():
+    # 检查二进制文件
+    docker_paths = ['/usr/bin/docker', '/usr/local/bin/docker']
+    for path in docker_paths:
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return True
+            
+    # 检查服务状态
+    code, _, _ = HOST_FACTS.probe('docker-active')
+    if code == 0:
+        return True
+        
+    # 检查命令可用性
+    code, _, _ = HOST_FACTS.probe('docker-version')
+    return code == 0
+
+def is_docker_compose_installed():
+    code, _, _ = HOST_FACTS.probe('compose-plugin')
+    if code == 0:
+        return True
+    code, _, _ = HOST_FACTS.probe('compose-standalone')
+    return code == 0
+
+DOCKER_DATA_ROOT = '/var/lib/docker'
+PURGE_WORKERS = 16  # 并行删除的线程数
+PURGE_LOG = '/var/log/docker-all-install-purge.log'  # 卸载后后台清理数据目录的进度日志
+PURGE_LOG_INTERVAL = 5  # 后台清理写入进度的间隔（秒）
+
+def mounts_under(path):
+    """返回挂载在 path 之下（不含 path 本身）的挂载点，按深度从深到浅排列"""
+    prefix = os.path.realpath(path).rstrip('/') + '/'
+    mounts = []
+    try:
+        with open('/proc/self/mountinfo', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 5:
+                    continue
+                # mountinfo 中空格等字符以八进制转义
+                mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[4])
+                if mount_point.startswith(prefix):
+                    mounts.append(mount_point)
+    except OSError:
+        pass
+    return sorted(set(mounts), key=lambda m: m.count('/'), reverse=True)
+
+def detach_mounts(path):
+    """惰性卸载 path 下仍挂载的 overlay/shm 等文件系统，避免删除时进入其它文件系统"""
+    for mount_point in mounts_under(path):
+        code, _, err = exec_command('umount', '-l', mount_point)
+        if code != 0:
+            log_warn(f'卸载 {mount_point} 失败: {err}')
+
+def stage_for_purge(path):
+    """把目录原子地改名移开，返回待删除的目录；改名完成后原路径立即可用"""
+    detach_mounts(path)
+    staged = f'{path}.purge-{time.strftime("%Y%m%d%H%M%S")}-{os.getpid()}'
+    if not os.path.ismount(path):
+        os.rename(path, staged)
+        return staged
+    # 数据目录本身是独立挂载的磁盘，无法改名：在其内部建暂存目录，把内容逐项移入
+    staged = os.path.join(path, os.path.basename(staged))
+    os.mkdir(staged, 0o700)
+    with os.scandir(path) as it:
+        for entry in it:
+            # 上次中断遗留的暂存目录由调用方单独处理
+            if not entry.name.startswith(os.path.basename(path) + '.purge-'):
+                os.rename(entry.path, os.path.join(staged, entry.name))
+    return staged
+
+class TreePurger:
+    """多线程基于 scandir 删除目录树，统计删除的文件数和回收的空间
+
+    工作线程从队列领取目录：删除其中的文件，把子目录放回队列；
+    所有文件删除后再由深到浅删除空目录。不跨越文件系统边界。
+    """
+
+    def __init__(self, roots, workers=PURGE_WORKERS):
+        self.roots = list(roots)
+        self.workers = workers
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.started = None
+        self.finished = None
+        self._dirs = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def done(self):
+        return self.finished is not None
+
+    def _run(self):
+        for root in self.roots:
+            try:
+                self._queue.put((root, os.lstat(root).st_dev, 0))
+            except OSError:
+                continue
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join()
+        # 由深到浅删除目录
+        for _, dir_path in sorted(self._dirs, reverse=True):
+            try:
+                os.rmdir(dir_path)
+            except OSError:
+                with self._lock:
+                    self.errors += 1
+        self.finished = time.time()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            dir_path, dev, depth = item
+            files = size = errors = 0
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                            if entry.is_dir(follow_symlinks=False):
+                                if st.st_dev != dev:
+                                    # 仍挂载着的文件系统，跳过
+                                    errors += 1
+                                    continue
+                                self._queue.put((entry.path, dev, depth + 1))
+                            else:
+                                os.unlink(entry.path)
+                                files += 1
+                                size += st.st_blocks * 512
+                        except OSError:
+                            errors += 1
+            except OSError:
+                errors += 1
+            with self._lock:
+                self._dirs.append((depth, dir_path))
+                self.files += files
+                self.bytes += size
+                self.errors += errors
+            self._queue.task_done()
+
+    def progress_text(self):
+        elapsed = max((self.finished or time.time()) - self.started, 1e-6)
+        return f'{self.files} 个文件，{format_size(self.bytes)}，{format_size(self.bytes / elapsed)}/s' if LANG == 'zh' \
+            else f'{self.files} files, {format_size(self.bytes)}, {format_size(self.bytes / elapsed)}/s'
+
+    def wait(self, show_progress=True):
+        while not self.done():
+            if show_progress:
+                sys.stdout.write(f'\r  {self.progress_text()}   ')
+                sys.stdout.flush()
+            self._thread.join(timeout=1)
+        if show_progress:
+            sys.stdout.write('\n')
+        return self
+
+def _purge_detached(roots, log_path):
+    """在脱离会话的孙进程中删除，进度和结果追加写入 log_path；调用方的进程退出后仍继续执行"""
+    fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    null = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null, 0)
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    sys.stdout = open(1, 'w', encoding='utf-8', closefd=False)
+    stamp = lambda: time.strftime('%Y-%m-%d %H:%M:%S')
+    print(f"{stamp()} 开始清理: {', '.join(roots)}", flush=True)
+    purger = TreePurger(roots).start()
+    while not purger.done():
+        purger._thread.join(timeout=PURGE_LOG_INTERVAL)
+        print(f'{stamp()} {purger.progress_text()}', flush=True)
+    print(f'{stamp()} 清理完成，{purger.errors} 项删除失败' if purger.errors else f'{stamp()} 清理完成', flush=True)
+    return 1 if purger.errors else 0
+
+def start_fast_purge(path=DOCKER_DATA_ROOT, log_path=PURGE_LOG):
+    """改名移开数据目录，同时接管上次中断遗留的暂存目录，在后台进程中并行删除后立即返回
+
+    删除在两次 fork 后脱离会话的进程中进行，脚本退出或 ssh 断开都不影响；
+    中途被结束时暂存目录仍在，下次卸载时接着删除。返回进度日志路径，没有需要删除的目录时返回 None。
+    """
+    roots = sorted(glob.glob(glob.escape(path) + '.purge-*'))
+    roots += sorted(glob.glob(os.path.join(glob.escape(path), os.path.basename(path) + '.purge-*')))
+    if os.path.exists(path):
+        roots.append(stage_for_purge(path))
+    if not roots:
+        return None
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        return log_path
+    code = 1
+    try:
+        os.setsid()
+        if os.fork() == 0:
+            code = _purge_detached(roots, log_path)
+        else:
+            code = 0
+    except BaseException:
+        pass
+    finally:
+        os._exit(code)
+
+def _uninstall_docker(fast_purge):
+    progress = ProgressSteps(5)
+    ok = False
+    
+    log_info('卸载 Docker ...' if LANG == 'zh' else 'Uninstalling Docker ...')
+    # --action migrate 之后数据在 daemon.json 的 data-root 中，停止服务、删除配置前先确定；
+    # 原位置留下的旧副本一并删除
+    data_roots = [current_data_root()]
+    if os.path.realpath(data_roots[0]) != os.path.realpath(DOCKER_DATA_ROOT):
+        data_roots.append(DOCKER_DATA_ROOT)
+    data_roots = [root for root in data_roots if os.path.realpath(root) != '/']
+    
+    try:
+        # 1. 停止服务
+        progress.next('停止 Docker 服务')
+        exec_command('systemctl', 'stop', 'docker')
+        exec_command('systemctl', 'disable', 'docker')
+        exec_command('pkill', 'docker')
+        
+        # 2. 卸载包
+        progress.next('移除 Docker 包')
+        exec_command('apt-get', 'remove', '-y', 'docker', 'docker-engine', 'docker.io', 'containerd', 'runc', stream=True, timeout=900)
+        exec_command('apt-get', 'purge', '-y', 'docker-ce', 'docker-ce-cli', 'containerd.io', stream=True, timeout=900)
+        exec_command('yum', 'remove', '-y', 'docker', 'docker-client', 'docker-client-latest', 'docker-common', 'docker-latest', 'docker-latest-logrotate', 'docker-logrotate', 'docker-engine', stream=True, timeout=900)
+        exec_command('snap', 'remove', 'docker')
+        
+        # 3. 清理二进制文件
+        progress.next('清理二进制文件')
+        for path in ['/usr/bin/docker', '/usr/local/bin/docker', '/snap/bin/docker']:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                    log_info(f'已删除: {path}')
+            except Exception as e:
+                log_warn(f'删除 {path} 失败: {e}')
+        
+        # 4. 清理数据目录
+        progress.next('清理数据目录')
+        dirs_to_remove = data_roots + ['/etc/docker', '/var/run/docker']
+        for data_root in data_roots if fast_purge else ():
+            # 数据目录改名后立即返回，删除在后台进程中并行进行
+            try:
+                purge_log = start_fast_purge(data_root)
+                if purge_log:
+                    log_info(f'已移出 {data_root}，后台清理中，进度见 {purge_log}' if LANG == 'zh'
+                             else f'Moved {data_root} aside, purging in background, progress in {purge_log}')
+                dirs_to_remove.remove(data_root)
+            except OSError as e:
+                log_warn(f'快速清理失败，改为直接删除: {e}' if LANG == 'zh' else f'Fast purge failed, deleting in place: {e}')
+        for dir_path in dirs_to_remove:
+            if os.path.exists(dir_path):
+                try:
+                    shutil.rmtree(dir_path)
+                    log_info(f'已删除: {dir_path}')
+                except Exception as e:
+                    log_warn(f'删除 {dir_path} 失败: {e}')
+        
+        # 5. 验证卸载结果
+        progress.next('验证卸载结果')
+        HOST_FACTS.invalidate()
+        ok = not is_docker_installed()
+        if not ok:
+            log_warn('Docker 仍然存在，请手动检查残留文件或其他安装方式。' if LANG == 'zh' else 'Docker still exists, please check for leftover files or other install methods.')
+        else:
+            log_info('\n\033[32m✓ Docker 已完全卸载！\033[0m' if LANG == 'zh' else '\n\033[32m✓ Docker completely uninstalled!\033[0m')
+            
+    except Exception as e:
+        log_error(f'卸载过程发生错误: {e}')
+        ok = False
+    finally:
+        progress.end('ok' if ok else 'failed')
+    return ok
+
+def _uninstall_docker_compose():
+    progress = ProgressSteps(4)
+    ok = False
+    
+    log_info('卸载 Docker Compose ...' if LANG == 'zh' else 'Uninstalling Docker Compose ...')
+    
+    try:
+        # 1. 停止进程
+        progress.next('停止相关进程')
+        exec_command('pkill', '-f', 'docker-compose')
+        
+        # 2. 移除二进制文件
+        progress.next('移除二进制文件')
+        compose_paths = [
+            '/usr/local/bin/docker-compose',
+            '/usr/bin/docker-compose',
+            '/snap/bin/docker-compose',
+            '/usr/libexec/docker/cli-plugins/docker-compose'
+        ]
+        for path in compose_paths:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                    log_info(f'已删除: {path}')
+                except Exception as e:
+                    log_warn(f'删除 {path} 失败: {e}')
+
+        # 3. 清理系统包和配置
+        progress.next('清理系统包和配置')
+        exec_command('apt-get', 'remove', '-y', 'docker-compose-plugin')
+        exec_command('apt-get', 'purge', '-y', 'docker-compose-plugin')
+        exec_command('snap', 'remove', 'docker-compose')
+        
+        user_config_paths = [
+            os.path.expanduser('~/.docker/cli-plugins/docker-compose'),
+            os.path.expanduser('~/.docker/compose'),
+        ]
+        for path in user_config_paths:
+            if os.path.exists(path):
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                    log_info(f'已删除: {path}')
+                except Exception as e:
+                    log_warn(f'删除 {path} 失败: {e}')
+
+        # 4. 验证卸载结果
+        progress.next('验证卸载结果')
+        HOST_FACTS.invalidate()
+        ok = not is_docker_compose_installed()
+        if not ok:
+            log_warn('Docker Compose 仍然存在，请检查以下位置：')
+            code, out, _ = exec_command('which', '-a', 'docker-compose')
+            if code == 0 and out:
+                for line in out.splitlines():
+                    log_warn(f'- {line}')
+        else:
+            log_info('\n\033[32m✓ Docker Compose 已完全卸载！\033[0m' if LANG == 'zh' else '\n\033[32m✓ Docker Compose completely uninstalled!\033[0m')
+            
+    except Exception as e:
+        log_error(f'卸载过程发生错误: {e}')
+        ok = False
+    progress.end('ok' if ok else 'failed')
+    return ok
+
+def _run_uninstall(operation, func, *args):
+    """执行卸载并记录计时报告，未安装时不生成报告"""
+    with run_report(operation) as report:
+        ok = func(*args)
+        report.finish('ok' if ok else 'failed')
+    return ok
+
+def uninstall_docker(fast_purge=True):
+    if not is_docker_installed():
+        log_warn('未检测到 Docker，无需卸载。' if LANG == 'zh' else 'Docker not found, nothing to uninstall.')
+        return True
+    return _run_uninstall('uninstall-docker', _uninstall_docker, fast_purge)
+
+def uninstall_docker_compose():
+    if not is_docker_compose_installed():
+        log_warn('未检测到 Docker Compose，无需卸载。' if LANG == 'zh' else 'Docker Compose not found, nothing to uninstall.')
+        return True
+    return _run_uninstall('uninstall-docker-compose', _uninstall_docker_compose)
+
+def show_docker_version():
+    code, out, _ = HOST_FACTS.probe('docker-version')
+    if code == 0:
+        log_info(out)
+    else:
+        log_error('未检测到 Docker。' if LANG == 'zh' else 'Docker not found.')
+
+def show_docker_compose_version():
+    code, out, _ = HOST_FACTS.probe('compose-plugin')
+    if code == 0:
+        log_info(out)
+        return
+    code, out, _ = HOST_FACTS.probe('compose-standalone')
+    if code == 0:
+        log_info(out)
+    else:
+        log_error('未检测到 Docker Compose。' if LANG == 'zh' else 'Docker Compose not found.')
+
+STATUS_CALLS = {
+    'ping': '/_ping',
+    'version': '/version',
+    'info': '/info',
+    'containers': '/containers/json?all=1',
+}
+STATUS_INFO_FIELDS = ('ServerVersion', 'Containers', 'ContainersRunning', 'ContainersPaused', 'ContainersStopped',
+                      'Images', 'Driver', 'DockerRootDir', 'CgroupDriver', 'CgroupVersion', 'NCPU', 'MemTotal',
+                      'OperatingSystem', 'KernelVersion', 'Warnings')
+STATUS_VERSION_FIELDS = ('Version', 'ApiVersion', 'MinAPIVersion', 'GoVersion', 'GitCommit', 'Os', 'Arch')
+
+def collect_docker_status(socket_path=DOCKER_SOCKET, timeout=DOCKER_API_TIMEOUT):
+    """并发请求 Engine API，返回可直接序列化为 JSON 的状态字典，单个接口失败时记录在 errors 中"""
+    started = time.time()
+
+    def call(path):
+        status, body = docker_api('GET', path, timeout=timeout, socket_path=socket_path)
+        if status != 200:
+            raise DockerAPIError(status, body)
+        return body if path == '/_ping' else json.loads(body.decode('utf-8'))
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=len(STATUS_CALLS)) as pool:
+        futures = {name: pool.submit(call, path) for name, path in STATUS_CALLS.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except (OSError, http.client.HTTPException, DockerAPIError, ValueError) as e:
+                errors[name] = str(e) or e.__class__.__name__
+
+    info = results.get('info') or {}
+    status = {
+        'socket': socket_path,
+        'reachable': results.get('ping', b'').strip() == b'OK',
+        'elapsed_ms': round((time.time() - started) * 1000, 1),
+        'version': {k: v for k, v in (results.get('version') or {}).items() if k in STATUS_VERSION_FIELDS},
+        'info': {k: info[k] for k in STATUS_INFO_FIELDS if k in info},
+        'registry_mirrors': (info.get('RegistryConfig') or {}).get('Mirrors') or [],
+        'containers': [{
+            'id': c.get('Id', '')[:12],
+            'name': (c.get('Names') or [''])[0].lstrip('/'),
+            'image': c.get('Image'),
+            'state': c.get('State'),
+            'status': c.get('Status'),
+        } for c in results.get('containers') or []],
+        'errors': errors,
+    }
+    return status
+
+def print_docker_status(status):
+    if not status['reachable']:
+        log_error(f"无法连接 Docker Engine API ({status['socket']}): {status['errors'].get('ping', '')}")
+        code, out, _ = exec_command('systemctl', 'is-active', 'docker')
+        log_info(f'systemctl is-active docker: {out or code}')
+        return
+    version, info = status['version'], status['info']
+    log_info(f"Docker 服务运行中：版本 {version.get('Version', '-')}，API {version.get('ApiVersion', '-')}"
+             f"（查询用时 {status['elapsed_ms']}ms）")
+    if info:
+        print(f"  存储驱动: {info.get('Driver', '-')}  数据目录: {info.get('DockerRootDir', '-')}"
+              f"  Cgroup: {info.get('CgroupDriver', '-')} v{info.get('CgroupVersion', '-')}")
+        print(f"  CPU: {info.get('NCPU', '-')}  内存: {format_size(info.get('MemTotal', 0))}"
+              f"  系统: {info.get('OperatingSystem', '-')}  内核: {info.get('KernelVersion', '-')}")
+        print(f"  容器: 运行 {info.get('ContainersRunning', 0)} / 暂停 {info.get('ContainersPaused', 0)}"
+              f" / 停止 {info.get('ContainersStopped', 0)}  镜像: {info.get('Images', 0)}")
+    if status['registry_mirrors']:
+        print(f"  镜像加速: {', '.join(status['registry_mirrors'])}")
+    for warning in info.get('Warnings') or []:
+        log_warn(warning)
+    for name, error in status['errors'].items():
+        log_warn(f'{STATUS_CALLS[name]}: {error}')
+
+    running = [c for c in status['containers'] if c['state'] == 'running']
+    if not running:
+        log_info('当前没有运行中的容器。')
+        return
+    log_info('运行中的容器：')
+    rows = [('CONTAINER ID', 'NAME', 'IMAGE', 'STATUS')]
+    rows += [(c['id'], c['name'], c['image'] or '', c['status'] or '') for c in running]
+    widths = [max(len(row[i]) for row in rows) for i in range(3)]
+    for row in rows:
+        print('  ' + '  '.join(cell.ljust(width) for cell, width in zip(row, widths)) + '  ' + row[3])
+
+def show_docker_status(as_json=False):
+    """通过 Engine API 查看 Docker 状态，返回 API 是否可用"""
+    status = collect_docker_status()
+    if as_json:
+        print(json.dumps(status, indent=2, ensure_ascii=False))
+    else:
+        print_docker_status(status)
+    return status['reachable']
+
+DISK_DF_TIMEOUT = 300  # /system/df 需要统计每个镜像和容器的大小，数据多时较慢（秒）
+DISK_TOP = 5  # 每类显示占用最大的若干项
+DISK_PLAN_LINES = 50  # 清理计划最多列出的条目数
+SIZE_WORKERS = 16  # 并行统计目录大小的线程数
+PRUNE_WORKERS = 4  # 并发删除容器、数据卷的请求数
+ORPHAN_MIN_AGE = 3600  # 超过该时间（秒）没有变化的目录才可能是孤立层，正在拉取的镜像层尚未登记
+PRUNE_TARGETS = ('containers', 'images', 'build-cache', 'volumes', 'orphans')
+# 数据卷保存的是业务数据，孤立层目录需要直接删除文件，二者都只在明确指定时清理
+DEFAULT_PRUNE_TARGETS = ('containers', 'images', 'build-cache')
+DISK_KINDS = {
+    'images': ('镜像', 'Images'),
+    'containers': ('容器', 'Containers'),
+    'volumes': ('数据卷', 'Local Volumes'),
+    'build-cache': ('构建缓存', 'Build Cache'),
+    'orphans': ('孤立层目录', 'Orphaned layers'),
+}
+
+class TreeSizer:
+    """多线程基于 scandir 统计多个目录树各自占用的空间和最近变化时间
+
+    与 TreePurger 相同的队列模型；按实际占用的块计算，硬链接的文件只计算一次，不跨越文件系统边界。
+    最近变化时间取 mtime 和 ctime 的较大值，解压时保留了旧 mtime 的文件也能反映真实的写入时间。
+    """
+
+    def __init__(self, roots, workers=SIZE_WORKERS):
+        self.roots = list(roots)
+        self.workers = workers
+        self.results = {root: {'bytes': 0, 'files': 0, 'newest': 0} for root in self.roots}
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+
+    def run(self):
+        for root in self.roots:
+            try:
+                st = os.lstat(root)
+            except OSError:
+                continue
+            self.results[root]['bytes'] += st.st_blocks * 512
+            self.results[root]['newest'] = max(st.st_mtime, st.st_ctime)
+            self._queue.put((root, root, st.st_dev))
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join()
+        return self.results
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            root, dir_path, dev = item
+            files = size = 0
+            newest = 0
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        newest = max(newest, st.st_mtime, st.st_ctime)
+                        if entry.is_dir(follow_symlinks=False):
+                            size += st.st_blocks * 512
+                            if st.st_dev == dev:
+                                self._queue.put((root, entry.path, dev))
+                            continue
+                        if st.st_nlink > 1:
+                            with self._lock:
+                                if (st.st_dev, st.st_ino) in self._seen:
+                                    continue
+                                self._seen.add((st.st_dev, st.st_ino))
+                        files += 1
+                        size += st.st_blocks * 512
+            except OSError:
+                pass
+            with self._lock:
+                result = self.results[root]
+                result['bytes'] += size
+                result['files'] += files
+                result['newest'] = max(result['newest'], newest)
+            self._queue.task_done()
+
+def overlay2_references(data_root):
+    """layerdb 中登记的 overlay2 目录：镜像层的 cache-id，容器读写层的 mount-id 和 init-id"""
+    refs = set()
+    layerdb = os.path.join(glob.escape(data_root), 'image', 'overlay2', 'layerdb')
+    for pattern in ('sha256/*/cache-id', 'mounts/*/mount-id', 'mounts/*/init-id'):
+        for path in glob.glob(os.path.join(layerdb, pattern)):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    refs.add(f.read().strip())
+            except OSError:
+                continue
+    return refs
+
+def buildkit_metadata(data_root):
+    """BuildKit 自己管理的快照也放在 overlay2 下，但只登记在它的 bolt 数据库中，读出原始内容用于排除"""
+    data = []
+    for path in glob.glob(os.path.join(glob.escape(data_root), 'buildkit', '*.db')):
+        try:
+            with open(path, 'rb') as f:
+                data.append(f.read())
+        except OSError:
+            continue
+    return b'\n'.join(data)
+
+def find_orphan_layers(data_root, driver, min_age=ORPHAN_MIN_AGE):
+    """找出 overlay2 下没有被任何镜像层、容器或构建缓存引用的目录，返回 [{id, path, bytes, newest}]"""
+    overlay = os.path.join(data_root, 'overlay2')
+    if driver != 'overlay2' or not os.path.isdir(overlay):
+        return []
+    refs = overlay2_references(data_root)
+    if not refs:
+        # 没有 layerdb（如使用 containerd 镜像存储）时无从判断，不把所有目录都当作孤立
+        return []
+    buildkit = buildkit_metadata(data_root)
+    candidates = []
+    with os.scandir(overlay) as it:
+        for entry in it:
+            if entry.name == 'l' or not entry.is_dir(follow_symlinks=False):
+                continue
+            layer_id = entry.name[:-len('-init')] if entry.name.endswith('-init') else entry.name
+            if layer_id in refs or entry.name in refs or layer_id.encode('utf-8') in buildkit:
+                continue
+            candidates.append(entry.path)
+    now = time.time()
+    orphans = []
+    for path, result in TreeSizer(candidates).run().items():
+        if now - result['newest'] >= min_age:
+            orphans.append({'id': os.path.basename(path), 'path': path, 'bytes': result['bytes'], 'newest': result['newest']})
+    return sorted(orphans, key=lambda o: o['bytes'], reverse=True)
+
+def disk_space(path):
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    free = st.f_bavail * st.f_frsize
+    return {'path': path, 'fstype': filesystem_type(path), 'total': total, 'used': total - st.f_bfree * st.f_frsize, 'free': free}
+
+def collect_disk_usage():
+    """/system/df 与孤立层目录扫描并发进行"""
+    info = docker_info()
+    data_root = info.get('DockerRootDir') or DOCKER_DATA_ROOT
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        df_future = pool.submit(_api_json, 'GET', '/system/df', None, (200,), DISK_DF_TIMEOUT)
+        orphan_future = pool.submit(find_orphan_layers, data_root, info.get('Driver'))
+        df = df_future.result()
+        orphans = orphan_future.result()
+    return {'data_root': data_root, 'driver': info.get('Driver'), 'filesystem': disk_space(data_root),
+            'df': df, 'orphans': orphans}
+
+def _is_dangling(image):
+    tags = image.get('RepoTags') or []
+    return not tags or tags == ['<none>:<none>']
+
+def summarize_disk_usage(usage):
+    """与 docker system df 相同的口径：各类对象的数量、使用中的数量、占用空间和可回收空间"""
+    df = usage['df']
+    images = df.get('Images') or []
+    containers = df.get('Containers') or []
+    volumes = df.get('Volumes') or []
+    cache = df.get('BuildCache') or []
+    used_images = {c.get('ImageID') for c in containers}
+    unused_images = [i for i in images if i['Id'] not in used_images]
+    volume_size = lambda v: max((v.get('UsageData') or {}).get('Size', 0), 0)
+    volume_refs = lambda v: (v.get('UsageData') or {}).get('RefCount', 0)
+    return {
+        'images': {'count': len(images), 'active': len(images) - len(unused_images),
+                   'bytes': df.get('LayersSize', 0),
+                   'reclaimable': sum(i.get('Size', 0) - max(i.get('SharedSize', 0), 0) for i in unused_images)},
+        'containers': {'count': len(containers), 'active': sum(1 for c in containers if c.get('State') == 'running'),
+                       'bytes': sum(c.get('SizeRw', 0) for c in containers),
+                       'reclaimable': sum(c.get('SizeRw', 0) for c in containers if c.get('State') != 'running')},
+        'volumes': {'count': len(volumes), 'active': sum(1 for v in volumes if volume_refs(v) > 0),
+                    'bytes': sum(volume_size(v) for v in volumes),
+                    'reclaimable': sum(volume_size(v) for v in volumes if volume_refs(v) == 0)},
+        'build-cache': {'count': len(cache), 'active': sum(1 for c in cache if c.get('InUse')),
+                        'bytes': sum(c.get('Size', 0) for c in cache if not c.get('Shared')),
+                        'reclaimable': sum(c.get('Size', 0) for c in cache if not c.get('InUse') and not c.get('Shared'))},
+        'orphans': {'count': len(usage['orphans']), 'active': 0,
+                    'bytes': sum(o['bytes'] for o in usage['orphans']),
+                    'reclaimable': sum(o['bytes'] for o in usage['orphans'])},
+    }
+
+def largest_items(usage, limit=DISK_TOP):
+    df = usage['df']
+    items = {
+        'images': [((i.get('RepoTags') or ['<none>'])[0], i.get('Size', 0)) for i in df.get('Images') or []],
+        'containers': [((c.get('Names') or [c['Id'][:12]])[0].lstrip('/'), c.get('SizeRw', 0))
+                       for c in df.get('Containers') or []],
+        'volumes': [(v['Name'], max((v.get('UsageData') or {}).get('Size', 0), 0)) for v in df.get('Volumes') or []],
+        'build-cache': [(f"{c.get('Type', '')} {c['ID'][:12]}", c.get('Size', 0)) for c in df.get('BuildCache') or []],
+        'orphans': [(o['id'], o['bytes']) for o in usage['orphans']],
+    }
+    return {kind: sorted(values, key=lambda item: item[1], reverse=True)[:limit] for kind, values in items.items()}
+
+def _pad(value, width, right=False):
+    """按终端显示宽度补齐，中文字符占两列"""
+    value = str(value)
+    fill = ' ' * max(width - sum(2 if ord(char) > 0x2e7f else 1 for char in value), 0)
+    return fill + value if right else value + fill
+
+DISK_COLUMNS = (16, 8, 8, 12, 22)
+
+def print_disk_usage(usage):
+    fs = usage['filesystem']
+    zh = LANG == 'zh'
+    if zh:
+        print(f"\n\033[36m数据目录\033[0m {usage['data_root']} ({fs['fstype'] or '-'}, {usage['driver'] or '-'}): "
+              f"已用 {format_size(fs['used'])} / {format_size(fs['total'])}，可用 {format_size(fs['free'])}")
+    else:
+        print(f"\n\033[36mData root\033[0m {usage['data_root']} ({fs['fstype'] or '-'}, {usage['driver'] or '-'}): "
+              f"used {format_size(fs['used'])} / {format_size(fs['total'])}, free {format_size(fs['free'])}")
+    summary = summarize_disk_usage(usage)
+    header = ('类型', '总数', '使用中', '占用', '可回收') if zh else ('TYPE', 'TOTAL', 'ACTIVE', 'SIZE', 'RECLAIMABLE')
+    rows = [header]
+    for kind, row in summary.items():
+        percent = f" ({row['reclaimable'] * 100 / row['bytes']:.0f}%)" if row['bytes'] else ''
+        rows.append((DISK_KINDS[kind][0 if zh else 1], row['count'], row['active'], format_size(row['bytes']),
+                     format_size(row['reclaimable']) + percent))
+    print()
+    for row in rows:
+        print(''.join(_pad(value, width, right=i > 0) for i, (value, width) in enumerate(zip(row, DISK_COLUMNS))))
+    for kind, values in largest_items(usage).items():
+        if not values:
+            continue
+        print(f"\n\033[36m{DISK_KINDS[kind][0 if zh else 1]}{'（占用最大）' if zh else ' (largest)'}\033[0m")
+        for name, size in values:
+            print(f'  {format_size(size):>10}  {name}')
+
+_API_TIME_RE = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.\d+)?(Z|[+-]\d{2}:\d{2})$')
+
+def parse_api_time(value):
+    """Engine API 的 RFC 3339 时间（纳秒精度）转为时间戳，无法解析时返回 None"""
+    if isinstance(value, (int, float)):
+        return value or None
+    m = _API_TIME_RE.match(value or '')
+    if not m:
+        return None
+    ts = calendar.timegm(time.strptime(m.group(1), '%Y-%m-%dT%H:%M:%S'))
+    if m.group(2) != 'Z':
+        sign = 1 if m.group(2)[0] == '+' else -1
+        ts -= sign * (int(m.group(2)[1:3]) * 3600 + int(m.group(2)[4:6]) * 60)
+    return ts
+
+class PrunePolicy:
+    """清理策略：targets 为清理的对象类型；older_than（秒）、min_size（字节）为空时不限制；
+    dangling_only 只对镜像生效，只清理没有标签的悬空镜像"""
+
+    def __init__(self, targets=DEFAULT_PRUNE_TARGETS, older_than=None, min_size=None, dangling_only=False):
+        self.targets = tuple(targets)
+        self.older_than = older_than
+        self.min_size = min_size
+        self.dangling_only = dangling_only
+
+    def matches(self, item):
+        if self.older_than is not None and (item['age'] is None or item['age'] < self.older_than):
+            return False
+        return self.min_size is None or item['bytes'] >= self.min_size
+
+def _prune_item(kind, item_id, name, size, created, now):
+    return {'kind': kind, 'id': item_id, 'name': name, 'bytes': size,
+            'age': now - created if created else None}
+
+def plan_prune(usage, policy, now=None):
+    """按策略挑出要清理的对象；镜像只有不被任何保留下来的容器使用时才清理"""
+    now = now or time.time()
+    df = usage['df']
+    plan = []
+    kept_images = set()
+    for c in df.get('Containers') or []:
+        item = _prune_item('containers', c['Id'], (c.get('Names') or [c['Id'][:12]])[0].lstrip('/'),
+                           c.get('SizeRw', 0), c.get('Created'), now)
+        if ('containers' in policy.targets and c.get('State') in ('exited', 'created', 'dead')
+                and policy.matches(item)):
+            plan.append(item)
+        else:
+            kept_images.add(c.get('ImageID'))
+    if 'images' in policy.targets:
+        for image in df.get('Images') or []:
+            if image['Id'] in kept_images or (policy.dangling_only and not _is_dangling(image)):
+                continue
+            name = '<none>' if _is_dangling(image) else ', '.join(image['RepoTags'])
+            # 与其它镜像共享的层不会因删除该镜像而释放
+            unique = image.get('Size', 0) - max(image.get('SharedSize', 0), 0)
+            item = _prune_item('images', image['Id'], name, unique, image.get('Created'), now)
+            if policy.matches(item):
+                plan.append(item)
+    if 'volumes' in policy.targets:
+        for volume in df.get('Volumes') or []:
+            data = volume.get('UsageData') or {}
+            if data.get('RefCount', 0) != 0:
+                continue
+            item = _prune_item('volumes', volume['Name'], volume['Name'], max(data.get('Size', 0), 0),
+                               parse_api_time(volume.get('CreatedAt')), now)
+            if policy.matches(item):
+                plan.append(item)
+    if 'build-cache' in policy.targets:
+        for record in df.get('BuildCache') or []:
+            # 被其它记录共享的父记录由 BuildKit 在子记录清理后处理
+            if record.get('InUse') or record.get('Shared'):
+                continue
+            last_used = parse_api_time(record.get('LastUsedAt')) or parse_api_time(record.get('CreatedAt'))
+            item = _prune_item('build-cache', record['ID'], f"{record.get('Type', '')} {record['ID'][:12]}",
+                               record.get('Size', 0), last_used, now)
+            if policy.matches(item):
+                plan.append(item)
+    if 'orphans' in policy.targets:
+        for orphan in usage['orphans']:
+            item = _prune_item('orphans', orphan['path'], orphan['id'], orphan['bytes'], orphan['newest'], now)
+            if policy.matches(item):
+                plan.append(item)
+    return plan
+
+def format_age(seconds):
+    if seconds is None:
+        return '-'
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f'{seconds / size:.0f}{unit}'
+    return f'{seconds:.0f}s'
+
+def print_prune_plan(plan):
+    zh = LANG == 'zh'
+    if not plan:
+        log_info('没有符合策略的可清理对象' if zh else 'Nothing matches the prune policy')
+        return
+    for item in sorted(plan, key=lambda i: i['bytes'], reverse=True)[:DISK_PLAN_LINES]:
+        label = DISK_KINDS[item['kind']][0 if zh else 1]
+        print(f"  {format_size(item['bytes']):>10}  {format_age(item['age']):>5}  {label}  {item['name']}")
+    if len(plan) > DISK_PLAN_LINES:
+        print(f'  ...{len(plan) - DISK_PLAN_LINES}' + (' 项未列出' if zh else ' more'))
+    total = sum(item['bytes'] for item in plan)
+    log_info(f'共 {len(plan)} 项，预计可回收 {format_size(total)}' if zh
+             else f'{len(plan)} items, about {format_size(total)} reclaimable')
+
+def _delete_container(item):
+    status, data = docker_api('DELETE', f"/containers/{item['id']}?v=0", timeout=60)
+    return status in (204, 404), item['bytes'], (status, data)
+
+def _delete_volume(item):
+    status, data = docker_api('DELETE', f"/volumes/{quote(item['id'])}", timeout=60)
+    return status in (204, 404), item['bytes'], (status, data)
+
+def _delete_image(item):
+    # 同一镜像有多个标签时需要 force，计划中的镜像已确认没有容器在使用
+    status, data = docker_api('DELETE', f"/images/{item['id']}?force=1", timeout=120)
+    return status in (200, 404), item['bytes'], (status, data)
+
+def _delete_build_cache(item):
+    query = urlencode({'filters': json.dumps({'id': [item['id']]})})
+    status, data = docker_api('POST', f'/build/prune?{query}', timeout=300)
+    if status != 200:
+        return False, 0, (status, data)
+    return True, json.loads(data.decode('utf-8')).get('SpaceReclaimed', 0), (status, data)
+
+def _remove_overlay_link(overlay, layer_dir):
+    """删除 overlay2/l 下指向该层的短链接"""
+    try:
+        with open(os.path.join(layer_dir, 'link'), 'r', encoding='utf-8') as f:
+            link = os.path.join(overlay, 'l', f.read().strip())
+        if os.readlink(link).rstrip('/').endswith(f'/{os.path.basename(layer_dir)}/diff'):
+            os.unlink(link)
+    except (OSError, ValueError):
+        pass
+
+def execute_prune(plan, workers=PRUNE_WORKERS):
+    """执行清理计划，返回各类对象的 {count, bytes, failed}"""
+    results = {kind: {'count': 0, 'bytes': 0, 'failed': 0} for kind in PRUNE_TARGETS}
+
+    def record(kind, name, outcome):
+        ok, size, (status, data) = outcome
+        if ok:
+            results[kind]['count'] += 1
+            results[kind]['bytes'] += size
+        else:
+            results[kind]['failed'] += 1
+            log_warn(f'{name}: {DockerAPIError(status, data)}')
+
+    by_kind = {kind: [item for item in plan if item['kind'] == kind] for kind in PRUNE_TARGETS}
+    # 先删容器才能释放其使用的镜像；容器、数据卷互不依赖，并发删除
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for kind, func in (('containers', _delete_container), ('volumes', _delete_volume)):
+            for item, outcome in zip(by_kind[kind], pool.map(func, by_kind[kind])):
+                record(kind, item['name'], outcome)
+    # 镜像之间有父子关系、构建缓存清理在 BuildKit 内部串行，逐个执行
+    for item in by_kind['images']:
+        record('images', item['name'], _delete_image(item))
+    for item in by_kind['build-cache']:
+        record('build-cache', item['name'], _delete_build_cache(item))
+    if by_kind['orphans']:
+        overlay = os.path.dirname(by_kind['orphans'][0]['id'])
+        for item in by_kind['orphans']:
+            _remove_overlay_link(overlay, item['id'])
+        purger = TreePurger([item['id'] for item in by_kind['orphans']]).start().wait(show_progress=False)
+        results['orphans'].update(count=len(by_kind['orphans']), bytes=purger.bytes, failed=purger.errors)
+    return results
+
+def prune_docker_disk(policy, dry_run=False, usage=None, as_json=False):
+    """分析磁盘占用并按策略清理，dry_run 时只列出计划；返回是否没有失败项"""
+    usage = usage or collect_disk_usage()
+    plan = plan_prune(usage, policy)
+    if dry_run:
+        if as_json:
+            print(json.dumps({'plan': plan, 'bytes': sum(item['bytes'] for item in plan)}, indent=2, ensure_ascii=False))
+        else:
+            log_info('清理计划（--dry-run，未删除任何内容）:' if LANG == 'zh' else 'Prune plan (--dry-run, nothing removed):')
+            print_prune_plan(plan)
+        return True
+    free_before = disk_space(usage['data_root'])['free']
+    started = time.time()
+    results = execute_prune(plan)
+    freed = disk_space(usage['data_root'])['free'] - free_before
+    if as_json:
+        print(json.dumps({'results': results, 'freed': freed, 'seconds': round(time.time() - started, 3)},
+                         indent=2, ensure_ascii=False))
+    else:
+        for kind, row in results.items():
+            if row['count'] or row['failed']:
+                label = DISK_KINDS[kind][0 if LANG == 'zh' else 1]
+                failed = (f"，失败 {row['failed']}" if LANG == 'zh' else f", {row['failed']} failed") if row['failed'] else ''
+                print(f"  {label}: {row['count']}，{format_size(row['bytes'])}{failed}")
+        log_info(f'清理完成，用时 {time.time() - started:.1f}s，文件系统可用空间增加 {format_size(max(freed, 0))}' if LANG == 'zh'
+                 else f'Prune finished in {time.time() - started:.1f}s, filesystem free space up {format_size(max(freed, 0))}')
+    return not any(row['failed'] for row in results.values())
+
+DISK_PRUNE = False  # --action disk 时按策略清理
+DISK_DRY_RUN = False
+PRUNE_POLICY = PrunePolicy()
+
+def analyze_docker_disk(as_json=False):
+    """--action disk：显示占用分析，指定 --prune 时按策略清理"""
+    try:
+        usage = collect_disk_usage()
+    except (OSError, http.client.HTTPException, DockerAPIError) as e:
+        log_error(f'无法获取磁盘占用: {e}' if LANG == 'zh' else f'Cannot collect disk usage: {e}')
+        return False
+    if not DISK_PRUNE:
+        if as_json:
+            print(json.dumps(dict(usage, summary=summarize_disk_usage(usage)), indent=2, ensure_ascii=False))
+        else:
+            print_disk_usage(usage)
+        return True
+    if not as_json:
+        print_disk_usage(usage)
+    return prune_docker_disk(PRUNE_POLICY, DISK_DRY_RUN, usage, as_json)
+
+def disk_menu():
+    """菜单：显示占用分析，列出默认策略下的清理计划，确认后执行"""
+    try:
+        usage = collect_disk_usage()
+    except (OSError, http.client.HTTPException, DockerAPIError) as e:
+        log_error(f'无法获取磁盘占用: {e}' if LANG == 'zh' else f'Cannot collect disk usage: {e}')
+        return
+    print_disk_usage(usage)
+    plan = plan_prune(usage, PRUNE_POLICY)
+    print()
+    print_prune_plan(plan)
+    if not plan:
+        return
+    try:
+        answer = input('是否执行清理？(y/N): ' if LANG == 'zh' else 'Prune now? (y/N): ').strip().lower()
+    except (KeyboardInterrupt, EOFError):
+        return
+    if answer == 'y':
+        prune_docker_disk(PRUNE_POLICY, usage=usage)
+
+EXPORTER_LISTEN = '127.0.0.1:9417'  # 导出器默认监听地址
+EXPORTER_DISCOVERY_INTERVAL = 10  # 重新获取容器列表的间隔（秒）
+EXPORTER_STALE_AFTER = 60  # 超过该时间没有新样本的容器不再输出（秒）
+EXPORTER_STREAM_TIMEOUT = 30  # stats 流读取超时，dockerd 约每秒推送一次样本（秒）
+
+class ContainerStatsStream:
+    """一个容器的 stats 流：在后台线程中保持一个到 dockerd 的连接，缓存最新一次样本"""
+
+    def __init__(self, container_id, name, image, socket_path=DOCKER_SOCKET):
+        self.id = container_id
+        self.name = name
+        self.image = image
+        self.socket_path = socket_path
+        self.sample = None
+        self.updated = 0.0
+        self._conn = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'stats-{container_id[:12]}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def alive(self):
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stopped.set()
+        conn = self._conn
+        if conn is not None and conn.sock is not None:
+            # 关闭连接让阻塞中的读取立即返回
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _run(self):
+        self._conn = UnixHTTPConnection(self.socket_path, EXPORTER_STREAM_TIMEOUT)
+        try:
+            self._conn.request('GET', f'/containers/{self.id}/stats?stream=1')
+            resp = self._conn.getresponse()
+            if resp.status != 200:
+                return
+            # 流式响应每行一个 JSON 样本
+            for line in resp:
+                if self._stopped.is_set():
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self.sample = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    continue
+                self.updated = time.time()
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        finally:
+            self._conn.close()
+
+def container_metrics(stream):
+    """把一个 stats 样本转换为 [(指标名, 标签, 值)]"""
+    sample = stream.sample or {}
+    labels = {'id': stream.id[:12], 'name': stream.name, 'image': stream.image}
+    metrics = []
+
+    cpu = sample.get('cpu_stats') or {}
+    usage = (cpu.get('cpu_usage') or {}).get('total_usage')
+    if usage is not None:
+        metrics.append(('container_cpu_usage_seconds_total', labels, usage / 1e9))
+    if cpu.get('online_cpus'):
+        metrics.append(('container_cpu_online', labels, cpu['online_cpus']))
+
+    memory = sample.get('memory_stats') or {}
+    if 'usage' in memory:
+        stats = memory.get('stats') or {}
+        # 与 docker stats 一致：扣除可回收的页缓存（cgroup v1 为 total_inactive_file，v2 为 inactive_file）
+        inactive = stats.get('total_inactive_file', stats.get('inactive_file', 0))
+        metrics.append(('container_memory_usage_bytes', labels, max(memory['usage'] - inactive, 0)))
+        if memory.get('limit'):
+            metrics.append(('container_memory_limit_bytes', labels, memory['limit']))
+
+    for interface, net in sorted((sample.get('networks') or {}).items()):
+        net_labels = dict(labels, interface=interface)
+        metrics.append(('container_network_receive_bytes_total', net_labels, net.get('rx_bytes', 0)))
+        metrics.append(('container_network_transmit_bytes_total', net_labels, net.get('tx_bytes', 0)))
+        metrics.append(('container_network_receive_errors_total', net_labels, net.get('rx_errors', 0)))
+        metrics.append(('container_network_transmit_errors_total', net_labels, net.get('tx_errors', 0)))
+
+    blkio = {'read': 0, 'write': 0}
+    entries = (sample.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []
+    for entry in entries:
+        op = str(entry.get('op', '')).lower()
+        if op in blkio:
+            blkio[op] += entry.get('value', 0)
+    if entries:
+        metrics.append(('container_blkio_read_bytes_total', labels, blkio['read']))
+        metrics.append(('container_blkio_write_bytes_total', labels, blkio['write']))
+
+    pids = (sample.get('pids_stats') or {}).get('current')
+    if pids is not None:
+        metrics.append(('container_pids', labels, pids))
+    return metrics
+
+METRIC_HELP = {
+    'docker_up': ('gauge', 'Whether the Docker daemon answered /_ping'),
+    'docker_ping_seconds': ('gauge', 'Round trip time of /_ping'),
+    'docker_info': ('gauge', 'Docker daemon version information'),
+    'docker_containers': ('gauge', 'Number of containers by state'),
+    'docker_images': ('gauge', 'Number of images'),
+    'docker_exporter_streams': ('gauge', 'Open container stats streams'),
+    'container_cpu_usage_seconds_total': ('counter', 'Cumulative CPU time consumed'),
+    'container_cpu_online': ('gauge', 'CPUs available to the container'),
+    'container_memory_usage_bytes': ('gauge', 'Memory usage excluding inactive page cache'),
+    'container_memory_limit_bytes': ('gauge', 'Memory limit'),
+    'container_network_receive_bytes_total': ('counter', 'Bytes received'),
+    'container_network_transmit_bytes_total': ('counter', 'Bytes transmitted'),
+    'container_network_receive_errors_total': ('counter', 'Receive errors'),
+    'container_network_transmit_errors_total': ('counter', 'Transmit errors'),
+    'container_blkio_read_bytes_total': ('counter', 'Bytes read from block devices'),
+    'container_blkio_write_bytes_total': ('counter', 'Bytes written to block devices'),
+    'container_pids': ('gauge', 'Number of processes'),
+}
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_metrics(metrics):
+    """按 Prometheus 文本格式输出，同名指标归为一组"""
+    groups = {}
+    for name, labels, value in metrics:
+        groups.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, samples in groups.items():
+        metric_type, help_text = METRIC_HELP.get(name, ('gauge', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in samples:
+            label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+class DockerExporter:
+    """维护全部运行中容器的 stats 流，抓取时直接读取缓存的样本"""
+
+    def __init__(self, socket_path=DOCKER_SOCKET):
+        self.socket_path = socket_path
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._discover_loop, name='discovery', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            streams = list(self.streams.values())
+            self.streams.clear()
+        for stream in streams:
+            stream.stop()
+
+    def refresh(self):
+        """同步运行中的容器列表：为新容器打开 stats 流，关闭已停止容器的流，重连断开的流"""
+        status, body = docker_api('GET', '/containers/json', socket_path=self.socket_path)
+        if status != 200:
+            raise DockerAPIError(status, body)
+        running = {c['Id']: c for c in json.loads(body.decode('utf-8'))}
+        with self._lock:
+            for container_id in list(self.streams):
+                stream = self.streams[container_id]
+                if container_id not in running or not stream.alive():
+                    stream.stop()
+                    del self.streams[container_id]
+            for container_id, c in running.items():
+                if container_id not in self.streams:
+                    name = (c.get('Names') or [''])[0].lstrip('/')
+                    self.streams[container_id] = ContainerStatsStream(
+                        container_id, name, c.get('Image', ''), self.socket_path).start()
+
+    def _discover_loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except (OSError, http.client.HTTPException, DockerAPIError, ValueError):
+                # dockerd 不可用时保留现有的流，下次再试
+                pass
+            self._stopped.wait(EXPORTER_DISCOVERY_INTERVAL)
+
+    def daemon_metrics(self):
+        started = time.time()
+        try:
+            status, body = docker_api('GET', '/_ping', timeout=5, socket_path=self.socket_path)
+            up = status == 200 and body.strip() == b'OK'
+        except (OSError, http.client.HTTPException):
+            up = False
+        metrics = [('docker_up', {}, 1 if up else 0)]
+        if not up:
+            return metrics
+        metrics.append(('docker_ping_seconds', {}, round(time.time() - started, 6)))
+        try:
+            status, body = docker_api('GET', '/info', timeout=5, socket_path=self.socket_path)
+            info = json.loads(body.decode('utf-8')) if status == 200 else {}
+        except (OSError, http.client.HTTPException, ValueError):
+            info = {}
+        if info:
+            metrics.append(('docker_info', {'version': info.get('ServerVersion', ''),
+                                            'storage_driver': info.get('Driver', '')}, 1))
+            for state in ('Running', 'Paused', 'Stopped'):
+                metrics.append(('docker_containers', {'state': state.lower()}, info.get(f'Containers{state}', 0)))
+            metrics.append(('docker_images', {}, info.get('Images', 0)))
+        return metrics
+
+    def collect(self):
+        metrics = self.daemon_metrics()
+        now = time.time()
+        with self._lock:
+            streams = list(self.streams.values())
+        metrics.append(('docker_exporter_streams', {}, len(streams)))
+        for stream in sorted(streams, key=lambda s: s.name):
+            if stream.sample is not None and now - stream.updated <= EXPORTER_STALE_AFTER:
+                metrics.extend(container_metrics(stream))
+        return render_metrics(metrics)
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def make_exporter_handler(exporter):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] == '/metrics':
+                body = exporter.collect().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                self.send_response(200)
+            elif self.path == '/':
+                body = b'<html><body><a href="/metrics">/metrics</a></body></html>\n'
+                content_type = 'text/html'
+                self.send_response(200)
+            else:
+                body = b'not found\n'
+                content_type = 'text/plain'
+                self.send_response(404)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return MetricsHandler
+
+def run_exporter(listen=EXPORTER_LISTEN, socket_path=DOCKER_SOCKET):
+    """以 Prometheus 导出器方式运行，直到 Ctrl+C"""
+    host, _, port = listen.rpartition(':')
+    exporter = DockerExporter(socket_path).start()
+    server = ThreadingHTTPServer((host or '0.0.0.0', int(port)), make_exporter_handler(exporter))
+    log_info(f'Prometheus 导出器已启动: http://{host or "0.0.0.0"}:{port}/metrics' if LANG == 'zh'
+             else f'Prometheus exporter listening on http://{host or "0.0.0.0"}:{port}/metrics')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        exporter.stop()
+    return 0
+
+BENCH_IMAGE = 'docker-all-install/bench:1'
+BENCH_LABEL = 'docker-all-install.bench'
+BENCH_RUNS = 20  # 冷启动、热启动和 exec 各测量的次数
+BENCH_PARALLEL = 8  # 并发启动测试的并发数
+BENCH_PARALLEL_TOTAL = 64  # 并发启动测试的容器总数
+ELF_BASE = 0x400000
+# 手写的最小静态 ELF 机器码：/true 立即以 0 退出，/pause 一直阻塞（用于 exec 测试的常驻容器）
+BENCH_BINARIES = {
+    # x86_64: exit_group(0)；pause() 循环
+    'x86_64': (62, {
+        'true': bytes.fromhex('b8e7000000' '31ff' '0f05'),
+        'pause': bytes.fromhex('b822000000' '0f05' 'ebf7'),
+    }),
+    # aarch64 没有 pause 系统调用，用 ppoll(NULL, 0, NULL, NULL) 循环代替
+    'aarch64': (183, {
+        'true': struct.pack('<3I', 0xd2800000, 0xd2800bc8, 0xd4000001),
+        'pause': struct.pack('<7I', 0xd2800000, 0xd2800001, 0xd2800002, 0xd2800003,
+                             0xd2800928, 0xd4000001, 0x17fffffa),
+    }),
+}
+MACHINE_ALIASES = {'amd64': 'x86_64', 'arm64': 'aarch64'}
+
+def build_static_elf(machine, code):
+    """ELF64 头 + 一个可读可执行的 PT_LOAD 段，代码紧跟在程序头之后"""
+    ehdr_size, phdr_size = 64, 56
+    total = ehdr_size + phdr_size + len(code)
+    ident = b'\x7fELF' + bytes([2, 1, 1, 0]) + bytes(8)
+    ehdr = ident + struct.pack('<HHIQQQIHHHHHH', 2, machine, 1, ELF_BASE + ehdr_size + phdr_size,
+                               ehdr_size, 0, 0, ehdr_size, phdr_size, 1, 0, 0, 0)
+    # 按 64K 对齐，兼容 aarch64 使用 64K 页的内核
+    phdr = struct.pack('<IIQQQQQQ', 1, 5, 0, ELF_BASE, ELF_BASE, total, total, 0x10000)
+    return ehdr + phdr + code
+
+def bench_build_context(arch=None):
+    """生成 FROM scratch 镜像的构建上下文（tar），不依赖网络和基础镜像"""
+    arch = arch or MACHINE_ALIASES.get(platform.machine(), platform.machine())
+    if arch not in BENCH_BINARIES:
+        raise ValueError(f'不支持的架构: {arch}')
+    machine, programs = BENCH_BINARIES[arch]
+    files = {'Dockerfile': (b'FROM scratch\nCOPY true pause /\nCMD ["/pause"]\n', 0o644)}
+    for name, code in programs.items():
+        files[name] = (build_static_elf(machine, code), 0o755)
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as tar:
+        for name, (data, mode) in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = mode
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+def _api_json(method, path, payload=None, expect=(200, 201, 204), timeout=60):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    status, data = docker_api(method, path, body=body, headers=headers, timeout=timeout)
+    if status not in expect:
+        raise DockerAPIError(status, data)
+    return json.loads(data.decode('utf-8')) if data.strip() else {}
+
+def ensure_bench_image():
+    """镜像不存在时通过 /build 接口构建"""
+    status, _ = docker_api('GET', f'/images/{BENCH_IMAGE}/json')
+    if status == 200:
+        return
+    query = urlencode({'t': BENCH_IMAGE, 'rm': 1, 'forcerm': 1, 'labels': json.dumps({BENCH_LABEL: '1'})})
+    status, data = docker_api('POST', f'/build?{query}', body=bench_build_context(),
+                              headers={'Content-Type': 'application/x-tar'}, timeout=120)
+    if status != 200:
+        raise DockerAPIError(status, data)
+    # 构建输出是逐行的 JSON 流，出错时某一行包含 error
+    for line in data.splitlines():
+        try:
+            message = json.loads(line.decode('utf-8'))
+        except ValueError:
+            continue
+        if message.get('error'):
+            raise DockerAPIError(status, message['error'].encode('utf-8'))
+
+def bench_create(cmd, network='none'):
+    config = {
+        'Image': BENCH_IMAGE,
+        'Cmd': cmd,
+        'Labels': {BENCH_LABEL: '1'},
+        'HostConfig': {'NetworkMode': network},
+    }
+    return _api_json('POST', '/containers/create', config)['Id']
+
+def bench_remove(container_id):
+    try:
+        docker_api('DELETE', f'/containers/{container_id}?force=1&v=1')
+    except (OSError, http.client.HTTPException):
+        pass
+
+def bench_cleanup():
+    """删除上次中断遗留的测试容器"""
+    filters = urlencode({'all': 1, 'filters': json.dumps({'label': [BENCH_LABEL]})})
+    for c in _api_json('GET', f'/containers/json?{filters}'):
+        bench_remove(c['Id'])
+
+def bench_run_once(container_id=None, network='none'):
+    """运行一次 /true，返回耗时（秒）；给定 container_id 时重复启动已有的容器（热启动）"""
+    started = time.time()
+    created = container_id is None
+    if created:
+        container_id = bench_create(['/true'], network)
+    try:
+        _api_json('POST', f'/containers/{container_id}/start')
+        result = _api_json('POST', f'/containers/{container_id}/wait')
+        elapsed = time.time() - started
+        if result.get('StatusCode') != 0:
+            raise RuntimeError(f"容器退出码 {result.get('StatusCode')}")
+        return elapsed
+    finally:
+        if created:
+            bench_remove(container_id)
+
+def bench_exec_once(container_id):
+    started = time.time()
+    exec_id = _api_json('POST', f'/containers/{container_id}/exec', {'Cmd': ['/true']})['Id']
+    # 非 detach 模式下请求在命令结束后返回
+    status, data = docker_api('POST', f'/exec/{exec_id}/start', body=json.dumps({'Detach': False, 'Tty': False}).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'}, timeout=60)
+    elapsed = time.time() - started
+    if status != 200:
+        raise DockerAPIError(status, data)
+    code = _api_json('GET', f'/exec/{exec_id}/json').get('ExitCode')
+    if code != 0:
+        raise RuntimeError(f'exec 退出码 {code}')
+    return elapsed
+
+def percentile(values, p):
+    """最近秩法百分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(math.ceil(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def latency_summary(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        'runs': len(ms),
+        'p50_ms': round(percentile(ms, 50), 2),
+        'p99_ms': round(percentile(ms, 99), 2),
+        'mean_ms': round(sum(ms) / len(ms), 2),
+        'min_ms': round(min(ms), 2),
+        'max_ms': round(max(ms), 2),
+    }
+
+def run_benchmark(runs=BENCH_RUNS, parallel=BENCH_PARALLEL, total=BENCH_PARALLEL_TOTAL, network='none', progress=True):
+    """测量容器冷启动、热启动、并发启动吞吐和 exec 延迟，返回可序列化为 JSON 的结果"""
+    def step(msg):
+        if progress:
+            log_info(msg)
+
+    info = docker_info()
+    if not info:
+        raise OSError(f'无法连接 Docker Engine API ({DOCKER_SOCKET})')
+    bench_cleanup()
+    step('构建测试镜像...' if LANG == 'zh' else 'Building benchmark image...')
+    ensure_bench_image()
+
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'host': socket.gethostname(),
+        'kernel': platform.release(),
+        'arch': platform.machine(),
+        'docker_version': info.get('ServerVersion'),
+        'storage_driver': info.get('Driver'),
+        'cgroup_version': info.get('CgroupVersion'),
+        'network': network,
+    }
+    # 先运行一次预热，避免首次加载镜像的开销计入结果
+    bench_run_once(network=network)
+
+    step(f'冷启动 x{runs}' if LANG == 'zh' else f'Cold start x{runs}')
+    result['cold_start'] = latency_summary([bench_run_once(network=network) for _ in range(runs)])
+
+    step(f'热启动 x{runs}' if LANG == 'zh' else f'Warm start x{runs}')
+    container_id = bench_create(['/true'], network)
+    try:
+        result['warm_start'] = latency_summary([bench_run_once(container_id) for _ in range(runs)])
+    finally:
+        bench_remove(container_id)
+
+    step(f'并发启动 {total} 个容器，并发 {parallel}' if LANG == 'zh' else f'Parallel start: {total} containers, {parallel} at a time')
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        samples = list(pool.map(lambda _: bench_run_once(network=network), range(total)))
+    elapsed = time.time() - started
+    result['parallel_start'] = dict(latency_summary(samples), concurrency=parallel,
+                                    seconds=round(elapsed, 3), containers_per_second=round(total / elapsed, 2))
+
+    step(f'exec x{runs}')
+    container_id = bench_create(['/pause'], network)
+    try:
+        _api_json('POST', f'/containers/{container_id}/start')
+        result['exec'] = latency_summary([bench_exec_once(container_id) for _ in range(runs)])
+    finally:
+        bench_remove(container_id)
+    return result
+
+def print_benchmark(result):
+    zh = LANG == 'zh'
+    log_info(f"{result['host']}  Docker {result['docker_version']}  {result['storage_driver']}  "
+             f"{'内核' if zh else 'kernel'} {result['kernel']}")
+    print(f"  {'':<12}{'p50':>10}{'p99':>10}{'mean':>10}")
+    labels = (('cold_start', '冷启动', 'cold start'), ('warm_start', '热启动', 'warm start'),
+              ('parallel_start', '并发启动', 'parallel'), ('exec', 'exec', 'exec'))
+    for key, label_zh, label_en in labels:
+        r = result[key]
+        print(f"  {_pad(label_zh if zh else label_en, 12)}{r['p50_ms']:>8.1f}ms{r['p99_ms']:>8.1f}ms{r['mean_ms']:>8.1f}ms")
+    p = result['parallel_start']
+    print(f"  并发吞吐: {p['containers_per_second']} 个/秒（并发 {p['concurrency']}）" if zh
+          else f"  Parallel throughput: {p['containers_per_second']} containers/s (concurrency {p['concurrency']})")
+
+def smoke_test_container():
+    """安装验证：用本地构建的测试镜像运行一次容器，不需要从仓库拉取镜像"""
+    bench_cleanup()
+    ensure_bench_image()
+    return bench_run_once()
+
+STORAGE_BENCH_SIZE = 256 * 1024 * 1024  # 顺序读写测试文件大小
+STORAGE_BLOCK = 1024 * 1024  # 顺序读写块大小
+STORAGE_IO_SIZE = 4096  # 随机读写和 fsync 测试的块大小
+STORAGE_BENCH_SECONDS = 3  # 随机读写和 fsync 每项测试的时长（秒）
+STORAGE_SMALL_FILES = 2000  # 小文件创建、删除测试的文件数（模拟 overlay2 解压镜像层）
+STORAGE_MIN_FREE = 20 * 1024 ** 3  # 推荐为数据目录的最小可用空间
+STORAGE_FILESYSTEMS = ('ext4', 'xfs', 'btrfs', 'ext3', 'f2fs', 'zfs')  # 自动发现候选目录时考虑的本地文件系统
+STORAGE_SKIP_MOUNTS = ('/boot', '/efi', '/snap', '/proc', '/sys', '/dev', '/run')
+STORAGE_PATHS = []  # --storage-paths 指定的候选目录，为空时自动发现
+# 参与评分的指标：(结果中的键, 是否越大越好)
+STORAGE_METRICS = (('seq_write_bps', True), ('seq_read_bps', True), ('rand_read_iops', True), ('rand_write_iops', True),
+                   ('fsync_p50_ms', False), ('create_per_second', True), ('delete_per_second', True))
+
+def current_data_root():
+    """dockerd 正在使用的数据目录，未运行时取 daemon.json 中的 data-root"""
+    root = docker_info().get('DockerRootDir')
+    if not root:
+        try:
+            root = load_daemon_json().get('data-root')
+        except (OSError, ValueError):
+            root = None
+    return root or DOCKER_DATA_ROOT
+
+def _existing_parent(path):
+    path = os.path.realpath(path)
+    while not os.path.isdir(path) and path != '/':
+        path = os.path.dirname(path)
+    return path
+
+def storage_candidates(paths=None):
+    """候选数据目录：当前数据目录，加上各本地磁盘（可用空间足够的 ext4/xfs 等挂载点）下的 docker 目录
+
+    同一文件系统上的候选只测一次。返回 [{'data_root', 'path'}]，path 是实际写入测试文件的已存在目录。
+    """
+    if paths:
+        roots = list(paths)
+    else:
+        roots = [current_data_root()]
+        try:
+            with open('/proc/self/mountinfo', 'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if ' - ' not in line or len(fields) < 6:
+                        continue
+                    mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[4])
+                    fstype = line.split(' - ', 1)[1].split()[0]
+                    if fstype not in STORAGE_FILESYSTEMS or 'ro' in fields[5].split(','):
+                        continue
+                    if any(mount_point == p or mount_point.startswith(p + '/') for p in STORAGE_SKIP_MOUNTS + (DOCKER_DATA_ROOT,)):
+                        continue
+                    try:
+                        if disk_space(mount_point)['free'] < STORAGE_MIN_FREE:
+                            continue
+                    except OSError:
+                        continue
+                    roots.append(os.path.join(mount_point, 'docker'))
+        except OSError:
+            pass
+    candidates, devices = [], set()
+    for root in roots:
+        path = _existing_parent(root)
+        try:
+            dev = os.stat(path).st_dev
+        except OSError:
+            continue
+        if dev not in devices:
+            devices.add(dev)
+            candidates.append({'data_root': root, 'path': path})
+    return candidates
+
+def _open_direct(path, flags):
+    """尽量以 O_DIRECT 打开绕过页缓存，文件系统不支持（如 tmpfs）时返回普通描述符，第二项表示是否直接 I/O"""
+    if hasattr(os, 'O_DIRECT'):
+        try:
+            fd = os.open(path, flags | os.O_DIRECT)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+        else:
+            # 有的文件系统允许以 O_DIRECT 打开，读写时才报 EINVAL
+            probe = mmap.mmap(-1, STORAGE_IO_SIZE)
+            try:
+                _read_at(fd, probe, 0)
+                return fd, True
+            except OSError as e:
+                os.close(fd)
+                if e.errno != errno.EINVAL:
+                    raise
+            finally:
+                probe.close()
+    return os.open(path, flags), False
+
+def _drop_cache(fd):
+    os.fsync(fd)
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def _read_at(fd, buf, offset):
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.readv(fd, [buf])
 
-def install_docker_compose():
-    if not check_dependencies():
-        return False
-        
-    total_steps = 4  # 总步骤数
-    current_step = 0
-    
-    def show_progress(step_name):
-        nonlocal current_step
-        current_step += 1
-        print(f'\033[36m[{current_step}/{total_steps}]\033[0m {step_name}')
-    
-    log_info('正在安装 Docker Compose...')
-    
+def bench_sequential(path, size):
+    """顺序写（含最后的 fsync）和顺序读，返回字节/秒"""
+    data = os.urandom(STORAGE_BLOCK)  # 随机内容，避免透明压缩影响结果
+    started = time.time()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
     try:
-        # 1. 检查 Docker
-        show_progress('检查 Docker 环境')
-        if not is_docker_installed():
-            log_error('请先安装 Docker')
-            return False
-            
-        # 2. 下载 Docker Compose
-        show_progress('下载 Docker Compose')
-        uname_s = platform.system()
-        uname_m = platform.machine()
-        url = f'https://github.com/docker/compose/releases/latest/download/docker-compose-{uname_s}-{uname_m}'
-        target = '/usr/local/bin/docker-compose'
-        
-        code, _, err = exec_command(f'curl -L {url} -o {target}', shell=True)
-        if code != 0:
-            log_error(f'下载失败: {err}')
-            return False
-            
-        # 3. 设置权限
-        show_progress('设置执行权限')
+        for _ in range(size // STORAGE_BLOCK):
+            os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    write_bps = size / max(time.time() - started, 1e-6)
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        _drop_cache(fd)
+    finally:
+        os.close(fd)
+    buf = mmap.mmap(-1, STORAGE_BLOCK)  # 页对齐，满足 O_DIRECT 的要求
+    fd, direct = _open_direct(path, os.O_RDONLY)
+    try:
+        started = time.time()
+        offset = 0
+        while offset < size:
+            n = _read_at(fd, buf, offset)
+            if not n:
+                break
+            offset += n
+        read_bps = offset / max(time.time() - started, 1e-6)
+    finally:
+        os.close(fd)
+        buf.close()
+    return write_bps, read_bps, direct
+
+def bench_random(path, size, write, seconds=STORAGE_BENCH_SECONDS):
+    """队列深度 1 的 4K 随机读或随机写，返回每秒操作数
+
+    优先使用直接 I/O；不支持时随机写在结束前 fsync 并计入用时，随机读前丢弃页缓存并关闭预读。
+    """
+    buf = mmap.mmap(-1, STORAGE_IO_SIZE)
+    if write:
+        buf.write(os.urandom(STORAGE_IO_SIZE))
+    blocks = size // STORAGE_IO_SIZE
+    fd, direct = _open_direct(path, os.O_RDWR if write else os.O_RDONLY)
+    try:
+        if not direct:
+            _drop_cache(fd)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_RANDOM)
+        rand = random.Random(size)
+        ops = 0
+        started = time.time()
+        deadline = started + seconds
+        while time.time() < deadline:
+            offset = rand.randrange(blocks) * STORAGE_IO_SIZE
+            os.lseek(fd, offset, os.SEEK_SET)
+            if write:
+                os.writev(fd, [buf])
+            else:
+                os.readv(fd, [buf])
+            ops += 1
+        if write and not direct:
+            os.fsync(fd)
+        return ops / max(time.time() - started, 1e-6)
+    finally:
+        os.close(fd)
+        buf.close()
+
+def bench_fsync(path, seconds=STORAGE_BENCH_SECONDS, limit=1000):
+    """反复写入 4K 并 fsync，返回每次的耗时（秒）"""
+    data = os.urandom(STORAGE_IO_SIZE)
+    samples = []
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        deadline = time.time() + seconds
+        while time.time() < deadline and len(samples) < limit:
+            started = time.time()
+            os.pwrite(fd, data, 0)
+            os.fsync(fd)
+            samples.append(time.time() - started)
+    finally:
+        os.close(fd)
+    return samples
+
+def bench_small_files(path, count=STORAGE_SMALL_FILES):
+    """在 32 个子目录中创建 count 个 4K 文件再逐个删除，返回 (每秒创建数, 每秒删除数)"""
+    data = os.urandom(STORAGE_IO_SIZE)
+    dirs = [os.path.join(path, f'{i:02x}') for i in range(32)]
+    started = time.time()
+    for d in dirs:
+        os.mkdir(d)
+    files = []
+    for i in range(count):
+        name = os.path.join(dirs[i % len(dirs)], str(i))
+        fd = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
         try:
-            os.chmod(target, 0o755)
-        except Exception as e:
-            log_error(f'设置权限失败: {e}')
-            return False
-            
-        # 4. 验证安装
-        show_progress('验证安装')
-        if is_docker_compose_installed():
-            code, out, _ = exec_command('docker-compose', '--version')
-            if code == 0:
-                log_info('\n\033[32m✓ Docker Compose 安装成功！\033[0m')
-                log_info(f'版本信息: {out}')
-                return True
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        files.append(name)
+    created = count / max(time.time() - started, 1e-6)
+    started = time.time()
+    for name in files:
+        os.unlink(name)
+    for d in dirs:
+        os.rmdir(d)
+    deleted = count / max(time.time() - started, 1e-6)
+    return created, deleted
+
+def bench_storage_path(candidate, size=STORAGE_BENCH_SIZE, progress=True):
+    """在候选目录下的临时目录中依次测试，结束后删除临时文件"""
+    path = candidate['path']
+    space = disk_space(path)
+    result = dict(candidate, fstype=space['fstype'], total=space['total'], free=space['free'],
+                  overlay2=space['fstype'] in OVERLAY2_FILESYSTEMS, error=None)
+    if space['free'] < size * 2:
+        result['error'] = '可用空间不足以进行测试' if LANG == 'zh' else 'not enough free space for the test file'
+        return result
+    tmp_dir = tempfile.mkdtemp(prefix='.docker-all-install-bench-', dir=path)
+    try:
+        data_file = os.path.join(tmp_dir, 'data')
+        if progress:
+            log_info(f"{path} ({space['fstype'] or '-'})" + (': 顺序读写' if LANG == 'zh' else ': sequential I/O'))
+        write_bps, read_bps, direct = bench_sequential(data_file, size)
+        result.update(seq_write_bps=round(write_bps), seq_read_bps=round(read_bps), direct_io=direct)
+        if progress:
+            log_info('  随机读写' if LANG == 'zh' else '  random I/O')
+        result['rand_read_iops'] = round(bench_random(data_file, size, write=False))
+        result['rand_write_iops'] = round(bench_random(data_file, size, write=True))
+        os.unlink(data_file)
+        if progress:
+            log_info('  fsync 延迟与小文件' if LANG == 'zh' else '  fsync latency and small files')
+        samples = bench_fsync(os.path.join(tmp_dir, 'fsync'))
+        result['fsync'] = latency_summary(samples)
+        # 评分用未取整的值，高速设备上 p50 可能不到 0.01ms
+        result['fsync_p50_ms'] = round(percentile(samples, 50) * 1000, 4)
+        created, deleted = bench_small_files(tmp_dir)
+        result.update(create_per_second=round(created), delete_per_second=round(deleted))
+    except OSError as e:
+        result['error'] = str(e)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return result
+
+def recommend_data_root(results):
+    """按各项指标相对最优值的几何平均数评分，优先选择可承载 overlay2 且可用空间足够的目录"""
+    ok = [r for r in results if not r['error']]
+    for r in ok:
+        ratios = []
+        for key, higher in STORAGE_METRICS:
+            if higher:
+                best = max(o[key] for o in ok)
+                ratios.append(max(r[key], 1e-3) / best if best > 0 else 1)
             else:
-                log_error('Docker Compose 已安装但无法获取版本信息')
-                return False
-        else:
-            log_error('Docker Compose 安装失败，命令不可用')
-            return False
-            
-    except Exception as e:
-        log_error(f'安装过程发生错误: {e}')
-        return False
+                best = min(o[key] for o in ok)
+                ratios.append(best / r[key] if r[key] > 0 else 1)
+        r['score'] = round(100 * math.exp(sum(math.log(x) for x in ratios) / len(ratios)), 1)
+    eligible = [r for r in ok if r['overlay2'] and r['free'] >= STORAGE_MIN_FREE] or ok
+    return max(eligible, key=lambda r: r['score']) if eligible else None
 
-def is_docker_installed():
-    # 检查二进制文件
-    docker_paths = ['/usr/bin/docker', '/usr/local/bin/docker']
-    for path in docker_paths:
-        if os.path.isfile(path) and os.access(path, os.X_OK):
-            return True
-            
-    # 检查服务状态
-    code, _, _ = exec_command('systemctl', 'is-active', 'docker')
-    if code == 0:
-        return True
-        
-    # 检查命令可用性
-    code, _, _ = exec_command('docker', '--version')
-    return code == 0
+def run_storage_benchmark(paths=None, size=STORAGE_BENCH_SIZE, progress=True):
+    data_root = current_data_root()
+    results = [bench_storage_path(c, size, progress) for c in storage_candidates(paths)]
+    best = recommend_data_root(results)
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'host': socket.gethostname(), 'data_root': data_root,
+            'test_size': size, 'results': results, 'recommended': best['data_root'] if best else None}
 
-def is_docker_compose_installed():
-    code, _, _ = exec_command('docker', 'compose', 'version')
-    if code == 0:
-        return True
-    code, _, _ = exec_command('docker-compose', '--version')
-    return code == 0
+STORAGE_COLUMNS = (11, 11, 14, 14, 16, 16, 7)
 
-def uninstall_docker():
-    if not is_docker_installed():
-        log_warn('未检测到 Docker，无需卸载。' if LANG == 'zh' else 'Docker not found, nothing to uninstall.')
-        return
+def print_storage_benchmark(result):
+    zh = LANG == 'zh'
+    header = ('顺序写/s', '顺序读/s', '随机读 IOPS', '随机写 IOPS', 'fsync p50/p99', '建/删文件/s', '得分') if zh \
+        else ('SEQ WR/s', 'SEQ RD/s', 'RAND RD IOPS', 'RAND WR IOPS', 'FSYNC p50/p99', 'CREATE/DEL/s', 'SCORE')
+    print()
+    print(''.join(_pad(v, w, right=True) for v, w in zip(header, STORAGE_COLUMNS)) + '  ' + ('数据目录' if zh else 'DATA ROOT'))
+    for r in result['results']:
+        label = f"{r['data_root']} ({r['fstype'] or '-'}, {'可用' if zh else 'free'} {format_size(r['free'])})"
+        if r['error']:
+            print(_pad('-', sum(STORAGE_COLUMNS), right=True) + f"  {label}  \033[31m{r['error']}\033[0m")
+            continue
+        row = (format_size(r['seq_write_bps']), format_size(r['seq_read_bps']), r['rand_read_iops'], r['rand_write_iops'],
+               f"{r['fsync']['p50_ms']:.2f}/{r['fsync']['p99_ms']:.2f}ms",
+               f"{r['create_per_second']}/{r['delete_per_second']}", r['score'])
+        print(''.join(_pad(v, w, right=True) for v, w in zip(row, STORAGE_COLUMNS)) + '  ' + label)
+        notes = []
+        if not r['direct_io']:
+            notes.append('不支持直接 I/O，读测试可能受页缓存影响' if zh else 'no direct I/O, reads may be served from page cache')
+        if not r['overlay2']:
+            notes.append('文件系统不适合 overlay2' if zh else 'filesystem is not suitable for overlay2')
+        if r['free'] < STORAGE_MIN_FREE:
+            notes.append(f'可用空间小于 {format_size(STORAGE_MIN_FREE)}' if zh else f'less than {format_size(STORAGE_MIN_FREE)} free')
+        if notes:
+            print(' ' * sum(STORAGE_COLUMNS) + '  \033[33m' + ('；' if zh else '; ').join(notes) + '\033[0m')
+    best = result['recommended']
+    if not best:
+        log_error('没有可用的候选目录' if zh else 'No usable candidate')
+    elif os.path.realpath(best) == os.path.realpath(result['data_root']):
+        log_info(f'推荐数据目录: {best}（当前数据目录）' if zh else f'Recommended data-root: {best} (current)')
+    else:
+        log_info(f'推荐数据目录: {best}，在 {DAEMON_JSON} 中设置 "data-root": "{best}"' if zh
+                 else f'Recommended data-root: {best}, set "data-root": "{best}" in {DAEMON_JSON}')
 
-    total_steps = 5  # 总步骤数
-    current_step = 0
-    
-    def show_progress(step_name):
-        nonlocal current_step
-        current_step += 1
-        print(f'\033[36m[{current_step}/{total_steps}]\033[0m {step_name}')
-    
-    log_info('卸载 Docker ...' if LANG == 'zh' else 'Uninstalling Docker ...')
-    
+MIGRATE_WORKERS = 16  # 并行复制的线程数
+MIGRATE_CHUNK = 1024 * 1024  # 复制文件内容的块大小
+MIGRATE_LIVE_PASSES = 3  # dockerd 运行期间最多复制的轮数
+MIGRATE_SETTLE_BYTES = 256 * 1024 * 1024  # 一轮在线复制的变化量低于该值时进入停机同步
+MIGRATE_STATE = os.path.join(STATE_DIR, 'migrate.json')  # 记录上一轮复制开始的时间，中断后再次执行时只复制增量
+MIGRATE_MAX_ERRORS = 20  # 保留的错误明细条数
+MIGRATE_TARGET = None  # --data-root 指定的新数据目录
+MIGRATE_DRY_RUN = False
+# 目标中多余的扩展属性只删除这些命名空间，security.* 可能由目标文件系统（SELinux 等）自动设置
+MIGRATE_XATTR_NAMESPACES = ('trusted.', 'user.')
+
+def _data_extents(fd, size):
+    """文件中有数据的区间，文件系统不支持 SEEK_DATA 时整个文件视为数据"""
+    if not hasattr(os, 'SEEK_DATA'):
+        return [(0, size)]
+    extents, offset = [], 0
     try:
-        # 1. 停止服务
-        show_progress('停止 Docker 服务')
-        exec_command('systemctl', 'stop', 'docker')
-        exec_command('systemctl', 'disable', 'docker')
-        exec_command('pkill', 'docker')
-        
-        # 2. 卸载包
-        show_progress('移除 Docker 包')
-        exec_command('apt-get', 'remove', '-y', 'docker', 'docker-engine', 'docker.io', 'containerd', 'runc')
-        exec_command('apt-get', 'purge', '-y', 'docker-ce', 'docker-ce-cli', 'containerd.io')
-        exec_command('yum', 'remove', '-y', 'docker', 'docker-client', 'docker-client-latest', 'docker-common', 'docker-latest', 'docker-latest-logrotate', 'docker-logrotate', 'docker-engine')
-        exec_command('snap', 'remove', 'docker')
-        
-        # 3. 清理二进制文件
-        show_progress('清理二进制文件')
-        for path in ['/usr/bin/docker', '/usr/local/bin/docker', '/snap/bin/docker']:
+        while offset < size:
             try:
-                if os.path.exists(path):
-                    os.remove(path)
-                    log_info(f'已删除: {path}')
-            except Exception as e:
-                log_warn(f'删除 {path} 失败: {e}')
-        
-        # 4. 清理数据目录
-        show_progress('清理数据目录')
-        dirs_to_remove = ['/var/lib/docker', '/etc/docker', '/var/run/docker']
-        for dir_path in dirs_to_remove:
-            if os.path.exists(dir_path):
-                try:
-                    shutil.rmtree(dir_path)
-                    log_info(f'已删除: {dir_path}')
-                except Exception as e:
-                    log_warn(f'删除 {dir_path} 失败: {e}')
-        
-        # 5. 验证卸载结果
-        show_progress('验证卸载结果')
-        if is_docker_installed():
-            log_warn('Docker 仍然存在，请手动检查残留文件或其他安装方式。' if LANG == 'zh' else 'Docker still exists, please check for leftover files or other install methods.')
-        else:
-            log_info('\n\033[32m✓ Docker 已完全卸载！\033[0m' if LANG == 'zh' else '\n\033[32m✓ Docker completely uninstalled!\033[0m')
-            
-    except Exception as e:
-        log_error(f'卸载过程发生错误: {e}')
+                start = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    break  # 之后全是空洞
+                raise
+            if start >= size:
+                break
+            end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+            extents.append((start, end))
+            offset = end
+    except OSError as e:
+        if e.errno in (errno.EINVAL, errno.EOPNOTSUPP):
+            return [(0, size)]
+        raise
+    return extents
 
-def uninstall_docker_compose():
-    if not is_docker_compose_installed():
-        log_warn('未检测到 Docker Compose，无需卸载。' if LANG == 'zh' else 'Docker Compose not found, nothing to uninstall.')
-        return
+class TreeCopier:
+    """多线程基于 scandir 把目录树同步到目标目录
 
-    total_steps = 4  # 总步骤数
-    current_step = 0
-    
-    def show_progress(step_name):
-        nonlocal current_step
-        current_step += 1
-        print(f'\033[36m[{current_step}/{total_steps}]\033[0m {step_name}')
-    
-    log_info('卸载 Docker Compose ...' if LANG == 'zh' else 'Uninstalling Docker Compose ...')
-    
-    try:
-        # 1. 停止进程
-        show_progress('停止相关进程')
-        exec_command('pkill', '-f', 'docker-compose')
-        
-        # 2. 移除二进制文件
-        show_progress('移除二进制文件')
-        compose_paths = [
-            '/usr/local/bin/docker-compose',
-            '/usr/bin/docker-compose',
-            '/snap/bin/docker-compose',
-            '/usr/libexec/docker/cli-plugins/docker-compose'
-        ]
-        for path in compose_paths:
-            if os.path.exists(path):
-                try:
-                    os.remove(path)
-                    log_info(f'已删除: {path}')
-                except Exception as e:
-                    log_warn(f'删除 {path} 失败: {e}')
+    与 TreeSizer 相同的队列模型，不跨越文件系统边界（运行中容器的挂载点只创建空目录）。
+    保留硬链接、扩展属性（包括 overlay2 的 trusted.overlay.*）、稀疏文件的空洞、属主、权限和时间戳，
+    whiteout 等设备文件用 mknod 重建，目标中源目录已不存在的条目被删除。
+    since 为上一轮复制开始的时间：ctime 早于它且大小、mtime、权限、属主都一致的条目直接跳过，
+    增量同步只复制变化的部分。
+    """
 
-        # 3. 清理系统包和配置
-        show_progress('清理系统包和配置')
-        exec_command('apt-get', 'remove', '-y', 'docker-compose-plugin')
-        exec_command('apt-get', 'purge', '-y', 'docker-compose-plugin')
-        exec_command('snap', 'remove', 'docker-compose')
-        
-        user_config_paths = [
-            os.path.expanduser('~/.docker/cli-plugins/docker-compose'),
-            os.path.expanduser('~/.docker/compose'),
-        ]
-        for path in user_config_paths:
-            if os.path.exists(path):
+    def __init__(self, src, dst, since=None, workers=MIGRATE_WORKERS):
+        self.src = src
+        self.dst = dst
+        self.since_ns = int(since * 1e9) if since else 0
+        self.workers = workers
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.removed = 0
+        self.vanished = 0  # 复制过程中被删除的源文件（dockerd 运行时正常出现）
+        self.errors = []
+        self.error_count = 0
+        self.started = None
+        self.finished = None
+        self._links = {}  # (st_dev, st_ino) -> (目标路径, 该路径创建完成的事件)
+        self._dirs = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def done(self):
+        return self.finished is not None
+
+    def _run(self):
+        try:
+            st = os.lstat(self.src)
+            created, dst_st = self._ensure_dir(self.dst)
+            self._dirs.append((0, self.src, st, self.dst, created, dst_st))
+            self._queue.put((self.src, self.dst, st.st_dev, 0))
+        except OSError as e:
+            self._error(self.src, e)
+            self.finished = time.time()
+            return
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join()
+        # 子目录内容同步完成后由深到浅设置目录的属性和时间戳，写入子条目会改变目录的 mtime
+        for _, src, st, dst, created, dst_st in sorted(self._dirs, key=lambda d: d[0], reverse=True):
+            try:
+                if created or not self._same_meta(st, dst_st) or st.st_ctime_ns >= self.since_ns:
+                    self._apply_meta(src, st, dst, created)
+                else:
+                    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+            except OSError as e:
+                self._error(dst, e)
+        self.finished = time.time()
+
+    def _error(self, path, e):
+        with self._lock:
+            if isinstance(e, FileNotFoundError) and path.startswith(self.src):
+                self.vanished += 1
+                return
+            self.error_count += 1
+            if len(self.errors) < MIGRATE_MAX_ERRORS:
+                self.errors.append(f'{path}: {e}')
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            try:
+                self._sync_dir(*item)
+            except OSError as e:
+                self._error(item[0], e)
+            self._queue.task_done()
+
+    def _sync_dir(self, src_dir, dst_dir, dev, depth):
+        names = set()
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                names.add(entry.name)
+                dst = os.path.join(dst_dir, entry.name)
                 try:
-                    if os.path.isdir(path):
-                        shutil.rmtree(path)
+                    st = entry.stat(follow_symlinks=False)
+                    if stat.S_ISDIR(st.st_mode):
+                        created, dst_st = self._ensure_dir(dst)
+                        with self._lock:
+                            self._dirs.append((depth + 1, entry.path, st, dst, created, dst_st))
+                        if st.st_dev == dev:
+                            self._queue.put((entry.path, dst, dev, depth + 1))
                     else:
-                        os.remove(path)
-                    log_info(f'已删除: {path}')
-                except Exception as e:
-                    log_warn(f'删除 {path} 失败: {e}')
+                        self._sync_entry(entry.path, st, dst)
+                except OSError as e:
+                    self._error(entry.path, e)
+        # 删除目标中源目录已不存在的条目
+        removed = 0
+        with os.scandir(dst_dir) as it:
+            extra = [entry.path for entry in it if entry.name not in names]
+        for path in extra:
+            try:
+                self._remove(path)
+                removed += 1
+            except OSError as e:
+                self._error(path, e)
+        if removed:
+            with self._lock:
+                self.removed += removed
 
-        # 4. 验证卸载结果
-        show_progress('验证卸载结果')
-        if is_docker_compose_installed():
-            log_warn('Docker Compose 仍然存在，请检查以下位置：')
-            code, out, _ = exec_command('which', '-a', 'docker-compose')
-            if code == 0 and out:
-                for line in out.splitlines():
-                    log_warn(f'- {line}')
+    @staticmethod
+    def _remove(path):
+        if stat.S_ISDIR(os.lstat(path).st_mode):
+            shutil.rmtree(path)
         else:
-            log_info('\n\033[32m✓ Docker Compose 已完全卸载！\033[0m' if LANG == 'zh' else '\n\033[32m✓ Docker Compose completely uninstalled!\033[0m')
-            
-    except Exception as e:
-        log_error(f'卸载过程发生错误: {e}')
+            os.unlink(path)
 
-def show_docker_version():
-    code, out, _ = exec_command('docker', '--version')
-    if code == 0:
-        log_info(out)
-    else:
-        log_error('未检测到 Docker。' if LANG == 'zh' else 'Docker not found.')
+    def _ensure_dir(self, dst):
+        """返回 (是否新建, 已有目录的 stat)"""
+        try:
+            dst_st = os.lstat(dst)
+            if stat.S_ISDIR(dst_st.st_mode):
+                return False, dst_st
+            os.unlink(dst)
+        except FileNotFoundError:
+            pass
+        os.mkdir(dst, 0o700)
+        return True, None
 
-def show_docker_compose_version():
-    code, out, _ = exec_command('docker', 'compose', 'version')
-    if code == 0:
-        log_info(out)
-        return
-    code, out, _ = exec_command('docker-compose', 'version')
-    if code == 0:
-        log_info(out)
-    else:
-        log_error('未检测到 Docker Compose。' if LANG == 'zh' else 'Docker Compose not found.')
+    @staticmethod
+    def _same_meta(st, dst_st):
+        return (dst_st is not None and dst_st.st_mode == st.st_mode
+                and dst_st.st_uid == st.st_uid and dst_st.st_gid == st.st_gid)
 
-def show_docker_status():
-    # 检查服务状态
-    code, out, _ = exec_command('systemctl', 'status', 'docker')
-    if code == 0:
-        log_info(out)
+    def _sync_entry(self, src, st, dst):
+        try:
+            dst_st = os.lstat(dst)
+        except FileNotFoundError:
+            dst_st = None
+        if dst_st is not None and stat.S_IFMT(dst_st.st_mode) != stat.S_IFMT(st.st_mode):
+            self._remove(dst)
+            dst_st = None
+
+        if st.st_nlink > 1:
+            key = (st.st_dev, st.st_ino)
+            with self._lock:
+                first = self._links.get(key)
+                if first is None:
+                    self._links[key] = (dst, threading.Event())
+            if first is not None:
+                first_path, ready = first
+                ready.wait()
+                self._link(first_path, dst, dst_st)
+                return
+            try:
+                self._sync_file(src, st, dst, dst_st)
+            finally:
+                self._links[key][1].set()
+            return
+        self._sync_file(src, st, dst, dst_st)
+
+    def _link(self, first_path, dst, dst_st):
+        """同一 inode 的其它路径在目标中也建成硬链接"""
+        if dst_st is not None:
+            if dst_st.st_ino == os.lstat(first_path).st_ino:
+                with self._lock:
+                    self.skipped += 1
+                return
+            os.unlink(dst)
+        os.link(first_path, dst)
+        with self._lock:
+            self.files += 1
+
+    def _sync_file(self, src, st, dst, dst_st):
+        same_content = (dst_st is not None and dst_st.st_size == st.st_size and dst_st.st_mtime_ns == st.st_mtime_ns
+                        and (not stat.S_ISLNK(st.st_mode) or os.readlink(dst) == os.readlink(src))
+                        and (not (stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode)) or dst_st.st_rdev == st.st_rdev))
+        if same_content and self._same_meta(st, dst_st) and st.st_ctime_ns < self.since_ns:
+            with self._lock:
+                self.skipped += 1
+            return
+        copied = 0
+        if not same_content:
+            if dst_st is not None:
+                os.unlink(dst)  # 不在原 inode 上改写，避免影响目标中与它硬链接的其它路径
+            if stat.S_ISREG(st.st_mode):
+                copied = self._copy_file(src, st, dst)
+            elif stat.S_ISLNK(st.st_mode):
+                os.symlink(os.readlink(src), dst)
+            else:
+                # overlay2 的 whiteout 是 0/0 字符设备，FIFO 和 socket 同样用 mknod 重建
+                os.mknod(dst, stat.S_IFMT(st.st_mode) | 0o600, st.st_rdev)
+        self._apply_meta(src, st, dst, dst_st is None or not same_content)
+        with self._lock:
+            self.files += 1
+            self.bytes += copied
+
+    @staticmethod
+    def _copy_file(src, st, dst):
+        """只复制有数据的区间，末尾用 ftruncate 补齐，空洞保持为空洞"""
+        copied = 0
+        fin = os.open(src, os.O_RDONLY)
+        try:
+            fout = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                for start, end in _data_extents(fin, st.st_size):
+                    offset = start
+                    while offset < end:
+                        chunk = os.pread(fin, min(MIGRATE_CHUNK, end - offset), offset)
+                        if not chunk:
+                            break
+                        view = memoryview(chunk)
+                        while view:
+                            n = os.pwrite(fout, view, offset)
+                            view = view[n:]
+                            offset += n
+                        copied += len(chunk)
+                os.ftruncate(fout, st.st_size)
+            finally:
+                os.close(fout)
+        finally:
+            os.close(fin)
+        return copied
+
+    @staticmethod
+    def _apply_meta(src, st, dst, created):
+        """属主、权限、扩展属性、时间戳，顺序不能变：chown 会清除 setuid 位和 security.capability"""
+        os.chown(dst, st.st_uid, st.st_gid, follow_symlinks=False)
+        if not stat.S_ISLNK(st.st_mode):
+            os.chmod(dst, stat.S_IMODE(st.st_mode))
+        try:
+            names = os.listxattr(src, follow_symlinks=False)
+        except OSError as e:
+            if e.errno not in (errno.ENOTSUP, errno.EOPNOTSUPP):
+                raise
+            names = []
+        for name in names:
+            os.setxattr(dst, name, os.getxattr(src, name, follow_symlinks=False), follow_symlinks=False)
+        if not created:
+            try:
+                stale = [name for name in os.listxattr(dst, follow_symlinks=False)
+                         if name.startswith(MIGRATE_XATTR_NAMESPACES) and name not in names]
+            except OSError:
+                stale = []
+            for name in stale:
+                os.removexattr(dst, name, follow_symlinks=False)
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+
+    def progress_text(self):
+        elapsed = max((self.finished or time.time()) - self.started, 1e-6)
+        if LANG == 'zh':
+            return (f'复制 {self.files} 个，跳过 {self.skipped} 个，删除 {self.removed} 个，'
+                    f'{format_size(self.bytes)}，{format_size(self.bytes / elapsed)}/s')
+        return (f'{self.files} copied, {self.skipped} unchanged, {self.removed} removed, '
+                f'{format_size(self.bytes)}, {format_size(self.bytes / elapsed)}/s')
+
+    def wait(self, show_progress=True):
+        while not self.done():
+            if show_progress:
+                sys.stdout.write(f'\r  {self.progress_text()}   ')
+                sys.stdout.flush()
+            self._thread.join(timeout=1)
+        if show_progress:
+            sys.stdout.write(f'\r  {self.progress_text()}   \n')
+        return self
+
+def _load_migrate_state(source, target):
+    try:
+        with open(MIGRATE_STATE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get('source') == source and state.get('target') == target else None
+
+def _save_migrate_state(source, target, since):
+    try:
+        os.makedirs(os.path.dirname(MIGRATE_STATE), exist_ok=True)
+        tmp_path = MIGRATE_STATE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': source, 'target': target, 'since': since}, f, indent=2)
+        os.replace(tmp_path, MIGRATE_STATE)
+    except OSError as e:
+        log_warn(f'保存迁移进度失败: {e}')
+
+def _report_copy_errors(copier):
+    for message in copier.errors:
+        log_error(f'  {message}')
+    if copier.error_count > len(copier.errors):
+        log_error(f'  ... 共 {copier.error_count} 个错误' if LANG == 'zh' else f'  ... {copier.error_count} errors in total')
+
+def check_migration(source, target, info):
+    """迁移前检查，返回错误说明；可以迁移时返回 None"""
+    zh = LANG == 'zh'
+    if target == source:
+        return '新数据目录与当前数据目录相同' if zh else 'target is the current data-root'
+    if target.startswith(source.rstrip('/') + '/') or source.startswith(target.rstrip('/') + '/'):
+        return '新旧数据目录不能互相包含' if zh else 'source and target must not contain each other'
+    if os.path.isdir(target) and os.listdir(target) and not _load_migrate_state(source, target):
+        return f'{target} 不是空目录' if zh else f'{target} is not empty'
+    fstype = filesystem_type(target)
+    if info.get('Driver') == 'overlay2' and fstype not in OVERLAY2_FILESYSTEMS:
+        return (f'{target} 所在文件系统 ({fstype or "-"}) 不适合 overlay2' if zh
+                else f'{target} is on {fstype or "an unknown filesystem"}, which cannot host overlay2')
+    if info.get('LiveRestoreEnabled') and info.get('ContainersRunning'):
+        return ('已启用 live-restore，停止 dockerd 时容器会继续运行在原数据目录上，请先停止所有容器' if zh
+                else 'live-restore is enabled and containers keep running on the old data-root; stop them first')
+    return None
+
+def migrate_data_root(target, dry_run=False):
+    """--action migrate：两阶段迁移数据目录
+
+    dockerd 运行时并行复制（最多 MIGRATE_LIVE_PASSES 轮，变化量足够小时提前结束），
+    然后停止 dockerd 做最后一次增量同步，修改 daemon.json 的 data-root 后启动并核对镜像和容器数量。
+    停机时间取决于最后一轮的变化量；原数据目录保留不删除，验证失败时恢复原配置。
+    """
+    zh = LANG == 'zh'
+    info = docker_info()
+    if not info:
+        log_error(f'Docker 未运行（{DOCKER_SOCKET}）' if zh else f'Docker is not running ({DOCKER_SOCKET})')
+        return False
+    source = os.path.realpath(info.get('DockerRootDir') or DOCKER_DATA_ROOT)
+    target = os.path.realpath(target)
+    problem = check_migration(source, target, info)
+    if problem:
+        log_error(('无法迁移: ' if zh else 'Cannot migrate: ') + problem)
+        return False
+
+    sizes = TreeSizer([source, target] if os.path.isdir(target) else [source]).run()
+    need = sizes[source]['bytes'] - sizes.get(target, {}).get('bytes', 0)
+    free = disk_space(_existing_parent(target))['free']
+    log_info(f"{source} → {target}: {sizes[source]['files']} 个文件，{format_size(sizes[source]['bytes'])}，"
+             f"目标可用 {format_size(free)}" if zh else
+             f"{source} -> {target}: {sizes[source]['files']} files, {format_size(sizes[source]['bytes'])}, "
+             f"{format_size(free)} free on target")
+    if need > free:
+        log_error(f'目标空间不足，还需要 {format_size(need)}' if zh else f'Not enough space on target, {format_size(need)} needed')
+        return False
+    if dry_run:
+        return True
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    state = _load_migrate_state(source, target)
+    since = state['since'] if state else None
+    for n in range(1, MIGRATE_LIVE_PASSES + 1):
+        log_info(f'在线复制（第 {n} 轮）...' if zh else f'Copying while Docker is running (pass {n})...')
+        copier = TreeCopier(source, target, since).start().wait()
+        if copier.error_count:
+            # 出错的条目下一轮仍需完整比较，不推进增量起点
+            log_warn(f'本轮有 {copier.error_count} 个错误，将在下一轮重试' if zh
+                     else f'{copier.error_count} errors in this pass, retrying in the next one')
+            continue
+        since = copier.started
+        _save_migrate_state(source, target, since)
+        if copier.bytes < MIGRATE_SETTLE_BYTES:
+            break
+
+    log_info('停止 Docker，进行最终同步...' if zh else 'Stopping Docker for the final sync...')
+    stopped = time.time()
+    # 同时停止 docker.socket，否则同步期间的 API 请求会再次激活 dockerd
+    code, _, err = exec_command('systemctl', 'stop', 'docker.socket', 'docker', timeout=180)
+    if code != 0 or wait_for_docker(timeout=0)[0]:
+        log_error(f'停止 Docker 失败: {err.strip()}' if zh else f'Failed to stop Docker: {err.strip()}')
+        exec_command('systemctl', 'start', 'docker', timeout=120)
+        return False
+
+    def restore(message):
+        log_error(message)
+        exec_command('systemctl', 'start', 'docker', timeout=120)
+        wait_for_docker()
+        HOST_FACTS.invalidate()
+        return False
+
+    final = TreeCopier(source, target, since).start().wait()
+    if final.error_count or final.vanished:
+        _report_copy_errors(final)
+        return restore('最终同步失败，Docker 继续使用原数据目录' if zh else 'Final sync failed, Docker keeps the old data-root')
+    _save_migrate_state(source, target, final.started)
+
+    try:
+        previous = load_daemon_json().get('data-root')
+        update_daemon_json({'data-root': target}, validate=True)
+    except (OSError, ValueError) as e:
+        return restore(f'更新 {DAEMON_JSON} 失败: {e}')
+    exec_command('systemctl', 'start', 'docker', timeout=120)
+    HOST_FACTS.invalidate()
+    ready, error = wait_for_docker()
+    after = docker_info() if ready else {}
+    problems = []
+    if not ready:
+        problems.append(f'Docker 未就绪: {error}' if zh else f'Docker not ready: {error}')
+    elif os.path.realpath(after.get('DockerRootDir') or '') != target:
+        problems.append(f"DockerRootDir 为 {after.get('DockerRootDir')}")
     else:
-        log_error('Docker 服务未运行或无法获取状态。')
-    
-    # 检查运行中的容器
-    code, out, _ = exec_command('docker', 'ps')
-    if code == 0:
-        if out.strip():
-            log_info("\n运行中的容器：\n" + out)
-        else:
-            log_info("当前没有运行中的容器。")
-    
-    # 检查系统信息
-    code, out, _ = exec_command('docker', 'info')
-    if code == 0:
-        log_info("\nDocker 系统信息：\n" + out)
+        for key in ('Images', 'Containers', 'Driver'):
+            if after.get(key) != info.get(key):
+                problems.append(f'{key}: {info.get(key)} → {after.get(key)}')
+    if problems:
+        log_error(('迁移后验证失败，恢复原配置: ' if zh else 'Verification failed, restoring the old data-root: ') + '; '.join(problems))
+        exec_command('systemctl', 'stop', 'docker.socket', 'docker', timeout=180)
+        try:
+            update_daemon_json({'data-root': previous})
+        except (OSError, ValueError) as e:
+            log_error(f'恢复 {DAEMON_JSON} 失败: {e}')
+        return restore('已恢复原数据目录' if zh else 'Restored the old data-root')
+
+    downtime = time.time() - stopped
+    try:
+        os.remove(MIGRATE_STATE)
+    except OSError:
+        pass
+    log_info(f'迁移完成: 停机 {downtime:.1f}s（最终同步 {final.files} 个文件，{format_size(final.bytes)}），'
+             f"镜像 {after.get('Images')} 个，容器 {after.get('Containers')} 个" if zh else
+             f'Migration finished: {downtime:.1f}s of downtime (final sync {final.files} files, {format_size(final.bytes)}), '
+             f"{after.get('Images')} images, {after.get('Containers')} containers")
+    log_info(f'原数据目录 {source} 已保留，确认无误后可手动删除' if zh
+             else f'The old data-root {source} was kept; remove it once you are satisfied')
+    return True
 
 def menu():
     menu_text = {
@@ -471,6 +4670,7 @@ def menu():
   \033[31m7. 一键卸载全部\033[0m
   \033[31m8. 卸载 Docker\033[0m
   \033[31m9. 卸载 Docker Compose\033[0m
+  \033[33m10. 磁盘占用分析与清理\033[0m
   \033[90m0. 退出\033[0m
 \033[36m------------------------------------------\033[0m
 请输入数字选择操作：''',
@@ -487,6 +4687,7 @@ def menu():
   \033[31m7. Uninstall all\033[0m
   \033[31m8. Uninstall Docker\033[0m
   \033[31m9. Uninstall Docker Compose\033[0m
+  \033[33m10. Analyze and reclaim disk usage\033[0m
   \033[90m0. Exit\033[0m
 \033[36m------------------------------------------\033[0m
 Enter your choice:'''
@@ -498,16 +4699,8 @@ Enter your choice:'''
             print('\n\033[32mBye!\033[0m')
             break
         if choice == '1':
-            log_info('开始一键安装 Docker 和 Docker Compose...')
-            if install_docker():
-                log_info('Docker 安装成功！')
-                if install_docker_compose():
-                    log_info('Docker Compose 安装成功！')
-                    log_info('所有组件安装完成！')
-                else:
-                    log_error('Docker Compose 安装失败！')
-            else:
-                log_error('Docker 安装失败！')
+            if not install_all():
+                log_error('安装失败，重新选择将从失败的步骤继续' if LANG == 'zh' else 'Installation failed, choose again to resume')
         elif choice == '2':
             install_docker()
         elif choice == '3':
@@ -525,6 +4718,8 @@ Enter your choice:'''
             uninstall_docker()
         elif choice == '9':
             uninstall_docker_compose()
+        elif choice == '10':
+            disk_menu()
         elif choice == '0':
             print('\033[90m已退出。\033[0m' if LANG == 'zh' else '\033[90mExited.\033[0m')
             break
@@ -534,45 +4729,337 @@ Enter your choice:'''
 def check_dependencies():
     # 检查包管理器
     pkg_mgrs = ['apt-get', 'yum']
-    found_mgr = False
-    for mgr in pkg_mgrs:
-        code, _, _ = exec_command('which', mgr)
-        if code == 0:
-            found_mgr = True
-            break
-    if not found_mgr:
+    if not any(HOST_FACTS.which(mgr) for mgr in pkg_mgrs):
         log_error('未检测到支持的包管理器(apt-get/yum)')
         return False
 
-    # 检查必要工具
-    for cmd in ['curl', 'bash', 'systemctl']:
-        code, _, _ = exec_command('which', cmd)
-        if code != 0:
+    # 检查必要工具，离线安装包安装不需要 curl 和安装脚本
+    for cmd in (['systemctl'] if BUNDLE_SOURCE else ['curl', 'bash', 'systemctl']):
+        if not HOST_FACTS.which(cmd):
             log_error(f'依赖缺失：{cmd}')
             return False
 
     # 检查系统服务
-    code, _, _ = exec_command('systemctl', 'status')
+    code, _, _ = HOST_FACTS.probe('systemd')
     if code != 0:
         log_error('系统服务(systemd)异常')
         return False
 
     return True
 
+ACTIONS = ('install', 'verify', 'status', 'mirrors', 'tune', 'benchmark', 'disk', 'warmup', 'storage', 'migrate')
+
+def run_action(action, as_json=False):
+    """非交互执行单个操作，返回进程退出码"""
+    if action == 'install':
+        return 0 if install_all() else 1
+    if action == 'verify':
+        docker_ok = check_docker()
+        compose_ok = check_docker_compose()
+        return 0 if docker_ok and compose_ok else 1
+    if action == 'status':
+        return 0 if show_docker_status(as_json) else 1
+    if action == 'disk':
+        return 0 if analyze_docker_disk(as_json) else 1
+    if action == 'storage':
+        result = run_storage_benchmark(STORAGE_PATHS, STORAGE_BENCH_SIZE, progress=not as_json)
+        if as_json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            print_storage_benchmark(result)
+        return 0 if result['recommended'] else 1
+    if action == 'migrate':
+        if not MIGRATE_TARGET:
+            log_error('请用 --data-root 指定新的数据目录' if LANG == 'zh' else 'Specify the new data-root with --data-root')
+            return 2
+        return 0 if migrate_data_root(MIGRATE_TARGET, MIGRATE_DRY_RUN) else 1
+    if action == 'warmup':
+        return 0 if run_warm_up(as_json=as_json) else 1
+    if action == 'tune':
+        return 0 if apply_daemon_profile(DAEMON_PROFILE, REGISTRY_OVERRIDE, TUNE_OVERRIDE) else 1
+    if action == 'benchmark':
+        try:
+            result = run_benchmark(BENCH_RUNS, BENCH_PARALLEL, progress=not as_json)
+        except (OSError, http.client.HTTPException, DockerAPIError, RuntimeError, ValueError) as e:
+            log_error(f'基准测试失败: {e}' if LANG == 'zh' else f'Benchmark failed: {e}')
+            return 1
+        if as_json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            print_benchmark(result)
+        return 0
+    if action == 'mirrors':
+        # 只探测并显示结果，不修改配置
+        best, registry_mirrors = report_mirror_probe(*probe_mirrors(DOCKER_CE_MIRRORS, REGISTRY_MIRRORS or REGISTRY_MIRROR_SUGGESTIONS))
+        log_info(f"docker-ce 软件源: {best or '-'}" if LANG == 'zh' else f"docker-ce mirror: {best or '-'}")
+        log_info(f"registry-mirrors: {', '.join(registry_mirrors) or '-'}")
+        return 0 if best else 1
+    log_error(f'未知操作: {action}')
+    return 2
+
+FLEET_PARALLEL = 10  # 默认同时操作的主机数
+FLEET_HOST_TIMEOUT = 1800  # 单台主机默认超时（秒）
+
+class LocalExecutor:
+    """在本机以子进程执行，用于测试批量模式；主机名通过 FLEET_HOST 环境变量传入"""
+    name = 'local'
+
+    def command(self, host, remote_args):
+        script = os.path.abspath(__file__)
+        return [sys.executable, script] + remote_args, None, {'FLEET_HOST': host}
+
+class SSHExecutor:
+    """通过 ssh 在远程主机执行：本脚本经标准输入传给远程的 python3，远程无需预先部署"""
+    name = 'ssh'
+
+    def __init__(self, ssh_options=None, sudo=False):
+        self.ssh_options = ssh_options or []
+        self.sudo = sudo
+        with open(os.path.abspath(__file__), 'rb') as f:
+            self.script = f.read()
+
+    def command(self, host, remote_args):
+        target, port = host, None
+        m = re.match(r'^(.*):(\d+)$', host)
+        if m:
+            target, port = m.group(1), m.group(2)
+        argv = ['ssh', '-o', 'BatchMode=yes', '-o', 'ConnectTimeout=10']
+        if port:
+            argv += ['-p', port]
+        argv += self.ssh_options + [target]
+        argv += (['sudo', '-n'] if self.sudo else []) + ['python3', '-'] + remote_args
+        return argv, self.script, None
+
+EXECUTORS = {'local': LocalExecutor, 'ssh': SSHExecutor}
+
+def load_inventory(path):
+    """读取主机清单：每行一个 [user@]host[:port]，# 开头为注释"""
+    hosts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line and line not in hosts:
+                hosts.append(line)
+    return hosts
+
+def run_on_host(executor, host, action, log_path, timeout, extra_args=()):
+    remote_args = ['--action', action] + (['--en'] if LANG == 'en' else []) + list(extra_args)
+    argv, stdin_data, extra_env = executor.command(host, remote_args)
+    env = dict(os.environ, **extra_env) if extra_env else None
+    started = time.time()
+    result = {'host': host, 'action': action, 'status': 'FAIL', 'code': None, 'duration': 0.0, 'log': log_path}
+    with open(log_path, 'wb') as log:
+        log.write(f'$ {" ".join(argv)}\n'.encode('utf-8'))
+        log.flush()
+        try:
+            # 独立进程组，超时时连同 ssh 派生的子进程一起结束
+            proc = subprocess.Popen(argv, stdin=subprocess.PIPE if stdin_data else subprocess.DEVNULL,
+                                    stdout=log, stderr=subprocess.STDOUT, env=env, start_new_session=True)
+        except OSError as e:
+            log.write(f'{e}\n'.encode('utf-8'))
+            result['status'] = 'ERROR'
+            return result
+        try:
+            proc.communicate(stdin_data, timeout=timeout)
+            result['code'] = proc.returncode
+            result['status'] = 'OK' if proc.returncode == 0 else 'FAIL'
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+            result['status'] = 'TIMEOUT'
+            log.write(f'\n[timeout after {timeout}s]\n'.encode('utf-8'))
+    result['duration'] = time.time() - started
+    return result
+
+def run_fleet(inventory, action, executor, parallel=FLEET_PARALLEL, timeout=FLEET_HOST_TIMEOUT, log_dir=None, extra_args=()):
+    """在多台主机上并发执行操作，打印汇总表，全部成功时返回0；extra_args 原样传给每台主机"""
+    hosts = load_inventory(inventory)
+    if not hosts:
+        log_error(f'主机清单为空: {inventory}' if LANG == 'zh' else f'Empty inventory: {inventory}')
+        return 2
+    log_dir = log_dir or os.path.join('fleet-logs', time.strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(log_dir, exist_ok=True)
+    log_info(f'{action}: {len(hosts)} 台主机，并发 {parallel}，日志目录 {log_dir}' if LANG == 'zh'
+             else f'{action}: {len(hosts)} hosts, parallel {parallel}, logs in {log_dir}')
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(hosts)))) as pool:
+        futures = []
+        for host in hosts:
+            log_path = os.path.join(log_dir, re.sub(r'[^\w.@-]', '_', host) + '.log')
+            futures.append(pool.submit(run_on_host, executor, host, action, log_path, timeout, extra_args))
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            color = '32' if result['status'] == 'OK' else '31'
+            print(f"\033[{color}m[{result['status']}]\033[0m {result['host']} ({result['duration']:.1f}s)")
+
+    results.sort(key=lambda r: hosts.index(r['host']))
+    width = max(len('HOST'), max(len(r['host']) for r in results))
+    print(f"\n{'HOST':<{width}}  {'STATUS':<8}  {'CODE':>4}  {'TIME':>8}  LOG")
+    for r in results:
+        code = '-' if r['code'] is None else str(r['code'])
+        print(f"{r['host']:<{width}}  {r['status']:<8}  {code:>4}  {r['duration']:>7.1f}s  {r['log']}")
+    ok = sum(1 for r in results if r['status'] == 'OK')
+    print(f"\n{ok}/{len(results)} OK")
+    return 0 if ok == len(results) else 1
+
+def split_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+# 只在本机生效的参数，批量模式下不传给各主机（--action 和 --en 由 run_on_host 传入）
+FLEET_LOCAL_OPTIONS = ('--fleet', '--executor', '--parallel', '--host-timeout', '--log-dir', '--ssh-option', '--sudo',
+                       '--action', '--status', '--en', '--exporter', '--listen', '--compose-file', '--warmup-images',
+                       '--bundle-export', '--bundle-images', '--bundle-docker-version')
+
+def fleet_host_args(parser, args, warmup_images=()):
+    """批量模式下传给每台主机的参数：与默认值不同的选项（本机专用参数除外）由解析结果重新生成
+
+    数值按解析后的值传递（如 --older-than 30d 传为秒数，远程的 parse_duration 同样接受），
+    列表重新用逗号拼接。compose 文件只在本机，改为传解析并去重后的镜像列表。
+    """
+    forwarded = []
+    for dest, value in vars(args).items():
+        option = '--' + dest.replace('_', '-')
+        if option in FLEET_LOCAL_OPTIONS or value is None or value == parser.get_default(dest):
+            continue
+        if value is True:
+            forwarded.append(option)
+        elif isinstance(value, list):
+            forwarded += [option, ','.join(value)]
+        else:
+            # 浮点数用定点格式，避免 1e+20 这样 parse_duration / parse_size 不接受的写法
+            forwarded += [option, f'{value:f}' if isinstance(value, float) else str(value)]
+    if warmup_images:
+        forwarded += ['--warmup-images', ','.join(warmup_images)]
+    return forwarded
+
 def main():
-    global LANG
+    global LANG, MIRROR_PROBE, DOCKER_CE_MIRRORS, REGISTRY_MIRRORS, INSTALL_FORCE, DAEMON_PROFILE, TUNE_OVERRIDE, REGISTRY_OVERRIDE
+    global BENCH_RUNS, BENCH_PARALLEL, REPORT_PATH, REPORT_SUMMARY, BUNDLE_SOURCE, DISK_PRUNE, DISK_DRY_RUN, PRUNE_POLICY
+    global COMPOSE_VERSION, WARMUP_IMAGES, WARMUP_PARALLEL, STORAGE_PATHS, STORAGE_BENCH_SIZE, MIGRATE_TARGET, MIGRATE_DRY_RUN
     parser = argparse.ArgumentParser()
     parser.add_argument('--en', action='store_true', help='Use English')
+    parser.add_argument('--action', choices=ACTIONS, help='Run one action non-interactively')
+    parser.add_argument('--status', action='store_true', help='Show Docker status via the Engine API (same as --action status)')
+    parser.add_argument('--json', action='store_true', help='Print --status / benchmark / disk / warmup / storage output as JSON')
+    parser.add_argument('--bench-runs', type=int, default=BENCH_RUNS, help='Samples per benchmark measurement')
+    parser.add_argument('--bench-parallel', type=int, default=BENCH_PARALLEL, help='Concurrency of the parallel start benchmark')
+    parser.add_argument('--exporter', action='store_true', help='Serve Prometheus metrics for the daemon and its containers')
+    parser.add_argument('--listen', default=EXPORTER_LISTEN, help='Exporter listen address, host:port')
+    parser.add_argument('--fleet', metavar='INVENTORY', help='Run --action on every host in the inventory file')
+    parser.add_argument('--executor', choices=sorted(EXECUTORS), default='ssh', help='How to reach fleet hosts')
+    parser.add_argument('--parallel', type=int, default=FLEET_PARALLEL, help='Hosts processed concurrently')
+    parser.add_argument('--host-timeout', type=int, default=FLEET_HOST_TIMEOUT, help='Per-host timeout in seconds')
+    parser.add_argument('--log-dir', help='Directory for per-host logs')
+    parser.add_argument('--ssh-option', action='append', default=[], help='Extra ssh argument, repeatable')
+    parser.add_argument('--sudo', action='store_true', help='Run the remote script through sudo -n')
+    parser.add_argument('--apt-mirrors', type=split_list, help='Comma-separated docker-ce package mirrors to probe')
+    parser.add_argument('--registry-mirrors', type=split_list, help="Comma-separated registry mirrors to probe, or 'auto' for the suggested list")
+    parser.add_argument('--no-mirror-probe', action='store_true', help='Install from the default sources without probing')
+    parser.add_argument('--profile', choices=sorted(DAEMON_PROFILES) + ['none'], default=DAEMON_PROFILE,
+                        help='daemon.json tuning profile applied by install and --action tune')
+    parser.add_argument('--tune-override', action='store_true', help='Let the profile replace settings already in daemon.json')
+    parser.add_argument('--report', metavar='PATH', help=f'Write the install/uninstall timing report here (default: {REPORT_DIR}/)')
+    parser.add_argument('--timing', action='store_true', help='Print where the time went at the end of install/uninstall')
+    parser.add_argument('--force', action='store_true', help='Re-run every install step, ignoring saved progress and satisfied checks')
+    parser.add_argument('--compose-version', metavar='TAG', help='Docker Compose release to install or bundle, e.g. v2.29.1 (default: latest)')
+    parser.add_argument('--prune', action='store_true', help='With --action disk, remove what the prune policy selects')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='With --prune, only list what would be removed; with --action migrate, only run the checks')
+    parser.add_argument('--prune-targets', type=split_list, default=list(DEFAULT_PRUNE_TARGETS),
+                        help=f"Comma-separated object types to prune: {', '.join(PRUNE_TARGETS)}")
+    parser.add_argument('--older-than', type=parse_duration, metavar='AGE', help='Only prune objects older than AGE, e.g. 12h, 7d')
+    parser.add_argument('--min-size', type=parse_size, metavar='SIZE', help='Only prune objects of at least SIZE, e.g. 100MB')
+    parser.add_argument('--dangling-only', action='store_true', help='Only prune untagged images')
+    parser.add_argument('--warmup-images', type=split_list, default=[],
+                        help='Comma-separated images to pull after install or with --action warmup')
+    parser.add_argument('--compose-file', action='append', default=[], help='Also warm up the images of this compose file, repeatable')
+    parser.add_argument('--warmup-parallel', type=int, default=WARMUP_PARALLEL, help='Images pulled concurrently during warm-up')
+    parser.add_argument('--storage-paths', type=split_list, default=[],
+                        help='Comma-separated candidate data-root directories for --action storage (default: auto-detect)')
+    parser.add_argument('--storage-size', type=parse_size, default=STORAGE_BENCH_SIZE, metavar='SIZE',
+                        help='Sequential test file size for --action storage, e.g. 1GB')
+    parser.add_argument('--data-root', metavar='DIR', help='New Docker data-root for --action migrate')
+    parser.add_argument('--bundle-export', metavar='DIR', help='Build an offline install bundle for this distro under DIR')
+    parser.add_argument('--bundle-images', type=split_list, default=[], help='Comma-separated images to include in the bundle')
+    parser.add_argument('--bundle-docker-version', metavar='VERSION', help='Docker version to bundle (default: latest)')
+    parser.add_argument('--bundle', metavar='PATH|URL', help='Install from an offline bundle directory or HTTP URL')
     args = parser.parse_args()
     if args.en:
         LANG = 'en'
+    if args.apt_mirrors is not None:
+        DOCKER_CE_MIRRORS = args.apt_mirrors
+    if args.registry_mirrors == ['auto']:
+        # 探测建议列表，只在 daemon.json 没有 registry-mirrors 时写入
+        REGISTRY_MIRRORS = REGISTRY_MIRROR_SUGGESTIONS
+    elif args.registry_mirrors is not None:
+        REGISTRY_MIRRORS = REGISTRY_OVERRIDE = args.registry_mirrors
+    DAEMON_PROFILE = args.profile
+    REPORT_PATH = args.report
+    REPORT_SUMMARY = args.timing
+    BENCH_RUNS = max(1, args.bench_runs)
+    BENCH_PARALLEL = max(1, args.bench_parallel)
+    TUNE_OVERRIDE = args.tune_override
+    if args.no_mirror_probe:
+        MIRROR_PROBE = False
+    if args.force:
+        INSTALL_FORCE = True
+    BUNDLE_SOURCE = args.bundle
+    if args.compose_version:
+        COMPOSE_VERSION = args.compose_version if args.compose_version.startswith('v') else 'v' + args.compose_version
+    unknown = set(args.prune_targets) - set(PRUNE_TARGETS)
+    if unknown:
+        parser.error(f"unknown --prune-targets: {', '.join(sorted(unknown))}")
+    warmup = list(args.warmup_images)
+    for path in args.compose_file:
+        try:
+            warmup += compose_images(path)
+        except OSError as e:
+            parser.error(f'cannot read --compose-file {path}: {e}')
+    WARMUP_IMAGES = unique_images(warmup)
+    WARMUP_PARALLEL = max(1, args.warmup_parallel)
+    STORAGE_PATHS = args.storage_paths
+    STORAGE_BENCH_SIZE = max(STORAGE_BLOCK, args.storage_size // STORAGE_BLOCK * STORAGE_BLOCK)
+    MIGRATE_TARGET = args.data_root
+    MIGRATE_DRY_RUN = args.dry_run
+    DISK_PRUNE = args.prune
+    DISK_DRY_RUN = args.dry_run
+    PRUNE_POLICY = PrunePolicy(args.prune_targets, args.older_than, args.min_size, args.dangling_only)
+    if args.status:
+        if args.action and args.action != 'status':
+            parser.error('--status conflicts with --action')
+        args.action = 'status'
+
+    if args.fleet:
+        if not args.action:
+            parser.error('--fleet requires --action')
+        if args.executor == 'ssh':
+            executor = SSHExecutor(args.ssh_option, args.sudo)
+        else:
+            executor = LocalExecutor()
+        extra_args = fleet_host_args(parser, args, WARMUP_IMAGES)
+        sys.exit(run_fleet(args.fleet, args.action, executor, args.parallel, args.host_timeout, args.log_dir, extra_args))
 
     if platform.system() != 'Linux':
         log_error(text('os-not-supported'))
-        return
-    if os.geteuid() != 0:
+        sys.exit(1)
+    # 导出器、生成离线安装包、查看状态、基准测试和预拉取镜像只需能访问 docker.sock（如 docker 组用户），不要求 root
+    if args.exporter:
+        sys.exit(run_exporter(args.listen))
+    if args.bundle_export:
+        try:
+            root = export_bundle(args.bundle_export, args.bundle_images, args.bundle_docker_version)
+        except (OSError, URLError, ValueError, KeyError, ET.ParseError, http.client.HTTPException, DockerAPIError) as e:
+            log_error(f'生成离线安装包失败: {e}' if LANG == 'zh' else f'Bundle export failed: {e}')
+            root = None
+        sys.exit(0 if root else 1)
+    if os.geteuid() != 0 and args.action not in ('status', 'benchmark', 'warmup'):
         log_error(text('need-root'))
-        return
+        sys.exit(1)
+
+    if args.action:
+        sys.exit(run_action(args.action, args.json))
 
     menu()
 
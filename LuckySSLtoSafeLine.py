@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import argparse
 import requests
 import logging
 from datetime import datetime
@@ -12,6 +13,16 @@ import hmac
 import urllib.parse
 import base64
 import hashlib
+import json
+import re
+import socket
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # 非Linux平台没有fcntl，此时不做并发合并
+    fcntl = None
 
 # 配置日志
 logging.basicConfig(
@@ -59,6 +70,245 @@ for k in push_config:
 REQUEST_TIMEOUT = 30  # 请求超时时间（秒）
 MAX_RETRIES = 3  # 最大重试次数
 
+# 并发触发合并配置（Lucky批量续签时会几乎同时多次触发脚本）
+LOCK_FILE = BASE_PATH / ".safeline_sync.lock"  # 运行锁文件，同一时刻只允许一个同步任务
+PENDING_FILE = BASE_PATH / ".safeline_sync.pending"  # 待处理触发队列
+COALESCE_WINDOW = 5  # 合并窗口（秒），窗口内到达的触发合并为一次同步
+
+# 部署验证配置（上传后对证书关联的站点做TLS握手，比对实际下发的证书指纹）
+VERIFY_ENABLED = True  # 是否启用部署验证
+VERIFY_CONNECT_HOST = ""  # 握手连接地址，为空时按域名解析；可填雷池地址，直接连雷池并通过SNI指定域名
+VERIFY_PORT = 443  # 默认验证端口，related_sites中带端口时以其为准
+VERIFY_TIMEOUT = 5  # 单次握手超时时间（秒）
+VERIFY_CONCURRENCY = 8  # 最大并发握手数
+VERIFY_DELAY = 2  # 指纹不一致时等待雷池加载新证书的时间（秒）
+VERIFY_RETRIES = 3  # 指纹不一致或握手失败时的最大验证次数
+
+PEM_CERT_RE = re.compile(r'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', re.S)
+HOST_RE = re.compile(r'^(?:\[(?P<ipv6>[0-9a-fA-F:]+)\]|(?P<host>[A-Za-z0-9.-]+))(?::(?P<port>\d+))?$')
+
+def cert_fingerprint(cert_content: str) -> Optional[str]:
+    """计算PEM证书链中首个（叶子）证书的SHA-256指纹"""
+    match = PEM_CERT_RE.search(cert_content)
+    if not match:
+        return None
+    try:
+        der = ssl.PEM_cert_to_DER_cert(match.group(0))
+    except ValueError as e:  # 包括base64内容损坏时的binascii.Error
+        logger.warning(f"无法解析证书内容，跳过部署验证: {str(e)}")
+        return None
+    return hashlib.sha256(der).hexdigest()
+
+def fetch_served_fingerprint(connect_host: str, port: int, server_name: str, timeout: float = VERIFY_TIMEOUT) -> str:
+    """与目标完成一次TLS握手，返回服务端下发证书的SHA-256指纹"""
+    # 只比对指纹，不校验证书链，否则自签或中间证书缺失时无法取到证书
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    with socket.create_connection((connect_host, port), timeout=timeout) as sock:
+        with context.wrap_socket(sock, server_hostname=server_name) as tls:
+            return hashlib.sha256(tls.getpeercert(binary_form=True)).hexdigest()
+
+def verify_tls_targets(expected: str, targets: List[Tuple[str, int, str]],
+                       concurrency: int = VERIFY_CONCURRENCY, timeout: float = VERIFY_TIMEOUT) -> List[Dict]:
+    """并发握手所有目标并比对指纹
+
+    Args:
+        expected: 期望的证书SHA-256指纹
+        targets: (连接地址, 端口, SNI) 列表
+        concurrency: 最大并发数
+        timeout: 单次握手超时时间
+    """
+    def check(target: Tuple[str, int, str]) -> Dict:
+        connect_host, port, server_name = target
+        result = {'host': server_name, 'port': port, 'ok': False, 'error': None}
+        try:
+            served = fetch_served_fingerprint(connect_host, port, server_name, timeout)
+            result['ok'] = served == expected
+            if not result['ok']:
+                result['error'] = "证书指纹不一致"
+        except (OSError, ssl.SSLError, ValueError) as e:
+            # ValueError包括idna编码无法处理的主机名（UnicodeError），验证只产生失败结果，不中断同步
+            result['error'] = str(e) or e.__class__.__name__
+        return result
+
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(targets)))) as executor:
+        return list(executor.map(check, targets))
+
+class SyncCoordinator:
+    """合并并发触发：先登记触发，再争抢运行锁，抢不到的进程直接退出，由持锁进程统一处理"""
+
+    def __init__(self, lock_file: Path = LOCK_FILE, pending_file: Path = PENDING_FILE, window: float = COALESCE_WINDOW):
+        self.lock_file = lock_file
+        self.pending_file = pending_file
+        self.window = window
+        self._lock_fd = None
+
+    @property
+    def enabled(self) -> bool:
+        return fcntl is not None
+
+    def submit(self, target: Optional[Dict]) -> None:
+        """登记一次触发，target为None表示全量同步"""
+        with open(self.pending_file, 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(json.dumps(target, ensure_ascii=False) + '\n')
+
+    def try_acquire(self) -> bool:
+        """尝试获取运行锁，已有同步任务在运行时立即返回False"""
+        fd = os.open(str(self.lock_file), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def drain(self) -> List[Optional[Dict]]:
+        """取出并清空所有待处理的触发"""
+        targets = []
+        with open(self.pending_file, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    targets.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"忽略无法解析的触发记录: {line}")
+            f.truncate(0)
+        return targets
+
+    def release_if_idle(self) -> bool:
+        """队列为空时释放运行锁
+
+        检查队列与释放运行锁在同一把队列锁内完成，保证不会有触发在两者之间登记后被遗漏：
+        晚到的触发要么被本进程看到，要么能拿到已释放的运行锁自行处理。
+        """
+        with open(self.pending_file, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            if f.read().strip():
+                return False
+            self.release()
+            return True
+
+    def release(self) -> None:
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+def merge_targets(targets: List[Optional[Dict]]) -> Optional[List[Dict]]:
+    """合并多次触发的同步范围，任意一次为全量同步则结果为全量同步(None)
+
+    每次触发的范围单独保留，这样--path只用于限定它所属那次触发的文件查找。
+    """
+    merged: List[Dict] = []
+    for target in targets:
+        if not target:
+            return None
+        if target not in merged:
+            merged.append(target)
+    return merged
+
+def domain_key_of(domain: str) -> str:
+    """域名分组键：通配符域名取第二段，普通域名取第一段"""
+    if domain.startswith('*.'):
+        return domain.split('.')[1]
+    return domain.split('.')[0]
+
+class CertNode:
+    """雷池证书节点，由证书列表响应解析一次，各阶段共享同一对象"""
+    __slots__ = ('id', 'type', 'domains', 'issuer', 'valid_before', 'trusted', 'revoked', 'expired', 'related_sites')
+
+    def __init__(self, id: int, type: int, domains: Tuple[str, ...], issuer: str = '未知', valid_before: str = '',
+                 trusted: bool = False, revoked: bool = False, expired: bool = False,
+                 related_sites: Tuple[str, ...] = ()):
+        self.id = id
+        self.type = type
+        self.domains = domains
+        self.issuer = issuer
+        self.valid_before = valid_before
+        self.trusted = trusted
+        self.revoked = revoked
+        self.expired = expired
+        self.related_sites = related_sites
+
+    @classmethod
+    def from_api(cls, node: Dict) -> 'CertNode':
+        return cls(
+            id=node['id'],
+            type=node['type'],
+            domains=tuple(node.get('domains') or ()),
+            issuer=node.get('issuer') or '未知',
+            valid_before=node.get('valid_before') or '',
+            trusted=bool(node.get('trusted', False)),
+            revoked=bool(node.get('revoked', False)),
+            expired=bool(node.get('expired', False)),
+            related_sites=tuple(str(site) for site in node.get('related_sites') or ()),
+        )
+
+class DomainGroup:
+    """证书节点下domain_key相同的一组域名，是同步处理的基本单位"""
+    __slots__ = ('domain_key', 'node', 'domains')
+
+    def __init__(self, domain_key: str, node: CertNode, domains: Tuple[str, ...]):
+        self.domain_key = domain_key
+        self.node = node
+        self.domains = domains
+
+class CertInventory:
+    """证书列表的解析结果，预建 id -> 节点 和 域名 -> 节点 索引"""
+    __slots__ = ('nodes', 'groups', 'by_id', 'by_domain')
+
+    def __init__(self, nodes: List[CertNode]):
+        self.nodes = nodes
+        self.by_id: Dict[int, CertNode] = {}
+        self.by_domain: Dict[str, List[CertNode]] = {}
+        self.groups: List[DomainGroup] = []
+
+        processed_domain_keys: Set[str] = set()  # 用于记录已处理的domain_key
+        for node in nodes:
+            self.by_id.setdefault(node.id, node)
+            domain_groups: Dict[str, List[str]] = {}  # 用于按domain_key分组域名
+            for domain in node.domains:
+                self.by_domain.setdefault(domain.lower(), []).append(node)
+                domain_groups.setdefault(domain_key_of(domain), []).append(domain)
+
+            # 对每个domain_key只处理一次
+            for domain_key, domain_list in domain_groups.items():
+                if domain_key in processed_domain_keys:
+                    logger.info(f"跳过重复的domain_key: {domain_key} (域名: {', '.join(domain_list)})")
+                    continue
+                processed_domain_keys.add(domain_key)
+                self.groups.append(DomainGroup(domain_key, node, tuple(domain_list)))
+
+    @classmethod
+    def parse(cls, cert_data: Optional[Dict]) -> Optional['CertInventory']:
+        """解析证书列表响应，数据格式错误时返回None"""
+        if not cert_data or not isinstance(cert_data.get('data'), dict) or 'nodes' not in cert_data['data']:
+            return None
+        return cls([CertNode.from_api(node) for node in cert_data['data']['nodes'] or []])
+
+    def covering_domains(self, requested: str) -> Set[str]:
+        """返回覆盖请求域名的证书域名，支持 *.example.com 形式的通配符（只匹配一级子域名）"""
+        requested = requested.lower().rstrip('.')
+        candidates = [requested]
+        if not requested.startswith('*.') and '.' in requested:
+            candidates.append('*.' + requested.split('.', 1)[1])
+        return {domain for domain in candidates if domain in self.by_domain}
+
+    def group_for_node(self, node: CertNode) -> DomainGroup:
+        """节点的完整域名组，用于展示节点的全部信息"""
+        domain_key = domain_key_of(node.domains[0]) if node.domains else str(node.id)
+        return DomainGroup(domain_key, node, node.domains)
+
 class CertManager:
     def __init__(self):
         self.headers = {
@@ -73,6 +323,7 @@ class CertManager:
             logger.error(f"基础路径不存在: {BASE_PATH}")
             raise FileNotFoundError(f"基础路径不存在: {BASE_PATH}")
         logger.info(f"使用基础路径: {BASE_PATH}")
+        self._file_index: Dict[Tuple[str, ...], Dict[str, List[Tuple[int, Path, Path]]]] = {}
 
     def get_cert_list(self) -> Optional[Dict]:
         """获取证书列表"""
@@ -88,50 +339,16 @@ class CertManager:
             logger.error(f"获取证书列表失败: {str(e)}")
             return None
 
-    def extract_domain_info(self, cert_data: Dict) -> List[Dict]:
-        """提取域名信息，对相同domain_key的域名只保留一个记录"""
-        result = []
-        processed_domain_keys: Set[str] = set()  # 用于记录已处理的domain_key
-
-        if not cert_data or 'data' not in cert_data or 'nodes' not in cert_data['data']:
-            return result
-
-        for node in cert_data['data']['nodes']:
-            # 收集该节点下的所有域名
-            domains = node.get('domains', [])
-            domain_groups = {}  # 用于按domain_key分组域名
-
-            for domain in domains:
-                # 处理通配符域名和普通域名
-                if domain.startswith('*.'):
-                    domain_key = domain.split('.')[1]
-                else:
-                    domain_key = domain.split('.')[0]
-
-                if domain_key not in domain_groups:
-                    domain_groups[domain_key] = []
-                domain_groups[domain_key].append(domain)
-
-            # 对每个domain_key只处理一次
-            for domain_key, domain_list in domain_groups.items():
-                if domain_key in processed_domain_keys:
-                    logger.info(f"跳过重复的domain_key: {domain_key} (域名: {', '.join(domain_list)})")
-                    continue
-
-                processed_domain_keys.add(domain_key)
-                logger.info(f"处理域名组 - domain_key: {domain_key}, 包含域名: {', '.join(domain_list)}")
-                
-                result.append({
-                    'domain_key': domain_key,
-                    'id': node['id'],
-                    'type': node['type'],
-                    'domains': domain_list  # 保存该domain_key下的所有域名
-                })
-
-        return result
+    def extract_domain_info(self, cert_data: Dict) -> Optional[CertInventory]:
+        """解析证书列表，按domain_key分组，对相同domain_key的域名只保留一个记录"""
+        inventory = CertInventory.parse(cert_data)
+        if inventory:
+            for group in inventory.groups:
+                logger.info(f"处理域名组 - domain_key: {group.domain_key}, 包含域名: {', '.join(group.domains)}")
+        return inventory
 
-    def get_cert_info(self, cert_id: int) -> Optional[Dict]:
-        """获取指定证书的详细信息"""
+    def get_cert_info(self, cert_id: int) -> Optional[DomainGroup]:
+        """重新获取证书列表，返回指定证书最新的节点信息"""
         try:
             response = requests.get(
                 API_BASE_URL,
@@ -139,122 +356,211 @@ class CertManager:
                 timeout=REQUEST_TIMEOUT
             )
             response.raise_for_status()
-            cert_data = response.json()
+            inventory = CertInventory.parse(response.json())
             
-            if not cert_data or 'data' not in cert_data or 'nodes' not in cert_data['data']:
+            if inventory is None:
                 logger.error("获取证书列表失败：数据格式错误")
                 return None
                 
-            # 查找指定ID的证书
-            for node in cert_data['data']['nodes']:
-                if node['id'] == cert_id:
-                    # 提取域名信息
-                    domains = node.get('domains', [])
-                    domain_key = None
-                    for domain in domains:
-                        if domain.startswith('*.'):
-                            domain_key = domain.split('.')[1]
-                            break
-                        else:
-                            domain_key = domain.split('.')[0]
-                            break
-                    
-                    if not domain_key:
-                        logger.error(f"无法从域名列表 {domains} 中提取domain_key")
-                        return None
-                        
-                    return {
-                        'domain_key': domain_key,
-                        'id': node['id'],
-                        'type': node['type'],
-                        'domains': domains,
-                        'issuer': node.get('issuer', '未知'),
-                        'valid_before': node.get('valid_before', ''),
-                        'trusted': node.get('trusted', False),
-                        'revoked': node.get('revoked', False),
-                        'expired': node.get('expired', False),
-                        'related_sites': node.get('related_sites', [])
-                    }
-            
-            logger.error(f"未找到ID为 {cert_id} 的证书")
-            return None
+            node = inventory.by_id.get(cert_id)
+            if node is None:
+                logger.error(f"未找到ID为 {cert_id} 的证书")
+                return None
+            if not node.domains:
+                logger.error(f"无法从域名列表 {list(node.domains)} 中提取domain_key")
+                return None
+            return inventory.group_for_node(node)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"获取证书信息失败: {str(e)}")
             return None
 
-    def find_cert_files(self, domain_info: Dict) -> Optional[Tuple[str, str]]:
-        """查找证书文件，使用域名组中的所有域名进行查找"""
-        domain_key = domain_info['domain_key']
-        domains = domain_info['domains']  # 获取域名组中的所有域名
-        
-        # 构建所有可能的文件名模式
-        possible_names = []
-        # 首先添加domain_key相关的模式
-        possible_names.extend([
-            f"{domain_key}.crt",
-            f"{domain_key}.key",
-            f"_.{domain_key}.crt",
-            f"_.{domain_key}.key"
-        ])
-        
-        # 然后为每个域名添加对应的模式
-        for domain in domains:
-            possible_names.extend([
-                f"{domain}.crt",
-                f"{domain}.key",
-                f"_.{domain}.crt",
-                f"_.{domain}.key"
-            ])
-        
-        logger.debug(f"文件名模式列表: {possible_names}")
+    @staticmethod
+    def cert_file_stems(group: DomainGroup) -> List[str]:
+        """域名组对应的证书文件名（不含扩展名），按查找优先级排列"""
+        stems = []
+        # 首先是domain_key相关的模式，然后为每个域名添加对应的模式
+        for name in (group.domain_key,) + group.domains:
+            for stem in (name, f"_.{name}"):
+                if stem not in stems:
+                    stems.append(stem)
+        return stems
 
-        # 在基础目录及其子目录中查找文件
-        cert_content = None
-        key_content = None
+    def clear_file_index(self) -> None:
+        """丢弃目录索引，下次查找时重新遍历"""
+        self._file_index.clear()
 
-        # 首先在基础目录中查找
-        for name in possible_names:
-            cert_path = BASE_PATH / name.replace('.crt', '.crt')
-            key_path = BASE_PATH / name.replace('.crt', '.key')
-            
-            if cert_path.exists() and key_path.exists():
-                logger.info(f"在基础目录中找到证书文件: {cert_path} 和 {key_path}")
-                try:
-                    cert_content = cert_path.read_text(encoding='utf-8').strip()
-                    key_content = key_path.read_text(encoding='utf-8').strip()
-                    return cert_content, key_content
-                except Exception as e:
-                    logger.error(f"读取证书文件失败: {str(e)}")
-                    continue
+    def index_cert_files(self, roots: List[Path]) -> Dict[str, List[Tuple[int, Path, Path]]]:
+        """遍历一次目录，建立 文件名 -> [(目录顺序, 证书路径, 私钥路径)] 索引
 
-        # 在子目录中查找
-        for root, _, _ in os.walk(BASE_PATH):
-            for name in possible_names:
-                cert_path = Path(root) / name.replace('.crt', '.crt')
-                key_path = Path(root) / name.replace('.crt', '.key')
-                
+        roots中可以是目录，也可以是单个证书/私钥文件；同一批roots的索引只建立一次。
+        """
+        cache_key = tuple(str(root) for root in roots)
+        if cache_key in self._file_index:
+            return self._file_index[cache_key]
+
+        index: Dict[str, List[Tuple[int, Path, Path]]] = {}
+        order = 0
+        for root in roots:
+            root = Path(root)
+            if root.is_file():
+                cert_path = root.with_suffix('.crt')
+                key_path = root.with_suffix('.key')
                 if cert_path.exists() and key_path.exists():
-                    logger.info(f"在子目录 {root} 中找到证书文件: {cert_path} 和 {key_path}")
-                    try:
-                        cert_content = cert_path.read_text(encoding='utf-8').strip()
-                        key_content = key_path.read_text(encoding='utf-8').strip()
-                        return cert_content, key_content
-                    except Exception as e:
-                        logger.error(f"读取证书文件失败: {str(e)}")
+                    index.setdefault(cert_path.stem, []).append((order, cert_path, key_path))
+                order += 1
+                continue
+            # os.walk自顶向下遍历，基础目录优先于子目录
+            for dir_path, _, file_names in os.walk(root):
+                names = set(file_names)
+                for file_name in file_names:
+                    if not file_name.endswith('.crt'):
                         continue
+                    stem = file_name[:-len('.crt')]
+                    if f"{stem}.key" in names:
+                        index.setdefault(stem, []).append(
+                            (order, Path(dir_path) / file_name, Path(dir_path) / f"{stem}.key")
+                        )
+                order += 1
+
+        self._file_index[cache_key] = index
+        return index
+
+    def match_target(self, inventory: CertInventory, group: DomainGroup, target: Dict) -> bool:
+        """判断域名组是否属于本次定向同步的范围"""
+        if group.node.id in target.get('cert_ids', []):
+            return True
+        for requested in target.get('domains', []):
+            covering = inventory.covering_domains(requested)
+            if covering and any(domain.lower() in covering for domain in group.domains):
+                return True
+        if target.get('paths'):
+            index = self.index_cert_files([Path(path) for path in target['paths']])
+            if any(stem in index for stem in self.cert_file_stems(group)):
+                return True
+        return False
+
+    @staticmethod
+    def read_cert_pair(cert_path: Path, key_path: Path) -> Optional[Tuple[str, str]]:
+        """读取证书和私钥内容，失败时返回None"""
+        logger.info(f"找到证书文件: {cert_path} 和 {key_path}")
+        try:
+            cert_content = cert_path.read_text(encoding='utf-8').strip()
+            key_content = key_path.read_text(encoding='utf-8').strip()
+            return cert_content, key_content
+        except Exception as e:
+            logger.error(f"读取证书文件失败: {str(e)}")
+            return None
+
+    def find_cert_files(self, group: DomainGroup, search_paths: Optional[List[str]] = None,
+                        targeted: bool = False) -> Optional[Tuple[str, str]]:
+        """查找证书文件，使用域名组中的所有域名进行查找
+
+        Args:
+            group: 域名组
+            search_paths: 限定查找的目录或文件，为空时在基础目录及其子目录中查找
+            targeted: 定向同步只处理少数域名组，先直接检查基础目录下的文件，找不到再遍历子目录
+        """
+        domain_key = group.domain_key
+        domains = group.domains  # 获取域名组中的所有域名
+        stems = self.cert_file_stems(group)
+        logger.debug(f"文件名模式列表: {stems}")
+
+        if targeted and not search_paths:
+            # 基础目录在遍历顺序中最优先，这里命中的结果与遍历一致
+            for stem in stems:
+                cert_path = BASE_PATH / f"{stem}.crt"
+                key_path = BASE_PATH / f"{stem}.key"
+                if cert_path.exists() and key_path.exists():
+                    cert_files = self.read_cert_pair(cert_path, key_path)
+                    if cert_files:
+                        return cert_files
+
+        roots = [Path(path) for path in search_paths] if search_paths else [BASE_PATH]
+        index = self.index_cert_files(roots)
+        # 目录顺序优先，同一目录内按文件名模式顺序
+        candidates = sorted(
+            (order, stem_order, cert_path, key_path)
+            for stem_order, stem in enumerate(stems)
+            for order, cert_path, key_path in index.get(stem, [])
+        )
+
+        for _, _, cert_path, key_path in candidates:
+            cert_files = self.read_cert_pair(cert_path, key_path)
+            if cert_files:
+                return cert_files
+
+        if search_paths:
+            # 指定了路径时只在这些位置查找，不再遍历整个基础目录
+            logger.warning(f"指定路径 {', '.join(search_paths)} 中未找到域名组 {domain_key} 的证书文件")
+            return None
 
         logger.warning(f"未找到域名组 {domain_key} (包含域名: {', '.join(domains)}) 的证书文件")
         return None
 
-    def build_message(self, domain_info: Dict, success: bool, error_msg: str = None, format_type: str = 'HTTP') -> Dict:
+    def verify_targets(self, group: DomainGroup) -> List[Tuple[str, int, str]]:
+        """收集证书关联的所有 主机/SNI，通配符域名无法直接握手，跳过"""
+        hosts: List[Tuple[str, int]] = []
+        for domain in group.node.domains:
+            if not domain.startswith('*.'):
+                hosts.append((domain, VERIFY_PORT))
+        for site in group.node.related_sites:
+            site = site.strip()
+            if '://' in site:
+                site = urllib.parse.urlsplit(site).netloc
+            match = HOST_RE.match(site)
+            if not match or '.' not in site:
+                logger.debug(f"无法从站点 {site} 中解析主机名，跳过验证")
+                continue
+            host = match.group('ipv6') or match.group('host')
+            port = int(match.group('port')) if match.group('port') else VERIFY_PORT
+            hosts.append((host, port))
+
+        targets = []
+        for host, port in hosts:
+            target = (VERIFY_CONNECT_HOST or host, port, host)
+            if target not in targets:
+                targets.append(target)
+        return targets
+
+    def verify_deployment(self, cert_content: str, group: DomainGroup) -> List[Dict]:
+        """验证关联站点实际下发的是否为刚上传的证书，返回每个目标的验证结果"""
+        expected = cert_fingerprint(cert_content)
+        targets = self.verify_targets(group)
+        if not expected or not targets:
+            return []
+
+        results: Dict[Tuple[str, int], Dict] = {}
+        pending = targets
+        for attempt in range(VERIFY_RETRIES):
+            if attempt:
+                # 雷池加载新证书需要一点时间，只重试未通过的目标
+                time.sleep(VERIFY_DELAY)
+            for result in verify_tls_targets(expected, pending):
+                results[(result['host'], result['port'])] = result
+            pending = [t for t in pending if not results[(t[2], t[1])]['ok']]
+            if not pending:
+                break
+
+        ordered = [results[(t[2], t[1])] for t in targets]
+        passed = sum(1 for result in ordered if result['ok'])
+        logger.info(f"部署验证完成: {passed}/{len(ordered)} 通过")
+        for result in ordered:
+            if not result['ok']:
+                logger.warning(f"部署验证失败: {result['host']}:{result['port']} - {result['error']}")
+        return ordered
+
+    def build_message(self, group: DomainGroup, success: bool, error_msg: str = None, format_type: str = 'HTTP',
+                      verify_results: Optional[List[Dict]] = None, show_cert_info: bool = False) -> Dict:
         """构建消息内容
         
         Args:
-            domain_info: 域名信息
+            group: 域名组
             success: 是否成功
             error_msg: 错误信息
             format_type: 消息格式类型 ('HTTP', 'wecom', 'serverj', 'dingding', 'feishu', 'wecom_app')
+            verify_results: 部署验证结果
+            show_cert_info: 是否展示证书详情（颁发机构、有效期、状态等）
         """
         # 获取当前时间
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -275,27 +581,25 @@ class CertManager:
         # 添加域名信息
         details.append("━━━━━━━━━━━━━━")
         details.append("🌐 域名信息：")
-        details.append(f"📌 域名组：{domain_info['domain_key']}")
+        details.append(f"📌 域名组：{group.domain_key}")
         details.append("🔗 包含域名：")
-        for domain in domain_info['domains']:
+        for domain in group.domains:
             details.append(f"  • {domain}")
         
-        # 检查是否有完整的证书信息
-        has_full_info = all(key in domain_info for key in ['issuer', 'valid_before', 'trusted', 'revoked', 'expired'])
-        
-        if has_full_info:
+        node = group.node
+        if show_cert_info:
             # 添加证书信息
             details.append("━━━━━━━━━━━━━━")
             details.append("📜 证书信息：")
-            details.append(f"🆔 证书ID：{domain_info['id']}")
-            details.append(f"📝 证书类型：{domain_info['type']}")
-            details.append(f"🏢 颁发机构：{domain_info['issuer']}")
+            details.append(f"🆔 证书ID：{node.id}")
+            details.append(f"📝 证书类型：{node.type}")
+            details.append(f"🏢 颁发机构：{node.issuer}")
             
             # 添加证书有效期
-            if domain_info['valid_before']:
+            if node.valid_before:
                 try:
                     # 处理日期字符串，移除时区信息
-                    date_str = domain_info['valid_before']
+                    date_str = node.valid_before
                     # 移除时区信息（+08:00 或 Z）
                     if '+' in date_str:
                         date_str = date_str.split('+')[0]
@@ -323,20 +627,31 @@ class CertManager:
             details.append("━━━━━━━━━━━━━━")
             details.append("🔍 证书状态：")
             status_items = [
-                ("✅" if domain_info['trusted'] else "❌", "受信任"),
-                ("✅" if not domain_info['revoked'] else "❌", "未撤销"),
-                ("✅" if not domain_info['expired'] else "❌", "未过期")
+                ("✅" if node.trusted else "❌", "受信任"),
+                ("✅" if not node.revoked else "❌", "未撤销"),
+                ("✅" if not node.expired else "❌", "未过期")
             ]
             for emoji, status in status_items:
                 details.append(f"{emoji} {status}")
             
             # 添加相关站点信息
-            if domain_info.get('related_sites'):
+            if node.related_sites:
                 details.append("━━━━━━━━━━━━━━")
                 details.append("🖥️ 使用应用：")
-                for site in domain_info['related_sites']:
+                for site in node.related_sites:
                     details.append(f"  • {site}")
         
+        # 添加部署验证结果
+        if verify_results:
+            passed = sum(1 for result in verify_results if result['ok'])
+            details.append("━━━━━━━━━━━━━━")
+            details.append(f"🔎 部署验证：{passed}/{len(verify_results)} 通过")
+            for result in verify_results:
+                if result['ok']:
+                    details.append(f"✅ {result['host']}:{result['port']}")
+                else:
+                    details.append(f"❌ {result['host']}:{result['port']} ({result['error']})")
+        
         # 如果有错误信息，添加错误详情
         if not success and error_msg:
             details.append("━━━━━━━━━━━━━━")
@@ -590,8 +905,10 @@ class CertManager:
             logger.error(f"企业微信应用消息推送请求失败: {str(e)}")
             return False
 
-    def update_cert(self, cert_content: str, key_content: str, cert_id: int, cert_type: int, domain_info: Dict) -> bool:
+    def update_cert(self, cert_content: str, key_content: str, group: DomainGroup) -> bool:
         """更新证书并发送通知"""
+        cert_id = group.node.id
+        cert_type = group.node.type
         payload = {
             "manual": {
                 "crt": cert_content,
@@ -618,31 +935,35 @@ class CertManager:
                 if success:
                     # 证书更新成功，获取最新的证书信息
                     updated_cert_info = self.get_cert_info(cert_id)
+                    # 验证关联站点是否已下发新证书
+                    verify_results = None
+                    if VERIFY_ENABLED:
+                        verify_results = self.verify_deployment(cert_content, updated_cert_info or group)
                     if updated_cert_info:
                         # 使用最新的证书信息构建通知
-                        message = self.build_message(updated_cert_info, True)
-                        wecom_message = self.build_message(updated_cert_info, True, format_type='wecom')
-                        serverj_message = self.build_message(updated_cert_info, True, format_type='serverj')
-                        dingding_message = self.build_message(updated_cert_info, True, format_type='dingding')
-                        feishu_message = self.build_message(updated_cert_info, True, format_type='feishu')
-                        wecom_app_message = self.build_message(updated_cert_info, True, format_type='wecom_app')
+                        message = self.build_message(updated_cert_info, True, verify_results=verify_results, show_cert_info=True)
+                        wecom_message = self.build_message(updated_cert_info, True, format_type='wecom', verify_results=verify_results, show_cert_info=True)
+                        serverj_message = self.build_message(updated_cert_info, True, format_type='serverj', verify_results=verify_results, show_cert_info=True)
+                        dingding_message = self.build_message(updated_cert_info, True, format_type='dingding', verify_results=verify_results, show_cert_info=True)
+                        feishu_message = self.build_message(updated_cert_info, True, format_type='feishu', verify_results=verify_results, show_cert_info=True)
+                        wecom_app_message = self.build_message(updated_cert_info, True, format_type='wecom_app', verify_results=verify_results, show_cert_info=True)
                     else:
                         # 如果获取最新信息失败，使用原始信息
                         logger.warning("获取更新后的证书信息失败，使用原始信息发送通知")
-                        message = self.build_message(domain_info, True)
-                        wecom_message = self.build_message(domain_info, True, format_type='wecom')
-                        serverj_message = self.build_message(domain_info, True, format_type='serverj')
-                        dingding_message = self.build_message(domain_info, True, format_type='dingding')
-                        feishu_message = self.build_message(domain_info, True, format_type='feishu')
-                        wecom_app_message = self.build_message(domain_info, True, format_type='wecom_app')
+                        message = self.build_message(group, True, verify_results=verify_results)
+                        wecom_message = self.build_message(group, True, format_type='wecom', verify_results=verify_results)
+                        serverj_message = self.build_message(group, True, format_type='serverj', verify_results=verify_results)
+                        dingding_message = self.build_message(group, True, format_type='dingding', verify_results=verify_results)
+                        feishu_message = self.build_message(group, True, format_type='feishu', verify_results=verify_results)
+                        wecom_app_message = self.build_message(group, True, format_type='wecom_app', verify_results=verify_results)
                 else:
                     # 更新失败，使用原始信息发送通知
-                    message = self.build_message(domain_info, False, error_msg)
-                    wecom_message = self.build_message(domain_info, False, error_msg, format_type='wecom')
-                    serverj_message = self.build_message(domain_info, False, error_msg, format_type='serverj')
-                    dingding_message = self.build_message(domain_info, False, error_msg, format_type='dingding')
-                    feishu_message = self.build_message(domain_info, False, error_msg, format_type='feishu')
-                    wecom_app_message = self.build_message(domain_info, False, error_msg, format_type='wecom_app')
+                    message = self.build_message(group, False, error_msg)
+                    wecom_message = self.build_message(group, False, error_msg, format_type='wecom')
+                    serverj_message = self.build_message(group, False, error_msg, format_type='serverj')
+                    dingding_message = self.build_message(group, False, error_msg, format_type='dingding')
+                    feishu_message = self.build_message(group, False, error_msg, format_type='feishu')
+                    wecom_app_message = self.build_message(group, False, error_msg, format_type='wecom_app')
                 
                 # 发送通知
                 self.send_http_notification(message)
@@ -666,12 +987,12 @@ class CertManager:
                 else:
                     error_msg = f"更新证书请求失败 (已重试 {MAX_RETRIES} 次): {str(e)}"
                     # 构建并发送失败通知
-                    message = self.build_message(domain_info, False, error_msg)
-                    wecom_message = self.build_message(domain_info, False, error_msg, format_type='wecom')
-                    serverj_message = self.build_message(domain_info, False, error_msg, format_type='serverj')
-                    dingding_message = self.build_message(domain_info, False, error_msg, format_type='dingding')
-                    feishu_message = self.build_message(domain_info, False, error_msg, format_type='feishu')
-                    wecom_app_message = self.build_message(domain_info, False, error_msg, format_type='wecom_app')
+                    message = self.build_message(group, False, error_msg)
+                    wecom_message = self.build_message(group, False, error_msg, format_type='wecom')
+                    serverj_message = self.build_message(group, False, error_msg, format_type='serverj')
+                    dingding_message = self.build_message(group, False, error_msg, format_type='dingding')
+                    feishu_message = self.build_message(group, False, error_msg, format_type='feishu')
+                    wecom_app_message = self.build_message(group, False, error_msg, format_type='wecom_app')
                     self.send_http_notification(message)
                     self.send_wecom_notification(wecom_message)
                     self.send_serverj_notification(serverj_message)
@@ -682,38 +1003,94 @@ class CertManager:
                     logger.error(error_msg)
                     return False
 
+def sync_certs(cert_manager: CertManager, targets: Optional[List[Dict]] = None) -> None:
+    """执行一次证书同步
+
+    Args:
+        cert_manager: 证书管理器
+        targets: 定向同步范围列表，每项可包含domains、cert_ids、paths；为None表示全量同步
+    """
+    # 合并执行的后续批次要能看到同步期间新写入的证书文件，每次同步重新遍历目录
+    cert_manager.clear_file_index()
+
+    # 获取证书列表
+    cert_data = cert_manager.get_cert_list()
+    if not cert_data:
+        logger.error("无法获取证书列表，程序退出")
+        return
+
+    # 提取域名信息
+    inventory = cert_manager.extract_domain_info(cert_data)
+    if not inventory or not inventory.groups:
+        logger.warning("未找到有效的域名信息")
+        return
+
+    # 处理每个域名
+    for group in inventory.groups:
+        search_paths = None
+        if targets is not None:
+            matched = [target for target in targets if cert_manager.match_target(inventory, group, target)]
+            if not matched:
+                continue
+            # 任意一次触发未指定路径时，需要在基础目录中查找
+            if all(target.get('paths') for target in matched):
+                search_paths = [path for target in matched for path in target['paths']]
+
+        # 查找证书文件
+        cert_files = cert_manager.find_cert_files(group, search_paths, targeted=targets is not None)
+        if not cert_files:
+            continue
+
+        cert_content, key_content = cert_files
+        # 更新证书并发送通知
+        cert_manager.update_cert(cert_content, key_content, group)
+
+def parse_args(argv: Optional[List[str]] = None) -> Optional[Dict]:
+    """解析命令行参数，返回定向同步范围，未指定任何范围时返回None（全量同步）"""
+    parser = argparse.ArgumentParser(description="将Lucky证书同步到雷池")
+    parser.add_argument('--domain', action='append', default=[], help="只同步覆盖该域名的证书，可重复指定")
+    parser.add_argument('--cert-id', action='append', type=int, default=[], help="只同步指定ID的雷池证书，可重复指定")
+    parser.add_argument('--path', action='append', default=[], help="证书文件或所在目录，只在这些位置查找证书，可重复指定")
+    args = parser.parse_args(argv)
+
+    target = {}
+    if args.domain:
+        target['domains'] = args.domain
+    if args.cert_id:
+        target['cert_ids'] = args.cert_id
+    if args.path:
+        target['paths'] = [str(Path(path).resolve()) for path in args.path]
+    return target or None
+
 def main():
+    target = parse_args()
     try:
         cert_manager = CertManager()
-        
-        # 获取证书列表
-        cert_data = cert_manager.get_cert_list()
-        if not cert_data:
-            logger.error("无法获取证书列表，程序退出")
-            return
+        coordinator = SyncCoordinator()
 
-        # 提取域名信息
-        domain_info_list = cert_manager.extract_domain_info(cert_data)
-        if not domain_info_list:
-            logger.warning("未找到有效的域名信息")
+        if not coordinator.enabled:
+            sync_certs(cert_manager, [target] if target else None)
             return
 
-        # 处理每个域名
-        for domain_info in domain_info_list:
-            # 查找证书文件
-            cert_files = cert_manager.find_cert_files(domain_info)
-            if not cert_files:
-                continue
+        # 先登记触发再争抢运行锁，抢不到说明已有进程在运行，它会处理本次触发
+        coordinator.submit(target)
+        if not coordinator.try_acquire():
+            logger.info("已有同步任务在运行，本次触发已合并到该任务中，直接退出")
+            return
 
-            cert_content, key_content = cert_files
-            # 更新证书并发送通知
-            cert_manager.update_cert(
-                cert_content,
-                key_content,
-                domain_info['id'],
-                domain_info['type'],
-                domain_info  # 传递完整的domain_info用于消息构建
-            )
+        try:
+            # 等待合并窗口，收集同一批续签产生的其它触发
+            logger.info(f"等待 {coordinator.window} 秒合并并发触发")
+            time.sleep(coordinator.window)
+            while True:
+                targets = coordinator.drain()
+                if targets:
+                    logger.info(f"合并 {len(targets)} 次触发执行同步")
+                    sync_certs(cert_manager, merge_targets(targets))
+                if coordinator.release_if_idle():
+                    break
+        finally:
+            coordinator.release()
 
     except Exception as e:
         logger.error(f"程序执行出错: {str(e)}")
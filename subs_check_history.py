@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# subs-check 历史测速统计脚本
+# 流式读取当前日志、轮转日志和.gz压缩日志（不解压到磁盘），单次扫描提取每次测速的统计，
+# 追加到SQLite中，用于查看节点数量、去重率、成功数量和流量随时间的变化趋势。
+# 每个日志文件按 inode + 字节偏移 记录读取进度，重复执行只读取新增内容。
+
+import argparse
+import glob
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from subs_check_stats import METRICS
+
+# 一次测速的统计项：在日志统计的基础上增加成功节点数量
+RUN_METRICS = dict(METRICS)
+RUN_METRICS['SUCCESS'] = re.compile(r'(?:成功|可用)节点数量:[ \t]*(\d+)'.encode('utf-8'))
+RUN_START = 'NODES_TOTAL'  # 每次测速以"获取节点数量"开始
+
+TIMESTAMP_RE = re.compile(rb'(\d{4}[-/]\d{2}[-/]\d{2}[ T]\d{2}:\d{2}:\d{2})')
+FINGERPRINT_SIZE = 1024  # 用文件开头的内容识别同一份日志（轮转改名、压缩后依然相同）
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    fingerprint TEXT PRIMARY KEY,
+    fp_len INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_inode ON files (inode);
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    ts TEXT,
+    nodes_total INTEGER,
+    nodes_dedup INTEGER,
+    success INTEGER,
+    traffic_gb REAL,
+    dedup_ratio REAL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs (ts);
+'''
+
+
+def open_log(path: str):
+    """以二进制流打开日志，.gz文件边读边解压"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def fingerprint(path: str, length: int = FINGERPRINT_SIZE) -> Tuple[str, int]:
+    with open_log(path) as f:
+        head = f.read(length)
+    return hashlib.sha1(head).hexdigest(), len(head)
+
+
+def discover_logs(log_path: str) -> List[str]:
+    """当前日志及其轮转文件（log.1、log.2.gz、log-20250101.gz 等），按修改时间从旧到新排列"""
+    paths = {path for path in glob.glob(glob.escape(log_path) + '*')
+             if os.path.isfile(path) and not path.endswith(('.checkpoint', '.tmp', '.db'))}
+    return sorted(paths, key=lambda path: os.stat(path).st_mtime)
+
+
+def iter_runs(f, start: int, final: bool) -> Iterator[Tuple[int, Optional[Dict[str, object]], int]]:
+    """从start开始流式扫描，返回 (测速开始偏移, 统计记录, 已处理到的偏移)
+
+    统计记录在下一次测速开始时结束；扫描到文件末尾时，未结束的记录只有在final为True
+    （已轮转、不会再追加的文件）时才返回，否则留给下次从其开始偏移重新读取。
+    最后一次返回的记录为None，其偏移即下次应从哪里继续读取。
+    """
+    pos = start
+    run_start = None
+    record: Dict[str, object] = {}
+    for line in f:
+        if not line.endswith(b'\n') and not final:
+            # 正在写入的行，下次再读
+            break
+        line_start = pos
+        pos += len(line)
+        for name, pattern in RUN_METRICS.items():
+            match = pattern.search(line)
+            if not match:
+                continue
+            if name == RUN_START:
+                if record:
+                    yield run_start, record, line_start
+                run_start = line_start
+                # 开始行（含时间戳）与偏移一起标识一次测速，轮转、压缩后的同一份日志得到相同标识
+                record = {'key': hashlib.sha1(line).hexdigest()[:16]}
+                ts = TIMESTAMP_RE.search(line)
+                if ts:
+                    record['ts'] = ts.group(1).decode('ascii').replace('/', '-').replace('T', ' ')
+            elif run_start is None:
+                # 文件开头残缺的一次测速，没有开始行，忽略
+                break
+            record[name] = match.group(1).decode('ascii')
+            break
+
+    # "测试总消耗流量"是一次测速最后输出的统计，出现后即可认为记录完整
+    if record and (final or 'TOTAL_GB' in record):
+        yield run_start, record, pos
+        yield pos, None, pos
+    elif record:
+        yield run_start, None, run_start
+    else:
+        yield pos, None, pos
+
+
+def to_row(run_id: str, record: Dict[str, object], source: str) -> Tuple:
+    nodes_total = int(record['NODES_TOTAL']) if 'NODES_TOTAL' in record else None
+    nodes_dedup = int(record['NODES_DEDUP']) if 'NODES_DEDUP' in record else None
+    ratio = None
+    if nodes_total and nodes_dedup is not None:
+        ratio = round(nodes_dedup / nodes_total, 4)
+    return (
+        run_id,
+        record.get('ts'),
+        nodes_total,
+        nodes_dedup,
+        int(record['SUCCESS']) if 'SUCCESS' in record else None,
+        float(record['TOTAL_GB']) if 'TOTAL_GB' in record else None,
+        ratio,
+        source,
+    )
+
+
+def ingest_file(db: sqlite3.Connection, path: str, final: bool) -> int:
+    """增量读取一个日志文件，返回新增的测速记录数"""
+    st = os.stat(path)
+    fp, fp_len = fingerprint(path)
+
+    start = 0
+    known = db.execute('SELECT fingerprint, fp_len, offset FROM files WHERE inode = ?', (st.st_ino,)).fetchall()
+    known += db.execute('SELECT fingerprint, fp_len, offset FROM files WHERE fingerprint = ?', (fp,)).fetchall()
+    for known_fp, known_len, offset in known:
+        # 文件开头一致才认为是同一份日志（排除inode复用和截断重写）；文件较短时开头可能还在增长
+        if known_len <= fp_len and fingerprint_prefix(path, known_len) == known_fp:
+            start = offset
+            db.execute('DELETE FROM files WHERE fingerprint = ?', (known_fp,))
+            break
+
+    added = 0
+    with open_log(path) as f:
+        if start:
+            f.seek(start)
+        next_offset = start
+        for run_start, record, offset in iter_runs(f, start, final):
+            next_offset = offset
+            if record is None:
+                continue
+            run_id = f"{record['key']}:{run_start}"
+            cur = db.execute('INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', to_row(run_id, record, path))
+            added += cur.rowcount
+
+    db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)', (fp, fp_len, st.st_ino, next_offset, path))
+    return added
+
+
+def fingerprint_prefix(path: str, length: int) -> str:
+    with open_log(path) as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def ingest(log_path: str, db_path: str) -> int:
+    db = sqlite3.connect(db_path)
+    try:
+        db.executescript(SCHEMA)
+        total = 0
+        for path in discover_logs(log_path):
+            # 只有当前日志还会继续追加，轮转出来的文件视为已完结
+            final = os.path.abspath(path) != os.path.abspath(log_path)
+            try:
+                added = ingest_file(db, path, final)
+            except (OSError, EOFError) as e:
+                print(f"读取 {path} 失败: {e}", file=sys.stderr)
+                continue
+            db.commit()
+            total += added
+            print(f"{path}: 新增 {added} 条测速记录")
+        return total
+    finally:
+        db.close()
+
+
+def report(db_path: str, period: str) -> None:
+    formats = {'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m'}
+    db = sqlite3.connect(db_path)
+    try:
+        rows = db.execute(f'''
+            SELECT strftime('{formats[period]}', ts) AS bucket,
+                   COUNT(*), AVG(nodes_total), AVG(nodes_dedup), AVG(dedup_ratio), AVG(success), SUM(traffic_gb)
+            FROM runs WHERE ts IS NOT NULL
+            GROUP BY bucket ORDER BY bucket
+        ''').fetchall()
+    finally:
+        db.close()
+
+    header = ('时间', '测速次数', '平均获取节点', '平均去重后', '平均去重率', '平均成功节点', '总流量GB')
+    print('\t'.join(header))
+    for bucket, runs, total, dedup, ratio, success, traffic in rows:
+        print('\t'.join([
+            bucket, str(runs),
+            f"{total:.0f}" if total is not None else '-',
+            f"{dedup:.0f}" if dedup is not None else '-',
+            f"{ratio:.2%}" if ratio is not None else '-',
+            f"{success:.0f}" if success is not None else '-',
+            f"{traffic:.2f}" if traffic is not None else '-',
+        ]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='subs-check历史测速统计')
+    parser.add_argument('--log', default=os.getenv('LOG_FILE', '/tmp/subs-check.log'), help='当前subs-check日志文件，轮转文件自动查找')
+    parser.add_argument('--db', default=os.getenv('HISTORY_DB', '/app/config/subs-check-history.db'), help='SQLite统计库')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('ingest', help='增量导入日志中的测速记录（默认）')
+    report_parser = sub.add_parser('report', help='按时间汇总趋势')
+    report_parser.add_argument('--by', choices=('day', 'week', 'month'), default='week')
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        report(args.db, args.by)
+    else:
+        ingest(args.log, args.db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# subs-check 日志统计提取脚本
+# 供 webhook_notify_docker.sh 调用，也可被其它脚本导入复用
+# 从日志末尾按块反向读取，一次扫描同时找出三项统计的最近一次取值，
+# 并保存字节偏移检查点，下次只读取新增的日志内容。
+
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+BLOCK_SIZE = 64 * 1024  # 反向读取的块大小（字节）
+
+# 统计项：输出变量名 -> 日志中的匹配规则
+METRICS = {
+    'NODES_TOTAL': re.compile(r'获取节点数量:[ \t]*(\d+)'.encode('utf-8')),
+    'NODES_DEDUP': re.compile(r'去重后节点数量:[ \t]*(\d+)'.encode('utf-8')),
+    'TOTAL_GB': re.compile(r'测试总消耗流量:[ \t]*([0-9]+(?:\.[0-9]+)?)[ \t]*GB'.encode('utf-8')),
+}
+
+# 订阅链接列表在config.yaml中的顶层key
+SUBS_KEYS = ('sub-urls', 'sub-urls-remote')
+
+
+def iter_lines_reverse(f, start: int, end: int, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """从end向start按块反向读取，逐行（从后往前）返回，不含换行符"""
+    pos = end
+    tail = b''
+    while pos > start:
+        size = min(block_size, pos - start)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size) + tail
+        lines = chunk.split(b'\n')
+        # 块首的行可能不完整，留到下一块拼接
+        tail = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+    if tail:
+        yield tail
+
+
+def scan_metrics(f, start: int, end: int, wanted=None) -> Dict[str, str]:
+    """反向扫描[start, end)区间，返回每项统计最后一次出现的取值，全部找到即停止"""
+    wanted = set(wanted or METRICS)
+    found = {}
+    for line in iter_lines_reverse(f, start, end):
+        for name in list(wanted):
+            match = METRICS[name].search(line)
+            if match:
+                found[name] = match.group(1).decode('ascii')
+                wanted.discard(name)
+        if not wanted:
+            break
+    return found
+
+
+def load_checkpoint(state_path: Optional[str]) -> Dict:
+    if not state_path or not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(state_path: Optional[str], state: Dict) -> None:
+    if not state_path:
+        return
+    tmp_path = state_path + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+    except OSError as e:
+        print(f"保存检查点失败: {e}", file=sys.stderr)
+
+
+def extract_log_stats(log_path: str, state_path: Optional[str] = None) -> Dict[str, str]:
+    """提取日志中三项统计的最近一次取值
+
+    检查点记录日志的inode、已读取的字节偏移和当时的统计值。
+    日志未被轮转或截断时，只反向扫描偏移之后的新内容，新内容中没有出现的统计沿用检查点中的值。
+    """
+    try:
+        st = os.stat(log_path)
+    except OSError:
+        return {}
+
+    state = load_checkpoint(state_path)
+    start = 0
+    previous: Dict[str, str] = {}
+    if state.get('inode') == st.st_ino and 0 <= state.get('offset', -1) <= st.st_size:
+        start = state['offset']
+        previous = state.get('values', {})
+
+    with open(log_path, 'rb') as f:
+        values = scan_metrics(f, start, st.st_size)
+        for name, value in previous.items():
+            values.setdefault(name, value)
+
+        # 检查点只推进到最后一个完整行，避免把正在写入的行截成两半
+        offset = st.st_size
+        if offset > start:
+            f.seek(max(start, offset - BLOCK_SIZE))
+            block = f.read(offset - max(start, offset - BLOCK_SIZE))
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                offset = offset - len(block) + newline + 1
+            elif offset - start <= BLOCK_SIZE:
+                offset = start
+
+    save_checkpoint(state_path, {'inode': st.st_ino, 'offset': offset, 'values': values})
+    return values
+
+
+def count_subscriptions(config_path: str, keys: Tuple[str, ...] = SUBS_KEYS) -> Dict[str, int]:
+    """一次遍历config.yaml，统计各顶层key下的列表项数量（忽略注释与空行）"""
+    counts = {key: 0 for key in keys}
+    headers = {key: re.compile(r'^' + re.escape(key) + r':[ \t]*$') for key in keys}
+    current = None
+    try:
+        with open(config_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.rstrip('\r\n')
+                header = next((key for key, pattern in headers.items() if pattern.match(line)), None)
+                if header:
+                    current = header
+                    continue
+                if current is None:
+                    continue
+                if re.match(r'^[ \t]*#', line):
+                    continue
+                if re.match(r'^[ \t]*-', line):
+                    counts[current] += 1
+                    continue
+                if re.match(r'^[^ \t]', line):
+                    current = None
+    except OSError:
+        pass
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='提取subs-check日志统计，输出可被shell eval的变量')
+    parser.add_argument('--log', default=os.getenv('LOG_FILE', '/tmp/subs-check.log'), help='subs-check日志文件')
+    parser.add_argument('--config', default='/app/config/config.yaml', help='subs-check配置文件')
+    parser.add_argument('--state', default=None, help='检查点文件，默认为 日志文件.checkpoint')
+    args = parser.parse_args()
+
+    state_path = args.state or args.log + '.checkpoint'
+    values = extract_log_stats(args.log, state_path)
+    for name in METRICS:
+        print(f"LOG_{name}={values.get(name, '')}")
+
+    if os.path.exists(args.config):
+        print(f"CONFIG_SUBS_COUNT={sum(count_subscriptions(args.config).values())}")
+    else:
+        print("CONFIG_SUBS_COUNT=")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""离线安装包的依赖：解析 Depends 字段，以及用本地构建的 .deb 模拟安装检查缺少的依赖"""
+
+import importlib.util
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'Docker-all-install.py'
+spec = importlib.util.spec_from_file_location('docker_all_install', str(SCRIPT))
+docker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(docker)
+
+
+def build_deb(directory, name, depends=None):
+    """用 dpkg-deb 构建只有控制信息的软件包，返回相对 directory 的文件名"""
+    control = Path(directory) / name / 'DEBIAN'
+    control.mkdir(parents=True)
+    fields = [f'Package: {name}', 'Version: 1.0', 'Architecture: all', 'Maintainer: test <test@example.com>',
+              'Description: test']
+    if depends:
+        fields.append(f'Depends: {depends}')
+    (control / 'control').write_text('\n'.join(fields) + '\n')
+    filename = f'{name}_1.0_all.deb'
+    subprocess.run(['dpkg-deb', '-b', str(control.parent), os.path.join(directory, filename)],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return filename
+
+
+class DebDependsTest(unittest.TestCase):
+    def test_names_without_constraints(self):
+        field = 'init-system-helpers (>= 1.54~), containerd.io (>= 1.6.24), iptables | nftables, libseccomp2:any'
+        self.assertEqual(docker._deb_depends_names(field),
+                         ['init-system-helpers', 'containerd.io', 'iptables', 'libseccomp2'])
+        self.assertEqual(docker._deb_depends_names(','), [])
+
+
+@unittest.skipUnless(shutil.which('dpkg-deb') and shutil.which('apt-get'), 'dpkg-deb / apt-get not available')
+class BundleMissingDependenciesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.manifest = {'platform': {'format': 'deb'},
+                         'packages': [{'name': 'bundle-test-engine',
+                                       'file': build_deb(self.root, 'bundle-test-engine', 'bundle-test-dep')}],
+                         'dependencies': []}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_missing_dependency_reported(self):
+        missing = docker.bundle_missing_dependencies(self.manifest, self.root)
+        self.assertTrue(any('bundle-test-dep' in line for line in missing), missing)
+
+    def test_bundled_dependency_satisfies(self):
+        self.manifest['dependencies'].append({'name': 'bundle-test-dep', 'version': '1.0',
+                                              'file': build_deb(self.root, 'bundle-test-dep')})
+        self.assertEqual(docker.bundle_missing_dependencies(self.manifest, self.root), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
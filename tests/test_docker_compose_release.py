@@ -0,0 +1,113 @@
+"""Compose 发布信息：本地HTTP测试服务器模拟 GitHub API 配额用尽时改用发布页跳转地址"""
+
+import importlib.util
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from urllib.error import HTTPError
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'Docker-all-install.py'
+spec = importlib.util.spec_from_file_location('docker_all_install', str(SCRIPT))
+docker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(docker)
+
+LATEST = 'v2.30.0'
+SHA256 = 'ab' * 32
+
+
+class ReleaseServer:
+    """在随机端口上模拟 API（/api/...）和发布页（/releases/...），API 返回指定状态码"""
+
+    def __init__(self, api_status=403):
+        self.requests = []
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.respond(body=False)
+
+            def do_GET(self):
+                self.respond(body=True)
+
+            def respond(self, body):
+                outer.requests.append(self.path)
+                status, headers, payload = 404, {}, b''
+                if self.path.startswith('/api/'):
+                    status, headers = api_status, {'X-RateLimit-Remaining': '0'}
+                elif self.path == '/releases/latest':
+                    status, headers = 302, {'Location': f'/releases/tag/{LATEST}'}
+                elif self.path.startswith('/releases/tag/'):
+                    status = 200
+                elif self.path.startswith('/releases/download/') and self.path.endswith('.sha256'):
+                    name = self.path.rsplit('/', 1)[1][:-len('.sha256')]
+                    status, payload = 200, f'{SHA256} *{name}\n'.encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RateLimitedReleaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = str(Path(self.tmp.name) / 'compose-releases.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fetch(self, server, tag=None):
+        return docker.fetch_release_metadata(tag, api=f'{server.url}/api', cache_path=self.cache_path,
+                                             releases=f'{server.url}/releases')
+
+    def test_latest_falls_back_to_redirect(self):
+        server = ReleaseServer(403)
+        self.addCleanup(server.close)
+        release = docker.select_compose_asset(self.fetch(server), 'x86_64')
+        self.assertEqual(release['tag'], LATEST)
+        self.assertEqual(release['url'], f'{server.url}/releases/download/{LATEST}/docker-compose-linux-x86_64')
+        self.assertEqual(release['checksum_url'], release['url'] + '.sha256')
+        self.assertEqual(docker.release_sha256(release), SHA256)
+
+    def test_tag_skips_latest_redirect(self):
+        server = ReleaseServer(429)
+        self.addCleanup(server.close)
+        release = docker.select_compose_asset(self.fetch(server, 'v2.29.1'), 'aarch64')
+        self.assertEqual(release['url'], f'{server.url}/releases/download/v2.29.1/docker-compose-linux-aarch64')
+        self.assertNotIn('/releases/latest', server.requests)
+
+    def test_cache_preferred_over_fallback(self):
+        server = ReleaseServer(403)
+        self.addCleanup(server.close)
+        cached = {'tag_name': 'v2.28.0', 'assets': []}
+        with open(self.cache_path, 'w') as f:
+            json.dump({f'{server.url}/api/latest': {'etag': '"x"', 'fetched': 0, 'data': cached}}, f)
+        self.assertEqual(self.fetch(server), cached)
+        self.assertEqual(server.requests, ['/api/latest'])
+
+    def test_other_errors_raise(self):
+        server = ReleaseServer(404)
+        self.addCleanup(server.close)
+        with self.assertRaises(HTTPError):
+            self.fetch(server)
+
+
+if __name__ == '__main__':
+    unittest.main()
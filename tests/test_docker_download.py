@@ -0,0 +1,148 @@
+"""下载引擎：对本地HTTP测试服务器验证断点续传、不支持 Range、416 和 SHA-256 校验"""
+
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from unittest import mock
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'Docker-all-install.py'
+spec = importlib.util.spec_from_file_location('docker_all_install', str(SCRIPT))
+docker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(docker)
+
+DATA = os.urandom(200 * 1024)
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+class FileServer:
+    """在随机端口上提供 DATA；mode 控制行为：
+
+    truncate   第一次请求声明完整长度但只发送一半后断开，之后按 Range 返回 206
+    chunked    第一次请求用分块传输，发送一半后在一个块的中间断开，之后按 Range 返回 206
+    no-range   忽略 Range，总是返回 200 和完整内容
+    complete   带 Range 的请求返回 416（.part 已完整）
+    """
+
+    def __init__(self, mode):
+        self.ranges = []
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.close_connection = True
+                header = self.headers.get('Range')
+                outer.ranges.append(header)
+                m = re.match(r'^bytes=(\d+)-$', header or '')
+                if m and mode == 'complete':
+                    self.send_response(416)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                elif m and mode != 'no-range':
+                    start = int(m.group(1))
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(DATA) - 1}/{len(DATA)}')
+                    self.send_header('Content-Length', str(len(DATA) - start))
+                    self.end_headers()
+                    self.wfile.write(DATA[start:])
+                elif mode == 'truncate' and len(outer.ranges) == 1:
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(DATA)))
+                    self.end_headers()
+                    self.wfile.write(DATA[:len(DATA) // 2])
+                elif mode == 'chunked' and len(outer.ranges) == 1:
+                    half = len(DATA) // 2
+                    self.send_response(200)
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    self.wfile.write(b'%x\r\n' % half + DATA[:half] + b'\r\n')
+                    self.wfile.write(b'%x\r\n' % half + DATA[half:half + 1000])
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(DATA)))
+                    self.end_headers()
+                    self.wfile.write(DATA)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/file'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class DownloadFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.tmp.name, 'file')
+        self.part = self.target + '.part'
+        sleep = mock.patch.object(docker.time, 'sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def serve(self, mode):
+        server = FileServer(mode)
+        self.addCleanup(server.close)
+        return server
+
+    def assertDownloaded(self):
+        with open(self.target, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertFalse(os.path.exists(self.part))
+
+    def write_part(self, data):
+        with open(self.part, 'wb') as f:
+            f.write(data)
+
+    def test_resume_after_truncated_body(self):
+        server = self.serve('truncate')
+        self.assertTrue(docker.download_file(server.url, self.target, sha256=SHA256, quiet=True))
+        self.assertEqual(server.ranges, [None, f'bytes={len(DATA) // 2}-'])
+        self.assertDownloaded()
+
+    def test_resume_after_chunked_truncation(self):
+        server = self.serve('chunked')
+        self.assertTrue(docker.download_file(server.url, self.target, sha256=SHA256, quiet=True))
+        self.assertEqual(len(server.ranges), 2)
+        self.assertIsNone(server.ranges[0])
+        self.assertIsNotNone(server.ranges[1])
+        self.assertDownloaded()
+
+    def test_server_ignoring_range_restarts(self):
+        server = self.serve('no-range')
+        self.write_part(b'x' * 1000)
+        self.assertTrue(docker.download_file(server.url, self.target, sha256=SHA256, quiet=True))
+        self.assertEqual(server.ranges, ['bytes=1000-'])
+        self.assertDownloaded()
+
+    def test_complete_part_416(self):
+        server = self.serve('complete')
+        self.write_part(DATA)
+        self.assertTrue(docker.download_file(server.url, self.target, sha256=SHA256, quiet=True))
+        self.assertEqual(server.ranges, [f'bytes={len(DATA)}-'])
+        self.assertDownloaded()
+
+    def test_sha256_mismatch_removes_part(self):
+        server = self.serve('no-range')
+        self.assertFalse(docker.download_file(server.url, self.target, sha256='0' * 64, quiet=True))
+        self.assertFalse(os.path.exists(self.part))
+        self.assertFalse(os.path.exists(self.target))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""批量模式：LocalExecutor 在本机执行、单台主机超时，以及传给各主机的参数"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from test_docker_status import EngineStub  # noqa: E402
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'Docker-all-install.py'
+spec = importlib.util.spec_from_file_location('docker_all_install', str(SCRIPT))
+docker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(docker)
+
+
+class SleepExecutor:
+    """派生一个后台 sleep 并把它的 pid 写入 pid_path，用于验证超时时结束整个进程组"""
+    name = 'sleep'
+
+    def __init__(self, pid_path):
+        self.pid_path = pid_path
+
+    def command(self, host, remote_args):
+        return ['sh', '-c', f'sleep 30 & echo $! > {self.pid_path}; wait'], None, None
+
+
+def process_gone(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # 孤儿进程被结束后可能短暂处于僵尸状态
+            return f.read().rsplit(')', 1)[1].split()[0] == 'Z'
+    except FileNotFoundError:
+        return True
+
+
+class FleetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_local_executor_runs_every_host(self):
+        stub = EngineStub()
+        self.addCleanup(stub.close)
+        inventory = os.path.join(self.tmp.name, 'hosts.txt')
+        with open(inventory, 'w') as f:
+            f.write('# test hosts\nnode-1\nnode-2  # second\nnode-1\n')
+        log_dir = os.path.join(self.tmp.name, 'logs')
+        with mock.patch.dict(os.environ, {'DOCKER_HOST': f'unix://{stub.path}'}):
+            code = docker.run_fleet(inventory, 'status', docker.LocalExecutor(), parallel=2, timeout=60,
+                                    log_dir=log_dir, extra_args=['--json'])
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(os.listdir(log_dir)), ['node-1.log', 'node-2.log'])
+        with open(os.path.join(log_dir, 'node-1.log'), encoding='utf-8') as f:
+            command, output = f.read().split('\n', 1)
+        self.assertIn('--action status --json', command)
+        self.assertTrue(json.loads(output)['reachable'])
+
+    def test_empty_inventory(self):
+        inventory = os.path.join(self.tmp.name, 'hosts.txt')
+        with open(inventory, 'w') as f:
+            f.write('# nothing\n')
+        self.assertEqual(docker.run_fleet(inventory, 'status', docker.LocalExecutor(), log_dir=self.tmp.name), 2)
+
+    def test_timeout_kills_process_group(self):
+        pid_path = os.path.join(self.tmp.name, 'pid')
+        log_path = os.path.join(self.tmp.name, 'host.log')
+        started = time.time()
+        result = docker.run_on_host(SleepExecutor(pid_path), 'node-1', 'status', log_path, timeout=1)
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(result['status'], 'TIMEOUT')
+        self.assertIsNone(result['code'])
+        with open(pid_path) as f:
+            pid = int(f.read())
+        for _ in range(50):
+            if process_gone(pid):
+                break
+            time.sleep(0.1)
+        self.assertTrue(process_gone(pid))
+        with open(log_path) as f:
+            self.assertIn('[timeout after 1s]', f.read())
+
+
+class FleetHostArgsTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = argparse.ArgumentParser()
+        self.parser.add_argument('--action')
+        self.parser.add_argument('--fleet')
+        self.parser.add_argument('--parallel', type=int, default=10)
+        self.parser.add_argument('--profile', default='balanced')
+        self.parser.add_argument('--registry-mirrors', type=docker.split_list)
+        self.parser.add_argument('--force', action='store_true')
+        self.parser.add_argument('--prune-targets', type=docker.split_list, default=['containers', 'images'])
+        self.parser.add_argument('--older-than', type=docker.parse_duration)
+        self.parser.add_argument('--min-size', type=docker.parse_size)
+        self.parser.add_argument('--compose-file', action='append', default=[])
+
+    def test_forwards_changed_host_options(self):
+        args = self.parser.parse_args(['--fleet', 'hosts.txt', '--action', 'disk', '--parallel', '4', '--prof', 'small',
+                                       '--registry-mirrors', 'https://a, https://b', '--force', '--older-than', '30d',
+                                       '--min-size', '100MB', '--compose-file', 'compose.yml'])
+        forwarded = docker.fleet_host_args(self.parser, args, ['nginx:1.25', 'redis:7'])
+        self.assertEqual(forwarded, ['--profile', 'small', '--registry-mirrors', 'https://a,https://b', '--force',
+                                     '--older-than', '2592000.000000', '--min-size', str(100 * 1024 ** 2),
+                                     '--warmup-images', 'nginx:1.25,redis:7'])
+        remote = self.parser.parse_args(forwarded[:-2])
+        for dest in ('profile', 'registry_mirrors', 'force', 'older_than', 'min_size'):
+            self.assertEqual(getattr(remote, dest), getattr(args, dest))
+
+    def test_defaults_not_forwarded(self):
+        args = self.parser.parse_args(['--fleet', 'hosts.txt', '--action', 'install', '--profile', 'balanced'])
+        self.assertEqual(docker.fleet_host_args(self.parser, args), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""镜像加速地址：对本地HTTP测试仓库探测测速，以及写入 daemon.json 的条件"""
+
+import importlib.util
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'Docker-all-install.py'
+spec = importlib.util.spec_from_file_location('docker_all_install', str(SCRIPT))
+docker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(docker)
+
+
+class RegistryServer:
+    """在随机端口上模拟镜像仓库的 /v2/ 接口，按指定延迟返回指定状态码"""
+
+    def __init__(self, status=401, delay=0.0):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay)
+                self.send_response(status if self.path == '/v2/' else 404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ProbeRegistryMirrorsTest(unittest.TestCase):
+    def setUp(self):
+        self.hub = RegistryServer(delay=0.15)
+        self.fast = RegistryServer(delay=0.0)
+        self.slow = RegistryServer(status=200, delay=0.4)
+        self.broken = RegistryServer(status=500)
+        self.saved_hub = docker.DOCKER_HUB_REGISTRY
+        docker.DOCKER_HUB_REGISTRY = self.hub.url
+
+    def tearDown(self):
+        docker.DOCKER_HUB_REGISTRY = self.saved_hub
+        for server in (self.hub, self.fast, self.slow, self.broken):
+            server.close()
+
+    def test_only_mirrors_faster_than_hub_are_selected(self):
+        _, results = docker.probe_mirrors([], [self.slow.url, self.broken.url, self.fast.url], paths=('', ''))
+        self.assertEqual([r['url'] for r in results], [self.fast.url, self.hub.url, self.slow.url, self.broken.url])
+        self.assertFalse(results[-1]['ok'])
+        self.assertEqual(docker.select_registry_mirrors(results), [self.fast.url])
+
+    def test_unreachable_hub_keeps_working_mirrors(self):
+        self.hub.close()
+        _, results = docker.probe_mirrors([], [self.slow.url, self.fast.url], paths=('', ''), timeout=1)
+        self.assertEqual(docker.select_registry_mirrors(results), [self.fast.url, self.slow.url])
+
+    def test_no_third_party_mirrors_by_default(self):
+        self.assertEqual(docker.REGISTRY_MIRRORS, [])
+        self.assertEqual(docker.probe_mirrors([], docker.REGISTRY_MIRRORS, paths=('', '')), ([], []))
+
+
+class PlanDaemonConfigMirrorsTest(unittest.TestCase):
+    MIRRORS = ['http://127.0.0.1:5000']
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'daemon.json'
+        self.saved_defaults = docker.load_daemon_json.__defaults__
+        docker.load_daemon_json.__defaults__ = (str(self.path),)
+
+    def tearDown(self):
+        docker.load_daemon_json.__defaults__ = self.saved_defaults
+        self.tmp.cleanup()
+
+    def write_config(self, config):
+        self.path.write_text(json.dumps(config))
+
+    def test_written_when_absent(self):
+        self.assertEqual(docker.plan_daemon_config('none', self.MIRRORS), {'registry-mirrors': self.MIRRORS})
+        self.write_config({'registry-mirrors': []})
+        self.assertEqual(docker.plan_daemon_config('none', self.MIRRORS), {'registry-mirrors': self.MIRRORS})
+
+    def test_existing_mirrors_kept(self):
+        self.write_config({'registry-mirrors': ['https://mirror.example.com']})
+        self.assertEqual(docker.plan_daemon_config('none', self.MIRRORS), {})
+
+    def test_existing_mirrors_replaced_when_explicit(self):
+        self.write_config({'registry-mirrors': ['https://mirror.example.com']})
+        expected = {'registry-mirrors': self.MIRRORS}
+        self.assertEqual(docker.plan_daemon_config('none', self.MIRRORS, replace_mirrors=True), expected)
+        self.assertEqual(docker.plan_daemon_config('none', self.MIRRORS, override=True), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Docker 状态：对本地 Unix socket 测试服务器请求 Engine API"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'Docker-all-install.py'
+spec = importlib.util.spec_from_file_location('docker_all_install', str(SCRIPT))
+docker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(docker)
+
+VERSION = {'Version': '27.3.1', 'ApiVersion': '1.47', 'Os': 'linux', 'Arch': 'amd64', 'Components': []}
+INFO = {'ServerVersion': '27.3.1', 'Driver': 'overlay2', 'DockerRootDir': '/var/lib/docker', 'NCPU': 4,
+        'ContainersRunning': 1, 'ID': 'not-reported', 'RegistryConfig': {'Mirrors': ['https://mirror.example.com/']}}
+CONTAINERS = [{'Id': 'a' * 64, 'Names': ['/web'], 'Image': 'nginx:1.25', 'State': 'running', 'Status': 'Up 2 hours'}]
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class EngineStub:
+    """在临时 Unix socket 上模拟 /_ping、/version、/info、/containers/json，failing 中的路径返回 500"""
+
+    def __init__(self, failing=()):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'docker.sock')
+        responses = {'/_ping': b'OK', '/version': VERSION, '/info': INFO, '/containers/json': CONTAINERS}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path in failing:
+                    status, body = 500, json.dumps({'message': 'stub failure'}).encode()
+                elif path in responses:
+                    body = responses[path]
+                    status, body = 200, body if isinstance(body, bytes) else json.dumps(body).encode()
+                else:
+                    status, body = 404, b'{"message": "page not found"}'
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def address_string(self):
+                return 'unix'
+
+            def log_message(self, *args):
+                pass
+
+        self.server = UnixHTTPServer(self.path, Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+
+class DockerStatusTest(unittest.TestCase):
+    def serve(self, failing=()):
+        stub = EngineStub(failing)
+        self.addCleanup(stub.close)
+        return stub
+
+    def test_docker_api(self):
+        stub = self.serve()
+        self.assertEqual(docker.docker_api('GET', '/_ping', socket_path=stub.path), (200, b'OK'))
+        self.assertEqual(docker.docker_api('GET', '/missing', socket_path=stub.path)[0], 404)
+
+    def test_collect_status(self):
+        stub = self.serve()
+        status = docker.collect_docker_status(socket_path=stub.path)
+        self.assertTrue(status['reachable'])
+        self.assertEqual(status['errors'], {})
+        self.assertEqual(status['version'], {'Version': '27.3.1', 'ApiVersion': '1.47', 'Os': 'linux', 'Arch': 'amd64'})
+        self.assertNotIn('ID', status['info'])
+        self.assertEqual(status['info']['Driver'], 'overlay2')
+        self.assertEqual(status['registry_mirrors'], ['https://mirror.example.com/'])
+        self.assertEqual(status['containers'], [{'id': 'a' * 12, 'name': 'web', 'image': 'nginx:1.25',
+                                                 'state': 'running', 'status': 'Up 2 hours'}])
+
+    def test_failing_endpoint_recorded(self):
+        stub = self.serve(failing=('/info',))
+        status = docker.collect_docker_status(socket_path=stub.path)
+        self.assertTrue(status['reachable'])
+        self.assertEqual(list(status['errors']), ['info'])
+        self.assertIn('stub failure', status['errors']['info'])
+        self.assertEqual(status['info'], {})
+        self.assertEqual(len(status['containers']), 1)
+
+    def test_unreachable_socket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            status = docker.collect_docker_status(socket_path=os.path.join(tmp, 'missing.sock'))
+        self.assertFalse(status['reachable'])
+        self.assertEqual(set(status['errors']), set(docker.STATUS_CALLS))
+
+    def test_show_status_json(self):
+        stub = self.serve()
+        defaults = docker.collect_docker_status.__defaults__
+        docker.collect_docker_status.__defaults__ = (stub.path,) + defaults[1:]
+        self.addCleanup(setattr, docker.collect_docker_status, '__defaults__', defaults)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertTrue(docker.show_docker_status(as_json=True))
+        status = json.loads(out.getvalue())
+        self.assertEqual(set(status), {'socket', 'reachable', 'elapsed_ms', 'version', 'info', 'registry_mirrors',
+                                       'containers', 'errors'})
+        self.assertEqual(status['socket'], stub.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""步骤图：满足检查出错时记为失败步骤，报告中的步骤记录正常结束"""
+
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / 'Docker-all-install.py'
+spec = importlib.util.spec_from_file_location('docker_all_install', str(SCRIPT))
+docker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(docker)
+
+
+def broken_check(ctx):
+    raise KeyError('missing')
+
+
+class StepGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.report = docker.RunReport('install')
+        saved = docker.CURRENT_REPORT
+        docker.CURRENT_REPORT = self.report
+        self.addCleanup(setattr, docker, 'CURRENT_REPORT', saved)
+        self.ran = []
+
+    def step(self, name, deps=(), satisfied=None):
+        return docker.Step(name, name, lambda ctx: self.ran.append(name) or True, deps=deps, persist=False,
+                           satisfied=satisfied)
+
+    def test_failing_satisfied_check_fails_step(self):
+        graph = docker.StepGraph('test', [self.step('a', satisfied=broken_check), self.step('b', deps=('a',))],
+                                 state_dir=self.tmp.name)
+        self.assertFalse(graph.run())
+        self.assertEqual(self.ran, [])
+        self.assertEqual([(s['name'], s['status']) for s in self.report.steps], [('a', 'failed')])
+        self.assertIsNotNone(self.report.steps[0]['duration'])
+
+    def test_satisfied_step_skipped(self):
+        graph = docker.StepGraph('test', [self.step('a', satisfied=lambda ctx: True), self.step('b', deps=('a',))],
+                                 state_dir=self.tmp.name)
+        self.assertTrue(graph.run())
+        self.assertEqual(self.ran, ['b'])
+        self.assertEqual([s['status'] for s in self.report.steps], ['skipped', 'ok'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""证书文件查找：定向同步先直接检查基础目录，找不到才遍历子目录"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import LuckySSLtoSafeLine as lucky  # noqa: E402
+
+
+def write_pair(directory: Path, stem: str, content: str) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f'{stem}.crt').write_text(f'CERT {content}')
+    (directory / f'{stem}.key').write_text(f'KEY {content}')
+
+
+class FindCertFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self.tmp.name)
+        patcher = mock.patch.object(lucky, 'BASE_PATH', self.base)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = lucky.CertManager()
+        self.group = lucky.DomainGroup('example.com', None, ('example.com', 'www.example.com'))
+        self.walk = mock.patch.object(lucky.os, 'walk', wraps=os.walk)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_targeted_lookup_skips_walk(self):
+        write_pair(self.base, '_.example.com', 'base')
+        write_pair(self.base / 'sub', 'example.com', 'sub')
+        with self.walk as walk:
+            self.assertEqual(self.manager.find_cert_files(self.group, targeted=True), ('CERT base', 'KEY base'))
+        walk.assert_not_called()
+
+    def test_targeted_lookup_falls_back_to_walk(self):
+        write_pair(self.base / 'sub', 'www.example.com', 'sub')
+        with self.walk as walk:
+            self.assertEqual(self.manager.find_cert_files(self.group, targeted=True), ('CERT sub', 'KEY sub'))
+        walk.assert_called_once()
+
+    def test_same_result_as_full_lookup(self):
+        write_pair(self.base, 'www.example.com', 'base-www')
+        write_pair(self.base, 'example.com', 'base')
+        self.assertEqual(self.manager.find_cert_files(self.group, targeted=True),
+                         self.manager.find_cert_files(self.group))
+
+
+if __name__ == '__main__':
+    unittest.main()
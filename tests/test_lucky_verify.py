@@ -0,0 +1,109 @@
+"""部署验证：对本地TLS测试服务器握手比对证书指纹"""
+
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import LuckySSLtoSafeLine as lucky  # noqa: E402
+
+
+def make_cert(directory: Path, name: str) -> Path:
+    """用openssl生成自签证书，返回同名.crt路径（私钥为.key）"""
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', f'/CN={name}',
+         '-keyout', str(directory / f'{name}.key'), '-out', str(directory / f'{name}.crt')],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return directory / f'{name}.crt'
+
+
+class TLSServer:
+    """在随机端口上下发指定证书的TLS服务器，完成握手后关闭连接"""
+
+    def __init__(self, cert_path: Path):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(str(cert_path), str(cert_path.with_suffix('.key')))
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            try:
+                with self.context.wrap_socket(conn, server_side=True):
+                    pass
+            except (OSError, ssl.SSLError):
+                pass
+
+    def close(self):
+        self.sock.close()
+
+
+@unittest.skipUnless(shutil.which('openssl'), 'openssl not available')
+class VerifyTLSTargetsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        directory = Path(cls.tmp.name)
+        cls.cert = make_cert(directory, 'example.test')
+        cls.other = make_cert(directory, 'other.test')
+        cls.server = TLSServer(cls.cert)
+        cls.expected = lucky.cert_fingerprint(cls.cert.read_text())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+        cls.tmp.cleanup()
+
+    def test_matching_certificate_passes(self):
+        result, = lucky.verify_tls_targets(self.expected, [('127.0.0.1', self.server.port, 'example.test')], timeout=2)
+        self.assertTrue(result['ok'], result['error'])
+
+    def test_other_certificate_fails(self):
+        other = lucky.cert_fingerprint(self.other.read_text())
+        result, = lucky.verify_tls_targets(other, [('127.0.0.1', self.server.port, 'example.test')], timeout=2)
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['error'], '证书指纹不一致')
+
+    def test_unreachable_target_fails(self):
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        port = closed.getsockname()[1]
+        closed.close()
+        result, = lucky.verify_tls_targets(self.expected, [('127.0.0.1', port, 'example.test')], timeout=2)
+        self.assertFalse(result['ok'])
+
+    def test_invalid_hostnames_fail_instead_of_raising(self):
+        targets = [('a..example.test', 443, 'a..example.test'), ('x' * 70 + '.test', 443, 'x' * 70 + '.test'),
+                   ('127.0.0.1', self.server.port, 'a..example.test')]
+        results = lucky.verify_tls_targets(self.expected, targets, timeout=2)
+        self.assertEqual(len(results), 3)
+        self.assertFalse(any(result['ok'] for result in results))
+
+
+class CertFingerprintTest(unittest.TestCase):
+    def test_missing_certificate(self):
+        self.assertIsNone(lucky.cert_fingerprint('no certificate here'))
+
+    def test_corrupt_certificate(self):
+        pem = '-----BEGIN CERTIFICATE-----\nnot*base64\n-----END CERTIFICATE-----'
+        self.assertIsNone(lucky.cert_fingerprint(pem))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,19 +21,36 @@ TOTAL_GB=${TOTAL_TRAFFIC_GB:-}
 # 日志文件路径（程序默认写到临时目录）
 LOG_FILE=${LOG_FILE:-/tmp/subs-check.log}
 
-# 若环境变量缺失，从日志文件解析最近一次统计（使用更通用的awk替换，兼容busybox awk）
-if [ -z "$NODES_TOTAL" ] && [ -f "$LOG_FILE" ]; then
+# 自动计算订阅链接数量（sub-urls + sub-urls-remote）
+CONFIG_FILE="/app/config/config.yaml"
+
+# 优先使用Python提取脚本：从日志末尾反向读取，一次扫描得到三项统计，并记录偏移检查点只读新增内容
+STATS_SCRIPT=${STATS_SCRIPT:-$(dirname "$0")/subs_check_stats.py}
+STATS_STATE=${STATS_STATE:-${LOG_FILE}.checkpoint}
+SUBS_COUNT=""
+if command -v python3 >/dev/null 2>&1 && [ -f "$STATS_SCRIPT" ]; then
+  STATS_OUTPUT=$(python3 "$STATS_SCRIPT" --log "$LOG_FILE" --config "$CONFIG_FILE" --state "$STATS_STATE" 2>/dev/null)
+  if [ $? -eq 0 ]; then
+    eval "$STATS_OUTPUT"
+    NODES_TOTAL=${NODES_TOTAL:-$LOG_NODES_TOTAL}
+    NODES_DEDUP=${NODES_DEDUP:-$LOG_NODES_DEDUP}
+    TOTAL_GB=${TOTAL_GB:-$LOG_TOTAL_GB}
+    SUBS_COUNT=$CONFIG_SUBS_COUNT
+    STATS_DONE=1
+  fi
+fi
+
+# 没有python3时回退到awk：若环境变量缺失，从日志文件解析最近一次统计（使用更通用的awk替换，兼容busybox awk）
+if [ -z "$STATS_DONE" ] && [ -z "$NODES_TOTAL" ] && [ -f "$LOG_FILE" ]; then
   NODES_TOTAL=$(awk '/获取节点数量:/{val=$0} END{if(val){ gsub(/^.*获取节点数量:[ \t]*/,"",val); gsub(/[^0-9].*$/,"",val); if(val!="") print val }}' "$LOG_FILE")
 fi
-if [ -z "$NODES_DEDUP" ] && [ -f "$LOG_FILE" ]; then
+if [ -z "$STATS_DONE" ] && [ -z "$NODES_DEDUP" ] && [ -f "$LOG_FILE" ]; then
   NODES_DEDUP=$(awk '/去重后节点数量:/{val=$0} END{if(val){ gsub(/^.*去重后节点数量:[ \t]*/,"",val); gsub(/[^0-9].*$/,"",val); if(val!="") print val }}' "$LOG_FILE")
 fi
-if [ -z "$TOTAL_GB" ] && [ -f "$LOG_FILE" ]; then
+if [ -z "$STATS_DONE" ] && [ -z "$TOTAL_GB" ] && [ -f "$LOG_FILE" ]; then
   TOTAL_GB=$(awk '/测试总消耗流量:/{val=$0} END{if(val){ gsub(/^.*测试总消耗流量:[ \t]*/,"",val); gsub(/GB.*$/,"",val); if(val!="") print val }}' "$LOG_FILE")
 fi
 
-# 自动计算订阅链接数量（sub-urls + sub-urls-remote）
-CONFIG_FILE="/app/config/config.yaml"
 calc_list_count() {
     # $1: key name
     # 统计YAML中顶层key为$1的列表项数量（忽略注释与空行）
@@ -48,8 +65,7 @@ calc_list_count() {
     ' "$CONFIG_FILE" 2>/dev/null
 }
 
-SUBS_COUNT=""
-if [ -f "$CONFIG_FILE" ]; then
+if [ -z "$STATS_DONE" ] && [ -f "$CONFIG_FILE" ]; then
     local_count=$(calc_list_count "sub-urls")
     remote_count=$(calc_list_count "sub-urls-remote")
     # 避免空值